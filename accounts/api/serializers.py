@@ -1,8 +1,7 @@
 from rest_framework import serializers
-from ecommerce.models import Order, OrderItem
+from ecommerce.models import Order, OrderItem, CustomerStats
 from accounts.models import Address
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
 from django.db import transaction
 from django.contrib.auth import authenticate
 from django.contrib.auth.tokens import default_token_generator
@@ -274,38 +273,19 @@ class CustomerDetailSerializer(serializers.ModelSerializer):
         return f"{obj.first_name or ''} {obj.last_name or ''}".strip() or obj.email.split('@')[0]
     
     def get_stats(self, obj):
-        orders = obj.orders.filter(payment_status='Paid')
-        total_spent = orders.aggregate(total=Sum('total'))['total'] or 0
-        total_orders = orders.count()
-        # items = OrderItem.objects.filter(order__in=orders).count()
-        last_order = orders.first()
-        avg_order_value = total_spent / total_orders if total_orders > 0 else 0
-        
+        stats = CustomerStats.for_user(obj)
         return {
-            'total_orders': total_orders,
-            'total_spent': total_spent,
-            # 'items' : items,
-            'last_order_date': last_order.created_at if last_order else None,
-            'avg_order_value': avg_order_value
+            'total_orders': stats.paid_orders,
+            'total_spent': stats.total_spent,
+            'last_order_date': stats.last_order_at,
+            'avg_order_value': stats.avg_order_value
         }
     
     def get_tier(self, obj):
-        total_spent = obj.orders.filter(payment_status='Paid').aggregate(
-            total=Sum('total'))['total'] or 0
-        
-        if total_spent >= 30000:
-            return 'Platinum'
-        elif total_spent >= 10000:
-            return 'Gold'
-        elif total_spent >= 1000:
-            return 'Silver'
-        else:
-            return 'Bronze'
+        return CustomerStats.for_user(obj).tier
     
     def get_is_vip(self, obj):
-        total_spent = obj.orders.filter(payment_status='Paid').aggregate(
-            total=Sum('total'))['total'] or 0
-        return total_spent >= 30000
+        return CustomerStats.for_user(obj).is_vip
     
     def get_last_activity(self, obj):
         last_order = obj.orders.first()
@@ -333,25 +313,16 @@ class CustomerListSerializer(serializers.ModelSerializer):
         return f"{obj.first_name or ''} {obj.last_name or ''}".strip() or obj.email.split('@')[0]
     
     def get_total_orders(self, obj):
-        return obj.orders.filter(payment_status='Paid').count()
+        return CustomerStats.for_user(obj).paid_orders
     
     def get_total_spent(self, obj):
-        return obj.orders.filter(payment_status='Paid').aggregate(
-            total=Sum('total'))['total'] or 0
+        return CustomerStats.for_user(obj).total_spent
     
     def get_tier(self, obj):
-        total_spent = self.get_total_spent(obj)
-        if total_spent >= 30000:
-            return 'Platinum'
-        elif total_spent >= 10000:
-            return 'Gold'
-        elif total_spent >= 5000:
-            return 'Silver'
-        else:
-            return 'Bronze'
+        return CustomerStats.for_user(obj).tier
     
     def get_is_vip(self, obj):
-        return self.get_total_spent(obj) >= 30000
+        return CustomerStats.for_user(obj).is_vip
     
     def get_last_activity(self, obj):
         last_order = obj.orders.first()
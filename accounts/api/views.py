@@ -7,10 +7,14 @@ from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from ..signals import send_otp_email
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum
+from django.db.models import Sum, Count, Q, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 from rest_framework.filters import SearchFilter, OrderingFilter
+from ecommerce.exports import streaming_export
+from ecommerce.models import CustomerStats
 from .serializers import (
     PasswordChangeSerializer, PasswordResetConfirmSerializer, PasswordResetSerializer, RegistrationSerializer, LoginSerializer,
     TokenSerializer, UserProfileUpdateSerializer, VerifyOTPSerializer, AddAdminSerializer, CustomerCreateUpdateSerializer,
@@ -258,63 +262,32 @@ class CustomerFilter(django_filters.FilterSet):
         return queryset.filter(is_active=value)
 
     def filter_tier(self, queryset, name, value):
-        # This is a simplified tier filter - you might want to use raw SQL for better performance
-        tier_ranges = {
-            'Bronze': (0, 499.99),
-            'Silver': (500, 1999.99),
-            'Gold': (2000, 4999.99),
-            'Platinum': (5000, float('inf'))
-        }
-        min_val, max_val = tier_ranges.get(value, (0, float('inf')))
-        
-        # Get users with total spent in range
-        user_ids = []
-        for user in queryset:
-            total_spent = user.orders.filter(payment_status='Paid').aggregate(
-                total=Sum('total'))['total'] or 0
-            if min_val <= total_spent <= max_val:
-                user_ids.append(user.id)
-        
-        return queryset.filter(id__in=user_ids)
+        return queryset.filter(lifetime_stats__tier=value)
 
     def filter_total_spent_min(self, queryset, name, value):
-        user_ids = []
-        for user in queryset:
-            total_spent = user.orders.filter(payment_status='Paid').aggregate(
-                total=Sum('total'))['total'] or 0
-            if total_spent >= value:
-                user_ids.append(user.id)
-        return queryset.filter(id__in=user_ids)
+        return queryset.filter(lifetime_stats__total_spent__gte=value)
 
     def filter_total_spent_max(self, queryset, name, value):
-        user_ids = []
-        for user in queryset:
-            total_spent = user.orders.filter(payment_status='Paid').aggregate(
-                total=Sum('total'))['total'] or 0
-            if total_spent <= value:
-                user_ids.append(user.id)
-        return queryset.filter(id__in=user_ids)
+        return queryset.filter(lifetime_stats__total_spent__lte=value)
 
     def filter_vip(self, queryset, name, value):
-        user_ids = []
-        for user in queryset:
-            total_spent = user.orders.filter(payment_status='Paid').aggregate(
-                total=Sum('total'))['total'] or 0
-            is_vip = total_spent >= 5000
-            if is_vip == value:
-                user_ids.append(user.id)
-        return queryset.filter(id__in=user_ids)
+        if value:
+            return queryset.filter(lifetime_stats__tier=CustomerStats.VIP_TIER)
+        return queryset.exclude(lifetime_stats__tier=CustomerStats.VIP_TIER)
 
 class CustomerViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_class = CustomerFilter
     search_fields = ['email', 'first_name', 'last_name', 'phone_number']
-    ordering_fields = ['date_joined', 'email', 'first_name', 'last_name']
+    ordering_fields = [
+        'date_joined', 'email', 'first_name', 'last_name',
+        'lifetime_stats__total_spent', 'lifetime_stats__paid_orders', 'lifetime_stats__last_order_at'
+    ]
     ordering = ['-date_joined']
 
     def get_queryset(self):
-        return CustomUser.objects.filter().prefetch_related('orders')
+        return CustomUser.objects.filter().select_related('lifetime_stats').prefetch_related('orders')
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -337,16 +310,13 @@ class CustomerViewSet(ModelViewSet):
         inactive_customers = customers.filter(is_active=False).count()
         new_customers_this_month = customers.filter(date_joined__gte=last_month).count()
         
-        # VIP customers (total spent >= 5000)
-        vip_customers = 0
-        total_revenue = 0
-        
-        for customer in customers:
-            customer_spent = customer.orders.filter(payment_status='Paid').aggregate(
-                total=Sum('total'))['total'] or 0
-            total_revenue += customer_spent
-            if customer_spent >= 5000:
-                vip_customers += 1
+        # VIP customers and revenue from the lifetime stats table
+        lifetime = CustomerStats.objects.aggregate(
+            vip_customers=Count('pk', filter=Q(tier=CustomerStats.VIP_TIER)),
+            total_revenue=Sum('total_spent')
+        )
+        vip_customers = lifetime['vip_customers']
+        total_revenue = lifetime['total_revenue'] or 0
         
         stats_data = {
             'total_customers': total_customers,
@@ -442,51 +412,46 @@ class CustomerViewSet(ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-    @action(detail=False, methods=['get'])
-    def export(self, request):
-        """Export customers to CSV"""
-        import csv
-        from django.http import HttpResponse
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="customers.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'ID', 'Email', 'First Name', 'Last Name', 'Phone', 
-            'Status', 'Join Date', 'Total Orders', 'Total Spent', 'Tier'
-        ])
-        
-        customers = self.filter_queryset(self.get_queryset())
-        for customer in customers:
-            total_orders = customer.orders.filter(payment_status='Paid').count()
-            total_spent = customer.orders.filter(payment_status='Paid').aggregate(
-                total=Sum('total'))['total'] or 0
-            
-            # Calculate tier
-            if total_spent >= 5000:
-                tier = 'Platinum'
-            elif total_spent >= 2000:
-                tier = 'Gold'
-            elif total_spent >= 500:
-                tier = 'Silver'
-            else:
-                tier = 'Bronze'
-            
-            writer.writerow([
-                customer.id,
-                customer.email,
-                customer.first_name or '',
-                customer.last_name or '',
-                customer.phone_number,
-                'Active' if customer.is_active else 'Inactive',
-                customer.date_joined.strftime('%Y-%m-%d'),
+    EXPORT_HEADER = [
+        'ID', 'Email', 'First Name', 'Last Name', 'Phone',
+        'Status', 'Join Date', 'Total Orders', 'Total Spent', 'Tier'
+    ]
+
+    def _export_queryset(self):
+        """Customers with their paid order count, spend and tier from the lifetime stats table"""
+        queryset = CustomUser.objects.annotate(
+            total_orders=Coalesce('lifetime_stats__paid_orders', Value(0)),
+            total_spent=Coalesce('lifetime_stats__total_spent', Value(Decimal('0.00'))),
+            tier=Coalesce('lifetime_stats__tier', Value('Bronze')),
+        )
+        return self.filter_queryset(queryset).values_list(
+            'id', 'email', 'first_name', 'last_name', 'phone_number', 'is_active',
+            'date_joined', 'total_orders', 'total_spent', 'tier'
+        )
+
+    def _export_rows(self, queryset):
+        """Yield one export row per customer, reading the queryset in chunks"""
+        for (pk, email, first_name, last_name, phone, is_active,
+             date_joined, total_orders, total_spent, tier) in queryset.iterator(chunk_size=2000):
+            yield [
+                pk,
+                email,
+                first_name or '',
+                last_name or '',
+                phone,
+                'Active' if is_active else 'Inactive',
+                date_joined.strftime('%Y-%m-%d'),
                 total_orders,
                 total_spent,
                 tier
-            ])
-        
-        return response
+            ]
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """Stream customers as CSV"""
+        return streaming_export(
+            'csv', 'customers', self.EXPORT_HEADER, self._export_rows(self._export_queryset())
+        )
 
     @action(detail=True, methods=['get'])
     def activity_log(self, request, pk=None):
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:38
+
+import hashlib
+from django.db import migrations, models
+
+FINGERPRINT_FIELDS = (
+    'first_name', 'last_name', 'email', 'phone', 'street_address',
+    'apartment', 'city', 'county', 'postal_code'
+)
+
+
+def backfill_fingerprints(apps, schema_editor):
+    # Same normalization as Address.compute_fingerprint
+    Address = apps.get_model('accounts', 'Address')
+    batch = []
+    for address in Address.objects.only('id', *FINGERPRINT_FIELDS).iterator():
+        parts = []
+        for field in FINGERPRINT_FIELDS:
+            value = ' '.join(str(getattr(address, field) or '').split()).casefold()
+            if field == 'phone':
+                value = ''.join(char for char in value if char.isdigit())
+            parts.append(value)
+        address.fingerprint = hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+        batch.append(address)
+        if len(batch) >= 1000:
+            Address.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    Address.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_customuser_is_deleted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['user', 'fingerprint'], name='accounts_ad_user_id_bd4794_idx'),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
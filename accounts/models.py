@@ -1,3 +1,4 @@
+import hashlib
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
 from django.contrib.auth.validators import UnicodeUsernameValidator
@@ -17,9 +18,63 @@ class Address(models.Model):
     postal_code = models.CharField(max_length=20)
     is_default = models.BooleanField(default=False)
     notes = models.TextField(blank=True, null=True)
+    # Digest of the normalized contact and location fields, used to reuse addresses
+    fingerprint = models.CharField(max_length=64, blank=True, editable=False)
+    
+    FINGERPRINT_FIELDS = (
+        'first_name', 'last_name', 'email', 'phone', 'street_address',
+        'apartment', 'city', 'county', 'postal_code'
+    )
     
     class Meta:
         verbose_name_plural = 'Addresses'
+        indexes = [
+            models.Index(fields=['user', 'fingerprint']),
+        ]
+
+    @classmethod
+    def compute_fingerprint(cls, **values):
+        """
+        Digest of the address fields with case, spacing and phone
+        punctuation ignored, so equivalent entries compare equal.
+        """
+        parts = []
+        for field in cls.FINGERPRINT_FIELDS:
+            value = ' '.join(str(values.get(field) or '').split()).casefold()
+            if field == 'phone':
+                value = ''.join(char for char in value if char.isdigit())
+            parts.append(value)
+        return hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+
+    # Fingerprint as last loaded from or written to the database
+    _saved_fingerprint = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Reading the attribute would load a deferred fingerprint, one query per row
+        instance._saved_fingerprint = instance.__dict__.get('fingerprint')
+        return instance
+
+    def is_referenced_by_orders(self):
+        return self.shipping_orders.exists() or self.billing_orders.exists()
+
+    def save(self, *args, **kwargs):
+        self.fingerprint = self.compute_fingerprint(
+            **{field: getattr(self, field) for field in self.FINGERPRINT_FIELDS}
+        )
+        if (self.pk and self._saved_fingerprint and self._saved_fingerprint != self.fingerprint
+                and self.is_referenced_by_orders()):
+            # Orders keep the address they were placed with; save the
+            # edit as a new row and take the default flag over from the old one
+            previous_pk = self.pk
+            self.pk = None
+            self._state.adding = True
+            kwargs.pop('update_fields', None)
+            kwargs['force_insert'] = True
+            Address.objects.filter(pk=previous_pk).update(is_default=False)
+        super().save(*args, **kwargs)
+        self._saved_fingerprint = self.fingerprint
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}, {self.street_address}, {self.city}"
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppcontentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appcontent'
+
+    def ready(self):
+        import appcontent.signals
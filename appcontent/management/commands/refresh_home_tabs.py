@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from appcontent.services import ProductService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized home page tab listings (schedule with --if-stale, e.g. every 5 minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--per-tab', type=int, default=None, help='Products kept per tab')
+        parser.add_argument(
+            '--if-stale', action='store_true',
+            help='Only refresh when a change marked the tabs stale or they are empty'
+        )
+
+    def handle(self, *args, **options):
+        if options['if_stale'] and not ProductService.home_tabs_stale():
+            self.stdout.write('Home tabs are up to date')
+            return
+        count = ProductService.refresh_home_tabs(products_per_tab=options['per_tab'])
+        if count is None:
+            self.stdout.write(self.style.WARNING('Another home tab refresh is running; skipped'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Materialized {count} home tab entries'))
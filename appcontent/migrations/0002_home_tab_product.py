@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appcontent', '0001_initial'),
+        ('ecommerce', '0007_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HomeTabProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tab', models.CharField(choices=[('latest', 'Latest'), ('featured', 'Featured'), ('best_selling', 'Best Selling'), ('top_rating', 'Top Rating')], max_length=20)),
+                ('position', models.PositiveSmallIntegerField()),
+                ('parent_total_products', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(auto_now_add=True)),
+                ('parent_category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ecommerce.parentcategory')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ecommerce.product')),
+            ],
+            options={
+                'ordering': ['parent_category', 'tab', 'position'],
+                'unique_together': {('parent_category', 'tab', 'position')},
+            },
+        ),
+    ]
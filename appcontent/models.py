@@ -25,4 +25,32 @@ class About(models.Model):
         verbose_name_plural = 'About'
 
 
-# Create your models here.
+class HomeTabProduct(models.Model):
+    """
+    Materialized home page tab listings, one row per product slot.
+
+    Rebuilt wholesale by ProductService.refresh_home_tabs so the home page
+    reads every tab of every parent category in a single query.
+    """
+    TAB_CHOICES = (
+        ('latest', 'Latest'),
+        ('featured', 'Featured'),
+        ('best_selling', 'Best Selling'),
+        ('top_rating', 'Top Rating'),
+    )
+
+    parent_category = models.ForeignKey('ecommerce.ParentCategory', on_delete=models.CASCADE)
+    tab = models.CharField(max_length=20, choices=TAB_CHOICES)
+    position = models.PositiveSmallIntegerField()
+    product = models.ForeignKey('ecommerce.Product', on_delete=models.CASCADE)
+    # In-stock product count of the parent category, repeated on each row
+    parent_total_products = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.parent_category} {self.tab} #{self.position}"
+
+    class Meta:
+        ordering = ['parent_category', 'tab', 'position']
+        unique_together = ['parent_category', 'tab', 'position']
+
@@ -1,65 +1,205 @@
-from django.db.models import Q, Count, Avg, Sum
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Count, Avg, Sum, F, Window
+from django.db.models.functions import RowNumber
 from ecommerce.models import ParentCategory, Product, Category
+from ecommerce.sales import annotate_sales
+from appcontent.models import HomeTabProduct
+
+HOME_TABS_STALE_KEY = 'home-tabs:stale'
+HOME_TABS_RUNNING_KEY = 'home-tabs:running'
 
 class ProductService:
     
+    TABS = {
+        'latest': ('-created_at', '-id'),
+        'featured': ('-created_at', '-id'),
+        'best_selling': ('-sales_score', '-created_at', '-id'),
+        'top_rating': ('-rating', '-created_at', '-id'),
+    }
+    
     @staticmethod
     def get_parent_categories_with_products(limit_categories=None, products_per_tab=8):
         """
         Get parent categories with their products organized by tabs
         (Latest, Best Selling, Top Rating, Featured)
+        
+        Reads the materialized HomeTabProduct rows in a single query, so the
+        query count does not grow with the number of parent categories.
+        Requests never write the rows; stale tabs are served as they are
+        until the scheduled refresh_home_tabs command rebuilds them. Before
+        the first refresh the tabs are computed live, without saving them.
         """
-        # Get parent categories that have products
-        parent_categories = ParentCategory.objects.annotate(
-            total_products=Count('category__product', filter=Q(category__product__quantity__gt=0))
-        ).filter(total_products__gt=0).order_by('id')
+        tab_rows = HomeTabProduct.objects.select_related(
+            'parent_category',
+            'product__category__parent_category',
+            'product__brand'
+        ).order_by('parent_category_id', 'tab', 'position')
+        
+        rows = list(tab_rows)
+        if not rows:
+            # Never materialized yet (fresh install or emptied table)
+            ProductService.mark_home_tabs_stale()
+            rows = ProductService._live_home_tabs()
+        
+        categories = {}
+        for row in rows:
+            category_data = categories.get(row.parent_category_id)
+            if category_data is None:
+                category_data = categories[row.parent_category_id] = {
+                    'parent_category': row.parent_category,
+                    'slug': row.parent_category.slug,
+                    'latest_products': [],
+                    'featured_products': [],
+                    'best_selling_products': [],
+                    'top_rating_products': [],
+                    'total_products': row.parent_total_products,
+                }
+            products = category_data[f'{row.tab}_products']
+            if len(products) < products_per_tab:
+                products.append(row.product)
         
+        categories_data = list(categories.values())
         if limit_categories:
-            parent_categories = parent_categories[:limit_categories]
+            categories_data = categories_data[:limit_categories]
+        return categories_data
+    
+    @staticmethod
+    def refresh_home_tabs(products_per_tab=None):
+        """
+        Rebuild the materialized home page tabs.
+        
+        Each tab is one windowed query ranking products within their parent
+        category, so the refresh costs the same number of queries however
+        many parent categories exist. The old rows are swapped for the new
+        ones in one transaction, and only one refresh runs at a time; a
+        refresh that finds another in progress leaves the stale marker and
+        returns None.
+        """
+        timeout = getattr(settings, 'HOME_TABS_REFRESH_TIMEOUT', 300)
+        if not cache.add(HOME_TABS_RUNNING_KEY, True, timeout=timeout):
+            ProductService.mark_home_tabs_stale()
+            return None
+        try:
+            return ProductService._rebuild_home_tabs(products_per_tab)
+        finally:
+            cache.delete(HOME_TABS_RUNNING_KEY)
+    
+    @staticmethod
+    def _rebuild_home_tabs(products_per_tab=None):
+        # Clear the marker first so changes made while rebuilding mark it again
+        cache.delete(HOME_TABS_STALE_KEY)
+        entries = ProductService._tab_entries(products_per_tab)
+        try:
+            with transaction.atomic():
+                HomeTabProduct.objects.all().delete()
+                HomeTabProduct.objects.bulk_create(entries)
+        except IntegrityError:
+            # Another process swapped rows in at the same time
+            ProductService.mark_home_tabs_stale()
+            return None
+        return len(entries)
+    
+    @staticmethod
+    def _live_home_tabs(products_per_tab=None):
+        """
+        Unsaved tab rows computed from the catalogue, with their product
+        and parent category loaded in one query each.
+        """
+        entries = ProductService._tab_entries(products_per_tab)
+        products = Product.objects.select_related(
+            'category__parent_category', 'brand'
+        ).in_bulk({entry.product_id for entry in entries})
+        parents = ParentCategory.objects.in_bulk({entry.parent_category_id for entry in entries})
+        for entry in entries:
+            entry.product = products[entry.product_id]
+            entry.parent_category = parents[entry.parent_category_id]
+        entries.sort(key=lambda entry: (entry.parent_category_id, entry.tab, entry.position))
+        return entries
+    
+    @staticmethod
+    def _tab_entries(products_per_tab=None):
+        """
+        Unsaved HomeTabProduct rows for every tab of every parent category.
+        """
+        products_per_tab = products_per_tab or getattr(settings, 'HOME_TAB_PRODUCTS', 8)
+        in_stock = Product.objects.filter(
+            quantity__gt=0,
+            category__parent_category__isnull=False
+        )
         
-        categories_data = []
+        totals = dict(
+            in_stock.values('category__parent_category').annotate(
+                total=Count('id')
+            ).values_list('category__parent_category', 'total')
+        )
         
-        for parent_cat in parent_categories:
-            # Base queryset for this parent category
-            base_products = Product.objects.filter(
-                category__parent_category=parent_cat,
-                quantity__gt=0
-            ).select_related('category', 'brand')
-            
-            category_data = {
-                'parent_category': parent_cat,
-                'slug': parent_cat.slug,
-                'latest_products': base_products.order_by('-created_at')[:products_per_tab],
-                'featured_products': base_products.filter(featured=True).order_by('-created_at')[:products_per_tab],
-                'best_selling_products': ProductService._get_best_selling_by_parent(parent_cat, products_per_tab),
-                'top_rating_products': base_products.filter(rating__gt=0).order_by('-rating', '-created_at')[:products_per_tab],
-                'total_products': base_products.count(),
-            }
-            
-            categories_data.append(category_data)
+        tab_querysets = {
+            'latest': in_stock,
+            'featured': in_stock.filter(featured=True),
+            'best_selling': ProductService._annotate_units_sold(in_stock),
+            'top_rating': in_stock.filter(rating__gt=0),
+        }
         
-        return categories_data
+        entries = []
+        for tab, queryset in tab_querysets.items():
+            ranked = queryset.annotate(
+                tab_position=Window(
+                    expression=RowNumber(),
+                    partition_by=[F('category__parent_category')],
+                    order_by=[
+                        F(field[1:]).desc() if field.startswith('-') else F(field).asc()
+                        for field in ProductService.TABS[tab]
+                    ]
+                )
+            ).filter(tab_position__lte=products_per_tab).values_list(
+                'category__parent_category', 'id', 'tab_position'
+            )
+            entries += [
+                HomeTabProduct(
+                    parent_category_id=parent_id,
+                    tab=tab,
+                    position=position,
+                    product_id=product_id,
+                    parent_total_products=totals.get(parent_id, 0)
+                )
+                for parent_id, product_id, position in ranked
+            ]
+        
+        return entries
+    
+    @staticmethod
+    def home_tabs_stale():
+        """True when a change marked the tabs stale or none are materialized."""
+        return bool(cache.get(HOME_TABS_STALE_KEY)) or not HomeTabProduct.objects.exists()
+    
+    @staticmethod
+    def mark_home_tabs_stale():
+        """
+        Flag the tabs for the next scheduled refresh_home_tabs --if-stale run.
+        """
+        cache.set(HOME_TABS_STALE_KEY, True, timeout=None)
+    
+    @staticmethod
+    def _annotate_units_sold(queryset):
+        """
+        Annotate products with paid units sold and their time-decayed score
+        from the daily sales table.
+        """
+        return annotate_sales(queryset)
     
     @staticmethod
     def _get_best_selling_by_parent(parent_category, limit):
         """
         Get best selling products for a parent category.
-        This is a placeholder - implement based on your sales tracking.
         """
-        # Option 1: Use rating as proxy for best selling
-        # return Product.objects.filter(
-        #     category__parent_category=parent_category,
-        #     quantity__gt=0
-        # ).order_by('-rating', '-created_at')[:limit]
-        
-        # Option 2: If you have order items, use actual sales data
-        from django.db.models import Count
-        return Product.objects.filter(
-            category__parent_category=parent_category,
-            quantity__gt=0
-        ).annotate(
-            sales_count=Count('orderitem__quantity')
-        ).order_by('-sales_count', '-created_at')[:limit]
+        return ProductService._annotate_units_sold(
+            Product.objects.filter(
+                category__parent_category=parent_category,
+                quantity__gt=0
+            )
+        ).order_by(*ProductService.TABS['best_selling'])[:limit]
     
     @staticmethod
     def get_featured_categories(limit=6):
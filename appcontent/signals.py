@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from appcontent.services import ProductService
+from ecommerce.models import Category, ParentCategory, Product, Order, Review
+from ecommerce.signals import DERIVED_PRODUCT_FIELDS
+
+
+def _mark_home_tabs_stale_on_commit():
+    # Only flag the tabs; the scheduled refresh_home_tabs --if-stale rebuilds them
+    transaction.on_commit(ProductService.mark_home_tabs_stale)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or update_fields and set(update_fields) <= DERIVED_PRODUCT_FIELDS:
+        return
+    _mark_home_tabs_stale_on_commit()
+
+
+@receiver(post_save, sender=Order)
+def order_payment_changed(sender, instance, **kwargs):
+    # Best sellers only move when an order becomes, or stops being, Paid
+    if instance.payment_status_changed and (instance.payment_status == 'Paid' or instance.was_paid):
+        _mark_home_tabs_stale_on_commit()
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=ParentCategory)
+@receiver([post_save, post_delete], sender=Review)
+def catalogue_changed(sender, **kwargs):
+    _mark_home_tabs_stale_on_commit()
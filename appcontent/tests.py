@@ -1,3 +1,79 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from appcontent.models import HomeTabProduct
+from appcontent.services import HOME_TABS_RUNNING_KEY, HOME_TABS_STALE_KEY, ProductService
+from ecommerce.models import Category, ParentCategory, Product
+
+
+class HomeTabsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        parent = ParentCategory.objects.create(parent_name='Phones')
+        category = Category.objects.create(category_name='Smartphones', parent_category=parent)
+        self.product = Product.objects.create(
+            title='Phone', price=Decimal('100.00'), description='d', quantity=3,
+            prod_img='prod_images/p.jpg', keywords='k', category=category
+        )
+        cache.clear()
+
+    @staticmethod
+    def app_queries(queries):
+        # Leave out reads and writes of the database cache table
+        return [query for query in queries.captured_queries
+                if '"ecommerce_cache"' not in query['sql'] and 'SAVEPOINT' not in query['sql']]
+
+    def test_read_never_rebuilds_tabs(self):
+        # Before the first refresh the tabs are computed without being saved
+        with CaptureQueriesContext(connection) as queries:
+            categories = ProductService.get_parent_categories_with_products()
+        self.assertEqual(categories[0]['latest_products'], [self.product])
+        self.assertFalse(any(query['sql'].startswith(('INSERT', 'DELETE'))
+                             for query in self.app_queries(queries)))
+        self.assertFalse(HomeTabProduct.objects.exists())
+        self.assertTrue(cache.get(HOME_TABS_STALE_KEY))
+
+        ProductService.refresh_home_tabs()
+        cache.set(HOME_TABS_STALE_KEY, True)
+        with CaptureQueriesContext(connection) as queries:
+            categories = ProductService.get_parent_categories_with_products()
+        self.assertEqual(len(self.app_queries(queries)), 1)
+        self.assertEqual(categories[0]['latest_products'], [self.product])
+
+    def test_changes_only_mark_tabs_stale(self):
+        ProductService.refresh_home_tabs()
+        with mock.patch.object(ProductService, 'refresh_home_tabs') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.title = 'Renamed phone'
+                self.product.save()
+        refresh.assert_not_called()
+        self.assertTrue(ProductService.home_tabs_stale())
+
+    def test_refresh_skips_while_another_runs(self):
+        cache.add(HOME_TABS_RUNNING_KEY, True)
+        self.assertIsNone(ProductService.refresh_home_tabs())
+        self.assertFalse(HomeTabProduct.objects.exists())
+        self.assertTrue(cache.get(HOME_TABS_STALE_KEY))
+
+        cache.delete(HOME_TABS_RUNNING_KEY)
+        self.assertEqual(
+            ProductService.refresh_home_tabs(), HomeTabProduct.objects.count()
+        )
+        self.assertTrue(HomeTabProduct.objects.filter(tab='latest', product=self.product).exists())
+        self.assertIsNone(cache.get(HOME_TABS_STALE_KEY))
+        self.assertIsNone(cache.get(HOME_TABS_RUNNING_KEY))
+
+    def test_command_refreshes_only_stale_tabs(self):
+        call_command('refresh_home_tabs', '--if-stale', stdout=StringIO())
+        self.assertTrue(HomeTabProduct.objects.exists())
 
-# Create your tests here.
+        HomeTabProduct.objects.update(parent_total_products=0)
+        call_command('refresh_home_tabs', '--if-stale', stdout=StringIO())
+        self.assertFalse(HomeTabProduct.objects.exclude(parent_total_products=0).exists())
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.shortcuts import render
 from ecommerce.views.services import CommonService
 from appcontent.services import ProductService
@@ -6,18 +7,34 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.db.models import Sum, Count, Avg, Q, F, DecimalField, ExpressionWrapper, DurationField
-from django.db.models.functions import TruncDate, TruncMonth, TruncWeek, ExtractHour
+from django.db.models.functions import TruncMonth, TruncWeek, ExtractHour
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
+from functools import partial
 from ecommerce.models import (
-    Order, OrderItem, Product,
-    Cart,WishlistItem, Brand
+    Order, Product,
+    Cart,WishlistItem, Brand, ProductSalesDay, CustomerStats
 )
+from ecommerce.cache import single_flight
+from ecommerce.parallel import run_parallel
+from ecommerce.kpis import KpiQuery, calendar_windows, period_windows
+from ecommerce.rollups import order_sales
 from accounts.models import CustomUser
 from payments.models import Transaction
 class ComprehensiveDashboardView(APIView):
+    """
+    Admin dashboard metrics, one cached section per panel.
+
+    ``?sections=revenue,orders`` limits the response to those sections.
+    Each section is cached per period for its DASHBOARD_SECTION_TIMEOUTS
+    entry and recomputed by a single request when it expires. Sections are
+    computed concurrently, each within its DASHBOARD_SECTION_DEADLINES
+    entry; one that fails or misses its deadline comes back as null with
+    its reason under ``errors``.
+    """
     permission_classes = [IsAuthenticated, IsAdminUser]
+    SECTIONS = ('revenue', 'orders', 'customers', 'products', 'realtime', 'charts', 'geographic', 'payments')
     
     def get(self, request):
         period = request.query_params.get('period', '30') 
@@ -26,154 +43,154 @@ class ComprehensiveDashboardView(APIView):
             days = int(period)
         except ValueError:
             days = 30
+        
+        sections = self.SECTIONS
+        if request.query_params.get('sections'):
+            sections = [name.strip() for name in request.query_params['sections'].split(',') if name.strip()]
+            unknown = [name for name in sections if name not in self.SECTIONS]
+            if unknown:
+                return Response({
+                    'error': f"Unknown sections: {', '.join(unknown)}",
+                    'sections': self.SECTIONS
+                }, status=400)
             
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
         
-        # Previous period for comparison
-        prev_end_date = start_date
-        prev_start_date = prev_end_date - timedelta(days=days)
-        
-        try:
-            # 1. REVENUE METRICS
-            revenue_metrics = self.get_revenue_metrics(start_date, end_date, prev_start_date, prev_end_date)
-            
-            # 2. ORDER METRICS
-            order_metrics = self.get_order_metrics(start_date, end_date, prev_start_date, prev_end_date)
-            
-            # 3. CUSTOMER METRICS
-            customer_metrics = self.get_customer_metrics(start_date, end_date)
-            
-            # 4. PRODUCT METRICS
-            product_metrics = self.get_product_metrics(start_date, end_date)
-            
-            # 5. REAL-TIME METRICS
-            realtime_metrics = self.get_realtime_metrics()
-            
-            # 6. CHARTS DATA
-            charts_data = self.get_charts_data(start_date, end_date)
-            
-            # 7. GEOGRAPHIC DATA
-            geographic_data = self.get_geographic_data(start_date, end_date)
-            
-            # 8. PAYMENT METRICS
-            payment_metrics = self.get_payment_metrics(start_date, end_date)
-            
-            return Response({
-                'period': {
-                    'days': days,
-                    'start_date': start_date.isoformat(),
-                    'end_date': end_date.isoformat()
-                },
-                'revenue': revenue_metrics,
-                'orders': order_metrics,
-                'customers': customer_metrics,
-                'products': product_metrics,
-                'realtime': realtime_metrics,
-                'charts': charts_data,
-                'geographic': geographic_data,
-                'payments': payment_metrics
-            })
-        except Exception as e:
+        # Sections are independent; compute them concurrently and answer
+        # with whatever finished in time
+        results, errors = run_parallel(
+            {name: partial(self.get_cached_section, name, days) for name in sections},
+            timeout=settings.DASHBOARD_SECTION_DEADLINE,
+            timeouts=settings.DASHBOARD_SECTION_DEADLINES
+        )
+        if not results:
             return Response({
                 'error': 'Internal server error',
-                'message': str(e)
+                'message': '; '.join(f'{name}: {error}' for name, error in errors.items())
             }, status=500)
-    
-    def get_revenue_metrics(self, start_date, end_date, prev_start_date, prev_end_date):
-        # Current period revenue - separate queries for different aggregations
-        current_orders = Order.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date,
-            payment_status='Paid'
-        )
         
-        # Get total revenue and count
-        current_revenue_total = current_orders.aggregate(
-            total=Sum('total'),
-            count=Count('id')
+        data = {
+            'period': {
+                'days': days,
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat()
+            }
+        }
+        for name in sections:
+            data[name] = results.get(name)
+        if errors:
+            data['errors'] = errors
+        return Response(data)
+    
+    def get_cached_section(self, name, days):
+        timeout = settings.DASHBOARD_SECTION_TIMEOUTS.get(name, 60 * 5)
+        return single_flight(
+            f'dashboard:{name}:{days}', lambda: self.get_section(name, days), timeout
         )
+    
+    def get_section(self, name, days):
+        """Compute one section for the last ``days`` days"""
+        end_date = timezone.now()
+        start_date = end_date - timedelta(days=days)
         
-        # Get average order value separately
-        current_revenue_avg = current_orders.aggregate(
-            avg=Avg('total')
-        )
+        # Previous period for comparison
+        prev_end_date = start_date
+        prev_start_date = prev_end_date - timedelta(days=days)
         
-        # Previous period revenue
-        prev_revenue = Order.objects.filter(
-            created_at__gte=prev_start_date,
-            created_at__lte=prev_end_date,
-            payment_status='Paid'
-        ).aggregate(total=Sum('total'))
+        sections = {
+            'revenue': lambda: self.get_revenue_metrics(start_date, end_date, prev_start_date, prev_end_date),
+            'orders': lambda: self.get_order_metrics(start_date, end_date, prev_start_date, prev_end_date),
+            'customers': lambda: self.get_customer_metrics(start_date, end_date),
+            'products': lambda: self.get_product_metrics(start_date, end_date),
+            'realtime': self.get_realtime_metrics,
+            'charts': lambda: self.get_charts_data(start_date, end_date),
+            'geographic': lambda: self.get_geographic_data(start_date, end_date),
+            'payments': lambda: self.get_payment_metrics(start_date, end_date),
+        }
+        return sections[name]()
+    
+    def get_revenue_metrics(self, start_date, end_date, prev_start_date, prev_end_date):
+        # Paid order totals for both periods from the daily rollup, in one query
+        current, previous = period_windows(start_date, end_date)
+        revenue = KpiQuery(order_sales().filter(payment_status='Paid')).add(
+            'total', Sum, 'total', current, default=Decimal('0')
+        ).add(
+            'count', Sum, 'orders', current
+        ).add(
+            'prev_total', Sum, 'total', previous, default=Decimal('0')
+        ).evaluate()
         
         # Calculate growth
-        current_total = current_revenue_total['total'] or Decimal('0')
-        prev_total = prev_revenue['total'] or Decimal('0')
+        current_total = revenue['total']
+        current_count = revenue['count']
+        prev_total = revenue['prev_total']
         growth = self.calculate_growth(current_total, prev_total)
         
+        # Product-level revenue comes from the daily product sales table
+        product_sales = ProductSalesDay.objects.filter(current.condition('date'))
+        
         # Revenue by category
-        revenue_by_category = OrderItem.objects.filter(
-            order__created_at__gte=start_date,
-            order__created_at__lte=end_date,
-            order__payment_status='Paid'
-        ).values(
+        revenue_by_category = product_sales.values(
             'product__category__category_name',
             'product__category__parent_category__parent_name'
         ).annotate(
-            revenue=Sum('subtotal'),
-            quantity=Sum('quantity')
+            revenue=Sum('revenue'),
+            quantity=Sum('units')
         ).order_by('-revenue')[:10]
         
         # Revenue by brand
-        revenue_by_brand = OrderItem.objects.filter(
-            order__created_at__gte=start_date,
-            order__created_at__lte=end_date,
-            order__payment_status='Paid'
-        ).values('product__brand__brand_title').annotate(
-            revenue=Sum('subtotal'),
-            quantity=Sum('quantity')
+        revenue_by_brand = product_sales.values('product__brand__brand_title').annotate(
+            revenue=Sum('revenue'),
+            quantity=Sum('units')
         ).order_by('-revenue')[:10]
         
         return {
             'total': float(current_total),
-            'order_count': current_revenue_total['count'] or 0,
-            'average_order_value': float(current_revenue_avg['avg'] or 0),
+            'order_count': current_count,
+            'average_order_value': float(current_total / current_count) if current_count else 0.0,
             'growth': growth,
             'by_category': list(revenue_by_category),
             'by_brand': list(revenue_by_brand)
         }
     
     def get_order_metrics(self, start_date, end_date, prev_start_date, prev_end_date):
-        # Current period orders
-        current_orders = Order.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date
-        )
+        # Counts and values from the daily rollup
+        current, previous = period_windows(start_date, end_date)
+        current_rollup = order_sales(*current)
         
         # Order status breakdown
-        status_breakdown = current_orders.values('status').annotate(
-            count=Count('id'),
+        status_breakdown = current_rollup.values('status').annotate(
+            count=Sum('orders'),
             revenue=Sum('total')
         ).order_by('status')
         
         # Payment status breakdown
-        payment_breakdown = current_orders.values('payment_status').annotate(
-            count=Count('id'),
+        payment_breakdown = current_rollup.values('payment_status').annotate(
+            count=Sum('orders'),
             revenue=Sum('total')
         ).order_by('payment_status')
         
-        # Orders comparison
-        current_count = current_orders.count()
-        prev_count = Order.objects.filter(
-            created_at__gte=prev_start_date,
-            created_at__lte=prev_end_date
-        ).count()
+        # Period totals and per-status counts in one query
+        kpis = KpiQuery(order_sales()).add(
+            'current', Sum, 'orders', current
+        ).add(
+            'previous', Sum, 'orders', previous
+        )
+        for order_status, _ in Order.STATUS_CHOICES:
+            kpis.add(order_status, Sum, 'orders', current, status=order_status)
+        counts = kpis.evaluate()
+        current_count = counts['current']
+        prev_count = counts['previous']
         
         # Fulfillment rate
-        fulfilled = current_orders.filter(status='Delivered').count()
+        fulfilled = counts['Delivered']
         fulfillment_rate = (fulfilled / current_count * 100) if current_count > 0 else 0
         
-        delivered_orders = current_orders.filter(
+        # Processing time needs order rows; only the period's deliveries are read
+        delivered_orders = Order.objects.filter(
+            created_at__gte=start_date,
+            created_at__lte=end_date,
             status='Delivered',
             paid_at__isnull=False,
             updated_at__isnull=False
@@ -223,11 +240,11 @@ class ComprehensiveDashboardView(APIView):
             'payment_breakdown': list(payment_breakdown),
             'fulfillment_rate': round(fulfillment_rate, 2),
             'avg_processing_days': round(avg_processing_days, 2),
-            'pending': current_orders.filter(status='Pending').count(),
-            'processing': current_orders.filter(status='Processing').count(),
-            'shipped': current_orders.filter(status='Shipped').count(),
+            'pending': counts['Pending'],
+            'processing': counts['Processing'],
+            'shipped': counts['Shipped'],
             'delivered': fulfilled,
-            'cancelled': current_orders.filter(status='Cancelled').count()
+            'cancelled': counts['Cancelled']
         }
     
     def get_customer_metrics(self, start_date, end_date):
@@ -250,12 +267,14 @@ class ComprehensiveDashboardView(APIView):
         ).filter(order_count__gt=1).count()
         
         # Customer lifetime value
-        customer_ltv = Order.objects.filter(
-            payment_status='Paid'
-        ).values('user__email', 'user__first_name', 'user__last_name').annotate(
-            total_spent=Sum('total'),
-            order_count=Count('id'),
-            avg_order=Avg('total')
+        customer_ltv = CustomerStats.objects.filter(paid_orders__gt=0).values(
+            'user__email', 'user__first_name', 'user__last_name', 'total_spent'
+        ).annotate(
+            order_count=F('paid_orders'),
+            avg_order=ExpressionWrapper(
+                F('total_spent') / F('paid_orders'),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            )
         ).order_by('-total_spent')[:10]
         
         # Customer segments
@@ -284,19 +303,18 @@ class ComprehensiveDashboardView(APIView):
     
     def get_product_metrics(self, start_date, end_date):
         # Best selling products
-        best_sellers = OrderItem.objects.filter(
-            order__created_at__gte=start_date,
-            order__created_at__lte=end_date,
-            order__payment_status='Paid'
+        best_sellers = ProductSalesDay.objects.filter(
+            date__gte=timezone.localdate(start_date),
+            date__lte=timezone.localdate(end_date)
         ).values(
             'product__id',
             'product__title',
             'product__price',
             'product__prod_img'
         ).annotate(
-            quantity_sold=Sum('quantity'),
-            revenue=Sum('subtotal'),
-            order_count=Count('order', distinct=True)
+            quantity_sold=Sum('units'),
+            revenue=Sum('revenue'),
+            order_count=Sum('orders')
         ).order_by('-quantity_sold')[:10]
         
         # Low stock products
@@ -309,24 +327,21 @@ class ComprehensiveDashboardView(APIView):
         out_of_stock = Product.objects.filter(quantity=0).count()
         
         # Product performance by category
-        category_performance = OrderItem.objects.filter(
-            order__created_at__gte=start_date,
-            order__created_at__lte=end_date,
-            order__payment_status='Paid'
-        ).values(
+        product_sales = ProductSalesDay.objects.filter(
+            date__gte=timezone.localdate(start_date),
+            date__lte=timezone.localdate(end_date)
+        )
+        category_performance = product_sales.values(
             'product__category__category_name'
         ).annotate(
             products_sold=Count('product', distinct=True),
-            quantity_sold=Sum('quantity'),
-            revenue=Sum('subtotal')
+            quantity_sold=Sum('units'),
+            revenue=Sum('revenue')
         ).order_by('-revenue')
         
         # Product views to purchase conversion
         total_products = Product.objects.count()
-        products_with_sales = OrderItem.objects.filter(
-            order__created_at__gte=start_date,
-            order__created_at__lte=end_date
-        ).values('product').distinct().count()
+        products_with_sales = product_sales.values('product').distinct().count()
         
         return {
             'best_sellers': list(best_sellers),
@@ -338,14 +353,17 @@ class ComprehensiveDashboardView(APIView):
         }
     
     def get_realtime_metrics(self):
-        today = timezone.now().date()
-        current_hour = timezone.now().hour
+        today = timezone.localdate()
+        current_hour = timezone.localtime().hour
         
         # Today's metrics
-        today_orders = Order.objects.filter(created_at__date=today)
-        today_revenue = today_orders.filter(payment_status='Paid').aggregate(
-            total=Sum('total')
-        )['total'] or Decimal('0')
+        today_window = calendar_windows(today)['today']
+        today_stats = KpiQuery(order_sales()).add(
+            'orders', Sum, 'orders', today_window
+        ).add(
+            'revenue', Sum, 'total', today_window, default=Decimal('0'), payment_status='Paid'
+        ).evaluate()
+        today_revenue = today_stats['revenue']
         
         # Active carts
         active_carts = Cart.objects.filter(
@@ -364,28 +382,27 @@ class ComprehensiveDashboardView(APIView):
         ).count()
         
         return {
-            'today_orders': today_orders.count(),
+            'today_orders': today_stats['orders'],
             'today_revenue': float(today_revenue),
             'active_carts': active_carts,
             'abandoned_carts': abandoned_carts,
-            'current_hour_orders': today_orders.filter(created_at__hour=current_hour).count(),
+            'current_hour_orders': Order.objects.filter(
+                created_at__date=today, created_at__hour=current_hour
+            ).count(),
             'wishlist_items': wishlist_items
         }
     
     def get_charts_data(self, start_date, end_date):
+        rollup = order_sales(timezone.localdate(start_date), timezone.localdate(end_date))
+        paid_rollup = rollup.filter(payment_status='Paid')
+        
         # Daily revenue chart
-        daily_revenue = Order.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date,
-            payment_status='Paid'
-        ).annotate(
-            date=TruncDate('created_at')
-        ).values('date').annotate(
+        daily_revenue = paid_rollup.values('date').annotate(
             revenue=Sum('total'),
-            orders=Count('id')
+            orders=Sum('orders')
         ).order_by('date')
         
-        # Hourly distribution
+        # Hourly distribution; the rollup is daily, so this reads the period's orders
         hourly_distribution = Order.objects.filter(
             created_at__gte=start_date,
             created_at__lte=end_date
@@ -396,24 +413,16 @@ class ComprehensiveDashboardView(APIView):
         ).order_by('hour')
         
         # Weekly comparison
-        weekly_data = Order.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date,
-            payment_status='Paid'
-        ).annotate(
-            week=TruncWeek('created_at')
+        weekly_data = paid_rollup.annotate(
+            week=TruncWeek('date')
         ).values('week').annotate(
             revenue=Sum('total'),
-            orders=Count('id')
+            orders=Sum('orders')
         ).order_by('week')
         
         # Payment methods distribution
-        payment_methods = Order.objects.filter(
-            created_at__gte=start_date,
-            created_at__lte=end_date,
-            payment_status='Paid'
-        ).values('payment_method').annotate(
-            count=Count('id'),
+        payment_methods = paid_rollup.values('payment_method').annotate(
+            count=Sum('orders'),
             revenue=Sum('total')
         ).order_by('-count')
         
@@ -425,22 +434,36 @@ class ComprehensiveDashboardView(APIView):
         }
     
     def get_geographic_data(self, start_date, end_date):
-        # Orders by city
-        geographic_distribution = Order.objects.filter(
+        # Orders by city, from the daily rollup
+        geographic_distribution = list(order_sales(
+            timezone.localdate(start_date), timezone.localdate(end_date)
+        ).exclude(county='').values(
+            shipping_address__city=F('city'),
+            shipping_address__county=F('county')
+        ).annotate(
+            orders=Sum('orders'),
+            revenue=Sum('total')
+        ).order_by('-orders')[:20])
+        
+        # Distinct customers do not add up across days; count them for the listed cities only
+        customers = Order.objects.filter(
             created_at__gte=start_date,
             created_at__lte=end_date,
-            shipping_address__isnull=False
-        ).values(
-            'shipping_address__city',
-            'shipping_address__county'
-        ).annotate(
-            orders=Count('id'),
-            revenue=Sum('total'),
+            shipping_address__city__in={row['shipping_address__city'] for row in geographic_distribution}
+        ).values('shipping_address__city', 'shipping_address__county').annotate(
             customers=Count('user', distinct=True)
-        ).order_by('-orders')[:20]
+        ).order_by()
+        customers = {
+            (row['shipping_address__city'], row['shipping_address__county']): row['customers']
+            for row in customers
+        }
+        for row in geographic_distribution:
+            row['customers'] = customers.get(
+                (row['shipping_address__city'], row['shipping_address__county']), 0
+            )
         
         return {
-            'distribution': list(geographic_distribution)
+            'distribution': geographic_distribution
         }
     
     def get_payment_metrics(self, start_date, end_date):
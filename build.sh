@@ -11,3 +11,5 @@ pip install -r requirements.txt
 
 python manage.py collectstatic --no-input --settings=ecommerce_proj.settings.prod
 python manage.py migrate --settings=ecommerce_proj.settings.prod
+python manage.py createcachetable --settings=ecommerce_proj.settings.prod
+python manage.py refresh_home_tabs --settings=ecommerce_proj.settings.prod
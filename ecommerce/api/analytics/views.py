@@ -2,13 +2,16 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from django.db.models import Sum, Count, Avg, Q, F
+from django.db.models import Sum, Count, Avg, Q, F, OuterRef, Subquery
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
 from collections import defaultdict
 
-from ecommerce.models import Order, OrderItem, Product, Category, ParentCategory
+from ecommerce.models import Order, Product, Category, ParentCategory, ProductSalesDay, Review
+from ecommerce.kpis import KpiQuery, calendar_windows
+from ecommerce.rollups import order_sales
+from ecommerce.sales import annotate_sales
 from accounts.models import CustomUser as User
 from .serializers import (
     OrderAnalyticsSerializer, 
@@ -40,36 +43,25 @@ class OrderAnalyticsView(APIView):
             else:
                 end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
             
-            # Base queryset
-            orders = Order.objects.all()
-            
-            # Date-based calculations
-            today = timezone.now().date()
-            week_start = today - timedelta(days=today.weekday())
-            month_start = today.replace(day=1)
-            last_month_start = (month_start - timedelta(days=1)).replace(day=1)
-            last_month_end = month_start - timedelta(days=1)
-            
-            # Total orders by status
-            total_orders = orders.count()
-            status_counts = orders.values('status').annotate(count=Count('id'))
-            status_dict = {item['status']: item['count'] for item in status_counts}
-            
-            # Time-based order counts
-            orders_today = orders.filter(created_at__date=today).count()
-            orders_this_week = orders.filter(created_at__date__gte=week_start).count()
-            orders_this_month = orders.filter(created_at__date__gte=month_start).count()
-            orders_last_month = orders.filter(
-                created_at__date__gte=last_month_start,
-                created_at__date__lte=last_month_end
-            ).count()
+            # Every count comes from the daily rollup in one query
+            windows = calendar_windows()
+            kpis = KpiQuery(order_sales()).add('total_orders', Sum, 'orders').add(
+                'total_value', Sum, 'total', default=Decimal('0.00')
+            )
+            for order_status, _ in Order.STATUS_CHOICES:
+                kpis.add(f'status_{order_status}', Sum, 'orders', status=order_status)
+            for name in ('today', 'this_week', 'this_month', 'last_month', 'last_week'):
+                kpis.add(f'orders_{name}', Sum, 'orders', windows[name])
+            counts = kpis.evaluate()
+            
+            total_orders = counts['total_orders']
+            orders_today = counts['orders_today']
+            orders_this_week = counts['orders_this_week']
+            orders_this_month = counts['orders_this_month']
+            orders_last_month = counts['orders_last_month']
+            last_week_orders = counts['orders_last_week']
             
             # Growth calculations
-            last_week_orders = orders.filter(
-                created_at__date__gte=week_start - timedelta(days=7),
-                created_at__date__lt=week_start
-            ).count()
-            
             weekly_growth_rate = (
                 ((orders_this_week - last_week_orders) / last_week_orders * 100)
                 if last_week_orders > 0 else 0
@@ -81,18 +73,18 @@ class OrderAnalyticsView(APIView):
             )
             
             # Average order value
-            avg_order_value = orders.aggregate(
-                avg_total=Avg('total')
-            )['avg_total'] or Decimal('0.00')
+            avg_order_value = (
+                counts['total_value'] / total_orders if total_orders else Decimal('0.00')
+            )
             
             analytics_data = {
                 'total_orders': total_orders,
-                'pending_orders': status_dict.get('Pending', 0),
-                'processing_orders': status_dict.get('Processing', 0),
-                'shipped_orders': status_dict.get('Shipped', 0),
-                'delivered_orders': status_dict.get('Delivered', 0),
-                'cancelled_orders': status_dict.get('Cancelled', 0),
-                'refunded_orders': status_dict.get('Refunded', 0),
+                'pending_orders': counts['status_Pending'],
+                'processing_orders': counts['status_Processing'],
+                'shipped_orders': counts['status_Shipped'],
+                'delivered_orders': counts['status_Delivered'],
+                'cancelled_orders': counts['status_Cancelled'],
+                'refunded_orders': counts['status_Refunded'],
                 'orders_today': orders_today,
                 'orders_this_week': orders_this_week,
                 'orders_this_month': orders_this_month,
@@ -121,43 +113,23 @@ class SalesMetricsView(APIView):
     
     def get(self, request):
         try:
-            # Date calculations
-            today = timezone.now().date()
-            week_start = today - timedelta(days=today.weekday())
-            month_start = today.replace(day=1)
-            last_month_start = (month_start - timedelta(days=1)).replace(day=1)
-            last_month_end = month_start - timedelta(days=1)
-            
-            # Revenue calculations
-            paid_orders = Order.objects.filter(payment_status='Paid')
-            
-            total_revenue = paid_orders.aggregate(
-                total=Sum('total')
-            )['total'] or Decimal('0.00')
-            
-            revenue_today = paid_orders.filter(
-                created_at__date=today
-            ).aggregate(total=Sum('total'))['total'] or Decimal('0.00')
-            
-            revenue_this_week = paid_orders.filter(
-                created_at__date__gte=week_start
-            ).aggregate(total=Sum('total'))['total'] or Decimal('0.00')
-            
-            revenue_this_month = paid_orders.filter(
-                created_at__date__gte=month_start
-            ).aggregate(total=Sum('total'))['total'] or Decimal('0.00')
+            # Revenue calculations, from the daily rollup of paid orders in one query
+            windows = calendar_windows()
+            kpis = KpiQuery(order_sales().filter(payment_status='Paid')).add(
+                'total_revenue', Sum, 'total', default=Decimal('0.00')
+            )
+            for name in ('today', 'this_week', 'this_month', 'last_month', 'last_week'):
+                kpis.add(f'revenue_{name}', Sum, 'total', windows[name], default=Decimal('0.00'))
+            revenue = kpis.evaluate()
             
-            revenue_last_month = paid_orders.filter(
-                created_at__date__gte=last_month_start,
-                created_at__date__lte=last_month_end
-            ).aggregate(total=Sum('total'))['total'] or Decimal('0.00')
+            total_revenue = revenue['total_revenue']
+            revenue_today = revenue['revenue_today']
+            revenue_this_week = revenue['revenue_this_week']
+            revenue_this_month = revenue['revenue_this_month']
+            revenue_last_month = revenue['revenue_last_month']
+            last_week_revenue = revenue['revenue_last_week']
             
             # Growth calculations
-            last_week_revenue = paid_orders.filter(
-                created_at__date__gte=week_start - timedelta(days=7),
-                created_at__date__lt=week_start
-            ).aggregate(total=Sum('total'))['total'] or Decimal('0.00')
-            
             weekly_revenue_growth = (
                 float((revenue_this_week - last_week_revenue) / last_week_revenue * 100)
                 if last_week_revenue > 0 else 0
@@ -168,25 +140,21 @@ class SalesMetricsView(APIView):
                 if revenue_last_month > 0 else 0
             )
             
-            # Product metrics
-            total_products_sold = OrderItem.objects.filter(
-                order__payment_status='Paid'
-            ).aggregate(total=Sum('quantity'))['total'] or 0
+            # Product metrics, served from the daily sales table
+            total_products_sold = ProductSalesDay.objects.aggregate(
+                total=Sum('units')
+            )['total'] or 0
             
             # Top selling products
-            top_products = OrderItem.objects.filter(
-                order__payment_status='Paid'
-            ).values('product__title').annotate(
-                total_sold=Sum('quantity'),
-                total_revenue=Sum('subtotal')
+            top_products = ProductSalesDay.objects.values('product__title').annotate(
+                total_sold=Sum('units'),
+                total_revenue=Sum('revenue')
             ).order_by('-total_sold')[:10]
             
             # Top categories
-            top_categories = OrderItem.objects.filter(
-                order__payment_status='Paid'
-            ).values('product__category__category_name').annotate(
-                total_sold=Sum('quantity'),
-                total_revenue=Sum('subtotal')
+            top_categories = ProductSalesDay.objects.values('product__category__category_name').annotate(
+                total_sold=Sum('units'),
+                total_revenue=Sum('revenue')
             ).order_by('-total_revenue')[:10]
             
             # Customer metrics
@@ -238,28 +206,37 @@ class ProductAnalyticsView(APIView):
             # Get query parameters
             limit = int(request.query_params.get('limit', 20))
             category_id = request.query_params.get('category_id')
-            
-            # Base queryset for products with sales data
-            products_query = Product.objects.annotate(
-                total_sold=Sum('orderitem__quantity', filter=Q(orderitem__order__payment_status='Paid')),
-                total_revenue=Sum('orderitem__subtotal', filter=Q(orderitem__order__payment_status='Paid')),
-                avg_rating=Avg('reviews__rating')
-            ).filter(total_sold__isnull=False)
+            days = request.query_params.get('days')
+            
+            # Rank by raw units, or by time-decayed sales with ?sort=trending
+            sort = '-sales_score' if request.query_params.get('sort') == 'trending' else '-units_sold'
+            
+            # Sales totals come from the daily sales table; the rating is a
+            # subquery so the review join cannot multiply the sums
+            products_query = annotate_sales(
+                Product.objects.all(), days=int(days) if days else None
+            ).annotate(
+                avg_rating=Subquery(
+                    Review.objects.filter(product=OuterRef('pk')).values('product').annotate(
+                        avg=Avg('rating')
+                    ).values('avg')[:1]
+                )
+            ).filter(units_sold__gt=0)
             
             # Filter by category if provided
             if category_id:
                 products_query = products_query.filter(category_id=category_id)
             
-            # Order by total sold and limit results
-            products = products_query.order_by('-total_sold')[:limit]
+            # Order by sales and limit results
+            products = products_query.order_by(sort, '-id')[:limit]
             
             analytics_data = []
             for product in products:
                 analytics_data.append({
                     'product_id': product.id,
                     'product_name': product.title,
-                    'total_sold': product.total_sold or 0,
-                    'total_revenue': product.total_revenue or Decimal('0.00'),
+                    'total_sold': product.units_sold,
+                    'total_revenue': product.sales_revenue,
                     'average_rating': round(product.avg_rating or 0, 2),
                     'stock_level': product.quantity,
                 })
@@ -320,26 +297,31 @@ class DashboardSummaryView(APIView):
     
     def get(self, request):
         try:
-            today = timezone.now().date()
-            month_start = today.replace(day=1)
+            this_month = calendar_windows()['this_month']
+            
+            # Order figures from the daily rollup
+            orders = KpiQuery(order_sales()).add(
+                'total_orders', Sum, 'orders'
+            ).add(
+                'total_revenue', Sum, 'total', default=Decimal('0.00'), payment_status='Paid'
+            ).add(
+                'orders_this_month', Sum, 'orders', this_month
+            ).add(
+                'revenue_this_month', Sum, 'total', this_month, default=Decimal('0.00'), payment_status='Paid'
+            ).add(
+                'pending_orders', Sum, 'orders', status='Pending'
+            ).evaluate()
             
             # Quick summary metrics
             summary = {
-                'total_orders': Order.objects.count(),
-                'total_revenue': Order.objects.filter(
-                    payment_status='Paid'
-                ).aggregate(total=Sum('total'))['total'] or Decimal('0.00'),
-                'orders_this_month': Order.objects.filter(
-                    created_at__date__gte=month_start
-                ).count(),
-                'revenue_this_month': Order.objects.filter(
-                    payment_status='Paid',
-                    created_at__date__gte=month_start
-                ).aggregate(total=Sum('total'))['total'] or Decimal('0.00'),
+                'total_orders': orders['total_orders'],
+                'total_revenue': orders['total_revenue'],
+                'orders_this_month': orders['orders_this_month'],
+                'revenue_this_month': orders['revenue_this_month'],
                 'total_products': Product.objects.count(),
                 'low_stock_products': Product.objects.filter(quantity__lt=10).count(),
                 'total_customers': User.objects.count(),
-                'pending_orders': Order.objects.filter(status='Pending').count(),
+                'pending_orders': orders['pending_orders'],
             }
             
             return Response(summary, status=status.HTTP_200_OK)
@@ -5,14 +5,18 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum, Count, Avg, Q, F
+from django.db import transaction
+from django.db.models import Sum, Count, Q, F, DecimalField, ExpressionWrapper
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.contrib.auth import get_user_model
-from django.db.models.functions import TruncDate, TruncMonth, TruncYear
+from django.db.models.functions import TruncMonth, TruncYear
 from django.utils import timezone
 from datetime import datetime, timedelta
-from ecommerce.models import Order, OrderItem
+from ecommerce.models import Order, ProductSalesDay, CustomerStats
+from ecommerce.exports import streaming_export
+from ecommerce.kpis import KpiQuery, Window, calendar_windows
+from ecommerce.rollups import defer_rollup_refresh, order_sales
 from .serializers import OrderListSerializer, OrderDetailSerializer
 
 User = get_user_model()
@@ -45,6 +49,9 @@ class OrderViewSet(viewsets.ModelViewSet):
             queryset = queryset.prefetch_related('items').annotate(
                 items_count=Count('items')
             )
+        elif self.action in ('export_csv', 'export_excel'):
+            # Counted in SQL; exports stream rows, so nothing is prefetched
+            queryset = queryset.annotate(items_count=Count('items'))
         
         return queryset
     
@@ -134,99 +141,53 @@ class OrderViewSet(viewsets.ModelViewSet):
             'tracking_number': tracking_number
         })
     
-    # @action(detail=False, methods=['get'])
-    # def export_csv(self, request):
-    #     """Export orders to CSV"""
-    #     queryset = self.filter_queryset(self.get_queryset())
-        
-    #     response = HttpResponse(content_type='text/csv')
-    #     response['Content-Disposition'] = 'attachment; filename="orders_export.csv"'
-        
-    #     writer = csv.writer(response)
-    #     writer.writerow([
-    #         'Order Number', 'Date', 'Customer Name', 'Customer Email', 
-    #         'Status', 'Payment Status', 'Total', 'Items Count',
-    #         'Shipping Address', 'Phone'
-    #     ])
-        
-    #     for order in queryset:
-    #         customer_name = f"{order.shipping_address.first_name} {order.shipping_address.last_name}" if order.shipping_address else order.user.get_full_name()
-    #         shipping_address = ""
-    #         phone = ""
-            
-    #         if order.shipping_address:
-    #             addr = order.shipping_address
-    #             shipping_address = f"{addr.street_address}, {addr.city}, {addr.county} {addr.postal_code}"
-    #             phone = addr.phone
-            
-    #         writer.writerow([
-    #             order.order_number,
-    #             order.created_at.strftime('%Y-%m-%d %H:%M'),
-    #             customer_name,
-    #             order.user.email,
-    #             order.status,
-    #             order.payment_status,
-    #             order.total,
-    #             order.items.count(),
-    #             shipping_address,
-    #             phone
-    #         ])
-        
-    #     return response
+    EXPORT_HEADER = [
+        'Order Number', 'Date', 'Customer Name', 'Customer Email',
+        'Status', 'Payment Status', 'Total', 'Items Count',
+        'Shipping Address', 'Phone', 'Payment Method'
+    ]
     
-    # @action(detail=False, methods=['get'])
-    # def export_excel(self, request):
-    #     """Export orders to Excel"""
-    #     queryset = self.filter_queryset(self.get_queryset())
-        
-    #     wb = Workbook()
-    #     ws = wb.active
-    #     ws.title = "Orders"
-        
-    #     # Headers
-    #     headers = [
-    #         'Order Number', 'Date', 'Customer Name', 'Customer Email',
-    #         'Status', 'Payment Status', 'Total', 'Items Count',
-    #         'Shipping Address', 'Phone', 'Payment Method'
-    #     ]
-    #     ws.append(headers)
-        
-    #     for order in queryset:
-    #         customer_name = f"{order.shipping_address.first_name} {order.shipping_address.last_name}" if order.shipping_address else order.user.get_full_name()
-    #         shipping_address = ""
-    #         phone = ""
+    def _export_rows(self, queryset):
+        """Yield one export row per order, reading the queryset in chunks"""
+        for order in queryset.iterator(chunk_size=2000):
+            addr = order.shipping_address
+            if addr:
+                customer_name = f"{addr.first_name} {addr.last_name}"
+                shipping_address = f"{addr.street_address}, {addr.city}, {addr.county} {addr.postal_code}"
+                phone = addr.phone
+            else:
+                customer_name = order.user.get_full_name()
+                shipping_address = phone = ""
             
-    #         if order.shipping_address:
-    #             addr = order.shipping_address
-    #             shipping_address = f"{addr.street_address}, {addr.city}, {addr.county} {addr.postal_code}"
-    #             phone = addr.phone
-            
-    #         ws.append([
-    #             order.order_number,
-    #             order.created_at.strftime('%Y-%m-%d %H:%M'),
-    #             customer_name,
-    #             order.user.email,
-    #             order.status,
-    #             order.payment_status,
-    #             float(order.total),
-    #             order.items.count(),
-    #             shipping_address,
-    #             phone,
-    #             order.payment_method or 'N/A'
-    #         ])
-        
-    #     # Save to BytesIO
-    #     excel_file = BytesIO()
-    #     wb.save(excel_file)
-    #     excel_file.seek(0)
-        
-    #     response = HttpResponse(
-    #         excel_file.getvalue(),
-    #         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    #     )
-    #     response['Content-Disposition'] = 'attachment; filename="orders_export.xlsx"'
-        
-    #     return response
+            yield [
+                order.order_number,
+                order.created_at,
+                customer_name,
+                order.user.email,
+                order.status,
+                order.payment_status,
+                order.total,
+                order.items_count,
+                shipping_address,
+                phone,
+                order.payment_method or 'N/A'
+            ]
+    
+    def _export(self, kind):
+        queryset = self.filter_queryset(self.get_queryset())
+        return streaming_export(
+            kind, 'orders_export', self.EXPORT_HEADER, self._export_rows(queryset), sheet_name='Orders'
+        )
+    
+    @action(detail=False, methods=['get'], url_path='export-csv')
+    def export_csv(self, request):
+        """Stream the filtered orders as CSV"""
+        return self._export('csv')
+    
+    @action(detail=False, methods=['get'], url_path='export-excel')
+    def export_excel(self, request):
+        """Stream the filtered orders as an Excel (XLSX) workbook"""
+        return self._export('xlsx')
     
     @action(detail=False, methods=['get'])
     def bulk_update_status(self, request):
@@ -246,7 +207,12 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        updated = Order.objects.filter(id__in=order_ids).update(status=new_status)
+        orders = Order.objects.filter(id__in=order_ids)
+        with transaction.atomic():
+            # update() skips the save signals that keep the rollups current
+            for day in orders.datetimes('created_at', 'day'):
+                defer_rollup_refresh(timezone.localdate(day))
+            updated = orders.update(status=new_status, updated_at=timezone.now())
         
         return Response({
             'status': 'Orders updated',
@@ -262,49 +228,52 @@ class OrderAnalyticsView(APIView):
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
         
-        # Base queryset for the period
-        orders = Order.objects.filter(created_at__gte=start_date, created_at__lte=end_date)
+        # Order counts and values come from the daily rollup
+        period = Window(timezone.localdate(start_date), timezone.localdate(end_date))
+        rollup = order_sales(*period)
         
         # Overall statistics
-        total_orders = orders.count()
-        total_revenue = orders.filter(payment_status='Paid').aggregate(
-            total=Sum('total')
-        )['total'] or 0
-        
-        avg_order_value = orders.filter(payment_status='Paid').aggregate(
-            avg=Avg('total')
-        )['avg'] or 0
+        summary = KpiQuery(rollup).add(
+            'total_orders', Sum, 'orders', period
+        ).add(
+            'paid_orders', Sum, 'orders', period, payment_status='Paid'
+        ).add(
+            'total_revenue', Sum, 'total', period, payment_status='Paid'
+        ).evaluate()
+        total_orders = summary['total_orders']
+        total_revenue = summary['total_revenue']
+        avg_order_value = total_revenue / summary['paid_orders'] if summary['paid_orders'] else 0
         
         # Orders by status
-        orders_by_status = orders.values('status').annotate(
-            count=Count('id'),
+        orders_by_status = rollup.values('status').annotate(
+            count=Sum('orders'),
             total=Sum('total')
         ).order_by('status')
         
         # Orders by payment status
-        orders_by_payment_status = orders.values('payment_status').annotate(
-            count=Count('id'),
+        orders_by_payment_status = rollup.values('payment_status').annotate(
+            count=Sum('orders'),
             total=Sum('total')
         ).order_by('payment_status')
         
         # Daily revenue for the period
-        daily_revenue = orders.filter(payment_status='Paid').annotate(
-            date=TruncDate('created_at')
-        ).values('date').annotate(
-            orders=Count('id'),
+        daily_revenue = rollup.filter(payment_status='Paid').values('date').annotate(
+            orders=Sum('orders'),
             revenue=Sum('total')
         ).order_by('date')
         
         # Top selling products
-        top_products = OrderItem.objects.filter(
-            order__created_at__gte=start_date,
-            order__created_at__lte=end_date,
-            order__payment_status='Paid'
-        ).values('product_name').annotate(
-            quantity_sold=Sum('quantity'),
-            revenue=Sum('subtotal')
+        top_products = ProductSalesDay.objects.filter(
+            date__gte=timezone.localdate(start_date),
+            date__lte=timezone.localdate(end_date)
+        ).values(product_name=F('product__title')).annotate(
+            quantity_sold=Sum('units'),
+            revenue=Sum('revenue')
         ).order_by('-quantity_sold')[:10]
         
+        # Customers and recent orders need order rows; both are bounded by the period
+        orders = Order.objects.filter(created_at__gte=start_date, created_at__lte=end_date)
+        
         # Customer statistics
         top_customers = orders.filter(payment_status='Paid').values(
             'user__email', 'user__first_name', 'user__last_name'
@@ -338,49 +307,45 @@ class OrderDashboardStatsView(APIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
     
     def get(self, request):
-        today = timezone.now().date()
-        
-        # Today's stats
-        today_orders = Order.objects.filter(created_at__date=today)
-        today_revenue = today_orders.filter(payment_status='Paid').aggregate(
-            total=Sum('total')
-        )['total'] or 0
-        
-        # This month's stats
-        current_month_orders = Order.objects.filter(
-            created_at__month=today.month,
-            created_at__year=today.year
-        )
-        month_revenue = current_month_orders.filter(payment_status='Paid').aggregate(
-            total=Sum('total')
-        )['total'] or 0
-        
-        # Pending orders
-        pending_orders = Order.objects.filter(status='Pending').count()
-        
-        # Processing orders
-        processing_orders = Order.objects.filter(status='Processing').count()
-        
-        # Failed payments
-        failed_payments = Order.objects.filter(payment_status='Failed').count()
+        windows = calendar_windows()
+        
+        # Today's and this month's stats come from the daily rollup, in one query
+        stats = KpiQuery(order_sales()).add(
+            'today_orders', Sum, 'orders', windows['today']
+        ).add(
+            'today_revenue', Sum, 'total', windows['today'], payment_status='Paid'
+        ).add(
+            'month_orders', Sum, 'orders', windows['this_month']
+        ).add(
+            'month_revenue', Sum, 'total', windows['this_month'], payment_status='Paid'
+        ).add(
+            'pending_orders', Sum, 'orders', status='Pending'
+        ).add(
+            'processing_orders', Sum, 'orders', status='Processing'
+        ).add(
+            'failed_payments', Sum, 'orders', payment_status='Failed'
+        ).add(
+            'total_orders', Sum, 'orders'
+        ).add(
+            'paid_orders', Sum, 'orders', payment_status='Paid'
+        ).evaluate()
         
         # Conversion rate (paid orders / total orders)
-        total_orders = Order.objects.count()
-        paid_orders = Order.objects.filter(payment_status='Paid').count()
-        conversion_rate = (paid_orders / total_orders * 100) if total_orders > 0 else 0
+        total_orders = stats['total_orders']
+        conversion_rate = (stats['paid_orders'] / total_orders * 100) if total_orders > 0 else 0
         
         return Response({
             'today': {
-                'orders': today_orders.count(),
-                'revenue': float(today_revenue)
+                'orders': stats['today_orders'],
+                'revenue': float(stats['today_revenue'])
             },
             'this_month': {
-                'orders': current_month_orders.count(),
-                'revenue': float(month_revenue)
+                'orders': stats['month_orders'],
+                'revenue': float(stats['month_revenue'])
             },
-            'pending_orders': pending_orders,
-            'processing_orders': processing_orders,
-            'failed_payments': failed_payments,
+            'pending_orders': stats['pending_orders'],
+            'processing_orders': stats['processing_orders'],
+            'failed_payments': stats['failed_payments'],
             'conversion_rate': round(conversion_rate, 2)
         })
 
@@ -391,45 +356,33 @@ class RevenueAnalyticsView(APIView):
         period = request.query_params.get('period', 'monthly')
         year = int(request.query_params.get('year', timezone.now().year))
         
-        orders = Order.objects.filter(
-            payment_status='Paid',
-            created_at__year=year
-        )
+        # Paid order totals per day from the rollup
+        rollup = order_sales().filter(payment_status='Paid')
         
         if period == 'daily':
             month = int(request.query_params.get('month', timezone.now().month))
-            orders = orders.filter(created_at__month=month)
-            
-            revenue_data = orders.annotate(
-                date=TruncDate('created_at')
-            ).values('date').annotate(
-                revenue=Sum('total'),
-                orders=Count('id'),
-                avg_order_value=Avg('total')
-            ).order_by('date')
+            rollup = rollup.filter(date__year=year, date__month=month)
+            bucket = 'date'
             
         elif period == 'monthly':
-            revenue_data = orders.annotate(
-                month=TruncMonth('created_at')
-            ).values('month').annotate(
-                revenue=Sum('total'),
-                orders=Count('id'),
-                avg_order_value=Avg('total')
-            ).order_by('month')
+            rollup = rollup.filter(date__year=year).annotate(month=TruncMonth('date'))
+            bucket = 'month'
             
         else:  # yearly
-            orders = Order.objects.filter(payment_status='Paid')
-            revenue_data = orders.annotate(
-                year=TruncYear('created_at')
-            ).values('year').annotate(
-                revenue=Sum('total'),
-                orders=Count('id'),
-                avg_order_value=Avg('total')
-            ).order_by('year')
+            rollup = rollup.annotate(year=TruncYear('date'))
+            bucket = 'year'
+        
+        revenue_data = rollup.values(bucket).annotate(
+            revenue=Sum('total'),
+            orders=Sum('orders')
+        ).order_by(bucket)
         
         return Response({
             'period': period,
-            'data': list(revenue_data)
+            'data': [
+                {**row, 'avg_order_value': round(row['revenue'] / row['orders'], 2) if row['orders'] else None}
+                for row in revenue_data
+            ]
         })
         
 class CustomerOrderAnalyticsView(APIView):
@@ -447,12 +400,14 @@ class CustomerOrderAnalyticsView(APIView):
         ).order_by('month')
         
         # Customer lifetime value
-        customer_ltv = Order.objects.filter(
-            payment_status='Paid'
-        ).values('user').annotate(
-            total_spent=Sum('total'),
-            orders_count=Count('id'),
-            avg_order_value=Avg('total')
+        customer_ltv = CustomerStats.objects.filter(paid_orders__gt=0).values(
+            'user', 'total_spent'
+        ).annotate(
+            orders_count=F('paid_orders'),
+            avg_order_value=ExpressionWrapper(
+                F('total_spent') / F('paid_orders'),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            )
         ).order_by('-total_spent')[:20]
         
         # Repeat customer rate
@@ -464,10 +419,10 @@ class CustomerOrderAnalyticsView(APIView):
         repeat_rate = (repeat_customers / customers_with_orders * 100) if customers_with_orders > 0 else 0
         
         # Geographic distribution
-        geographic_distribution = Order.objects.filter(
-            shipping_address__isnull=False
-        ).values('shipping_address__county').annotate(
-            orders=Count('id'),
+        geographic_distribution = order_sales().exclude(county='').values(
+            shipping_address__county=F('county')
+        ).annotate(
+            orders=Sum('orders'),
             revenue=Sum('total')
         ).order_by('-orders')[:10]
         
@@ -0,0 +1,62 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+from ecommerce.pagination import KeysetPaginator, InvalidCursor
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Opt-in keyset pagination for catalog endpoints.
+
+    Only active when the ``cursor`` query parameter is present (an empty
+    value requests the first page), so existing clients keep receiving
+    unpaginated lists. Pass ``with_count=true`` for an approximate total.
+    A cursor that cannot be decoded is answered with 400.
+    """
+    page_size = 12
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    count_query_param = 'with_count'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return None
+
+        self.request = request
+        self.paginator = KeysetPaginator(
+            queryset,
+            self.get_page_size(request),
+            ordering=request.query_params.get(self.ordering_query_param)
+        )
+        try:
+            self.page = self.paginator.get_page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor as e:
+            raise ValidationError({self.cursor_query_param: [str(e)]})
+        return list(self.page)
+
+    def _cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.ordering_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self._cursor_link(self.page.next_cursor),
+            'previous': self._cursor_link(self.page.previous_cursor),
+        }
+        if self.request.query_params.get(self.count_query_param, '').lower() == 'true':
+            payload['count'] = self.paginator.count
+        payload['results'] = data
+        return Response(payload)
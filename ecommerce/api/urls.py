@@ -3,7 +3,8 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     BrandViewSet, CategoryViewSet, ProductViewSet, 
     ReviewViewSet, CartViewSet, WishlistViewSet,
-    ProductImageViewSet, ProductVariantViewSet, ParendCategoryViewSet
+    ProductImageViewSet, ProductVariantViewSet, ParendCategoryViewSet,
+    AutocompleteView
 )
 
 router = DefaultRouter()
@@ -18,5 +19,6 @@ router.register('product-images', ProductImageViewSet, basename='product-image')
 router.register('product-variants', ProductVariantViewSet, basename='product-variant')
 
 urlpatterns = [
+    path('autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,9 +1,11 @@
+import io
 from rest_framework import viewsets
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework import status
 from django.db import transaction
 from rest_framework.decorators import action
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from ecommerce.models import (
     Brand, Category, Product, Review, Order, Cart, 
@@ -15,6 +17,10 @@ from .serializers import (
     ProductVariantSerializer, BulkProductImageSerializer, ParentCategorySerializer
 )
 from appcontent.utils import IsAdminUserOrReadOnly
+from .pagination import KeysetCursorPagination
+from ecommerce.autocomplete import autocomplete_index
+from ecommerce.facets import get_facet_counts
+from ecommerce.inventory import parse_adjustments, apply_adjustments, InvalidAdjustment
 from django.db.models import Sum, Count
 
 class ParendCategoryViewSet(viewsets.ModelViewSet):
@@ -56,12 +62,67 @@ class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.prefetch_related('variants', 'images').all()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminUserOrReadOnly]
+    pagination_class = KeysetCursorPagination
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'facets']:
             return [AllowAny()]
         return super().get_permissions()
 
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Facet counts (brand, category, price bucket, color, size) for a filter state
+
+        Example: GET /api/ecommerce/products/facets/?category=shoes&brand=1&brand=2&color=red&min_price=500
+        """
+        params = request.query_params
+        try:
+            result = get_facet_counts(
+                category=params.get('category'),
+                parent_category=params.get('parent_category'),
+                brands=params.getlist('brand'),
+                colors=params.getlist('color'),
+                sizes=params.getlist('size'),
+                min_price=params.get('min_price'),
+                max_price=params.get('max_price')
+            )
+        except (ValueError, ArithmeticError):
+            return Response(
+                {'error': 'Invalid filter value'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(result)
+
+    @action(detail=False, methods=['post'], url_path='bulk-inventory', permission_classes=[IsAdminUser])
+    def bulk_inventory(self, request):
+        """
+        Adjust stock and prices of many products and variants at once
+
+        Accepts a CSV upload (``file``, columns product, variant, quantity,
+        price, mode) or JSON: a list of rows or {"mode": "delta"|"set", "items": [...]}.
+        Quantities default to deltas; pass mode=set for absolute values.
+
+        Example: POST /api/ecommerce/products/bulk-inventory/
+        {"mode": "set", "items": [{"variant": 12, "quantity": 40}, {"product": 3, "quantity": 5, "price": "1200"}]}
+        """
+        mode = request.query_params.get('mode', 'delta')
+        try:
+            upload = request.FILES.get('file')
+            if upload:
+                adjustments = parse_adjustments(
+                    io.TextIOWrapper(upload.file, encoding='utf-8-sig'),
+                    'json' if upload.name.endswith('.json') else 'csv',
+                    mode=mode
+                )
+            else:
+                adjustments = parse_adjustments(request.data, 'json', mode=mode)
+        except (InvalidAdjustment, ValueError, UnicodeDecodeError) as e:
+            message = e.messages[0] if isinstance(e, InvalidAdjustment) else str(e)
+            return Response({'error': message}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(apply_adjustments(adjustments))
+
 class ReviewViewSet(viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
@@ -273,3 +334,27 @@ class ProductVariantViewSet(viewsets.ModelViewSet):
                 {'error': 'Product with the specified ID does not exist'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+
+
+class AutocompleteView(APIView):
+    """
+    Typo-tolerant search suggestions served from the in-memory index.
+
+    Example: GET /api/ecommerce/autocomplete/?q=runnin&limit=5
+    """
+    permission_classes = [AllowAny]
+    # Suggestions are public; skip session/token lookups so no query hits the DB
+    authentication_classes = []
+    max_limit = 20
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', 8)), self.max_limit)
+        except ValueError:
+            limit = 8
+
+        if len(query) < 2:
+            return Response({'results': []})
+
+        return Response({'results': autocomplete_index.suggest(query, limit=max(limit, 1))})
@@ -0,0 +1,372 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Count, Max
+from django.urls import reverse
+
+from ecommerce.cache import VersionedCache
+from ecommerce.models import Product, Brand, Category
+from ecommerce.search import tokenize
+
+AUTOCOMPLETE_NAMESPACE = 'autocomplete'
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """
+    Edit distance between ``a`` and ``b`` counting insertions, deletions,
+    substitutions and adjacent transpositions, giving up (and returning
+    ``max_distance + 1``) as soon as the distance must exceed the bound.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            )
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                current[j] = min(current[j], before_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+class AutocompleteIndex:
+    """
+    In-process prefix index over product titles, brands and categories.
+
+    Terms are kept in a sorted array so prefix lookups are a binary search
+    plus a short scan. Misspelled prefixes fall back to a bounded
+    edit-distance walk of a trie of the indexed words sharing the same
+    first letter, which only visits branches still within the bound.
+
+    Each process keeps its own copy. Signals update the local copy in place
+    and bump a shared cache version. Other processes compare that version
+    plus the catalogue's row counts and latest product update (checked at
+    most every AUTOCOMPLETE_REFRESH_INTERVAL seconds) and rebuild when any
+    of them moved, so deletions and renames reach every worker even if the
+    cache entry is lost.
+    """
+    TYPE_PRIORITY = {'category': 0, 'brand': 1, 'product': 2}
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = []          # sorted (term, key) pairs
+        self._suggestions = {}      # key -> suggestion dict
+        self._terms_by_key = {}     # key -> terms indexed for that suggestion
+        self._trie = {}             # nested char -> node dicts; None marks a word end
+        self._built = False
+        self._state = None          # shared state the index was built from
+        self._checked_at = 0.0
+
+    # Building
+
+    @staticmethod
+    def _product_suggestion(product):
+        return {
+            'type': 'product',
+            'id': product.id,
+            'text': product.title,
+            'url': reverse('product_detail', args=[product.id]),
+        }
+
+    @staticmethod
+    def _brand_suggestion(brand):
+        return {
+            'type': 'brand',
+            'id': brand.id,
+            'text': brand.brand_title,
+            'url': f"{reverse('search_products')}?{urlencode({'query': brand.brand_title})}",
+        }
+
+    @staticmethod
+    def _category_suggestion(category):
+        return {
+            'type': 'category',
+            'id': category.id,
+            'text': str(category),
+            'url': reverse('product_by_category', args=[category.slug]),
+        }
+
+    @staticmethod
+    def _terms_for(text):
+        """
+        Index the whole phrase plus every word, so "shoe" finds "Running shoe".
+        """
+        words = tokenize(text)
+        terms = set(words)
+        if words:
+            terms.add(' '.join(words))
+        return terms
+
+    @staticmethod
+    def _add_word(trie, word):
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[None] = True
+
+    def _load_suggestions(self):
+        suggestions = [
+            self._product_suggestion(product)
+            for product in Product.objects.only('id', 'title')
+        ]
+        suggestions += [
+            self._brand_suggestion(brand)
+            for brand in Brand.objects.only('id', 'brand_title')
+        ]
+        suggestions += [
+            self._category_suggestion(category)
+            for category in Category.objects.select_related('parent_category')
+        ]
+        return suggestions
+
+    @staticmethod
+    def _shared_state():
+        """
+        Cache version plus a database snapshot of the indexed tables.
+        """
+        products = Product.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+        return (
+            VersionedCache.get_version(AUTOCOMPLETE_NAMESPACE),
+            products['count'],
+            products['updated_at'],
+            Brand.objects.count(),
+            Category.objects.count(),
+        )
+
+    def build(self):
+        """
+        Rebuild the whole index from the database.
+        """
+        state = self._shared_state()
+        entries, suggestions, terms_by_key, trie = [], {}, {}, {}
+
+        for suggestion in self._load_suggestions():
+            key = (suggestion['type'], suggestion['id'])
+            terms = self._terms_for(suggestion['text'])
+            suggestions[key] = suggestion
+            terms_by_key[key] = terms
+            for term in terms:
+                entries.append((term, key))
+                if ' ' not in term:
+                    self._add_word(trie, term)
+        entries.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._suggestions = suggestions
+            self._terms_by_key = terms_by_key
+            self._trie = trie
+            self._built = True
+            self._state = state
+            self._checked_at = time.monotonic()
+
+    def warm(self):
+        """
+        Build the index at startup, tolerating a database that is not ready yet.
+        """
+        try:
+            self.build()
+        except DatabaseError:
+            pass
+
+    def _ensure_fresh(self):
+        if not self._built:
+            self.build()
+            return
+
+        interval = getattr(settings, 'AUTOCOMPLETE_REFRESH_INTERVAL', 30)
+        now = time.monotonic()
+        if now - self._checked_at < interval:
+            return
+        self._checked_at = now
+        if self._shared_state() != self._state:
+            self.build()
+
+    # Incremental updates
+
+    def _publish_change(self):
+        version = VersionedCache.bump_version(AUTOCOMPLETE_NAMESPACE)
+        # Only adopt the new state if nobody else changed the index meanwhile;
+        # otherwise the next freshness check rebuilds from the database.
+        if self._state is not None and version == self._state[0] + 1:
+            self._state = self._shared_state()
+
+    @staticmethod
+    def _discard_word(trie, word):
+        """
+        Remove ``word`` from the trie along with the nodes it alone used.
+        """
+        path, node = [], trie
+        for char in word:
+            if char not in node:
+                return
+            path.append((node, char))
+            node = node[char]
+        node.pop(None, None)
+        for parent, char in reversed(path):
+            if parent[char]:
+                break
+            del parent[char]
+
+    def _has_term(self, term):
+        index = bisect_left(self._entries, (term,))
+        return index < len(self._entries) and self._entries[index][0] == term
+
+    def _remove_key(self, key):
+        for term in self._terms_by_key.pop(key, ()):
+            index = bisect_left(self._entries, (term, key))
+            if index < len(self._entries) and self._entries[index] == (term, key):
+                del self._entries[index]
+            # Keep typo matching from offering words no suggestion uses any more
+            if ' ' not in term and not self._has_term(term):
+                self._discard_word(self._trie, term)
+        self._suggestions.pop(key, None)
+
+    def _upsert(self, suggestion):
+        key = (suggestion['type'], suggestion['id'])
+        terms = self._terms_for(suggestion['text'])
+        with self._lock:
+            if self._built:
+                self._remove_key(key)
+                self._suggestions[key] = suggestion
+                self._terms_by_key[key] = terms
+                for term in terms:
+                    insort(self._entries, (term, key))
+                    if ' ' not in term:
+                        self._add_word(self._trie, term)
+            self._publish_change()
+
+    def remove(self, kind, pk):
+        with self._lock:
+            if self._built:
+                self._remove_key((kind, pk))
+            self._publish_change()
+
+    def update_product(self, product):
+        self._upsert(self._product_suggestion(product))
+
+    def update_brand(self, brand):
+        self._upsert(self._brand_suggestion(brand))
+
+    def update_category(self, category):
+        self._upsert(self._category_suggestion(category))
+
+    # Querying
+
+    def _prefix_matches(self, prefix):
+        matches = {}
+        index = bisect_left(self._entries, (prefix,))
+        while index < len(self._entries):
+            term, key = self._entries[index]
+            if not term.startswith(prefix):
+                break
+            # Whole-phrase prefix beats a match on a later word
+            rank = 0 if self._suggestions[key]['text'].lower().startswith(prefix) else 1
+            matches[key] = min(rank, matches.get(key, rank))
+            index += 1
+        return matches
+
+    def _fuzzy_words(self, word, max_distance):
+        """
+        Indexed word prefixes of the same length as ``word`` (or whole
+        shorter words) within ``max_distance`` edits of it, nearest first.
+
+        Walks the trie below ``word``'s first letter carrying one row of the
+        edit-distance table per node (as in bounded_edit_distance), and
+        drops a branch once every entry of its row exceeds the bound.
+        """
+        node = self._trie.get(word[0])
+        if node is None:
+            return []
+        length = len(word)
+        candidates = []
+        stack = [(word[0], node, list(range(length + 1)), None)]
+        while stack:
+            prefix, node, previous, before_previous = stack.pop()
+            depth, char = len(prefix), prefix[-1]
+            current = [depth] + [0] * length
+            for j in range(1, length + 1):
+                current[j] = min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char != word[j - 1])
+                )
+                if depth > 1 and j > 1 and char == word[j - 2] and prefix[-2] == word[j - 1]:
+                    current[j] = min(current[j], before_previous[j - 2] + 1)
+
+            # Compare against the word's prefix so partial words still match
+            if depth == length or None in node:
+                if current[length] <= max_distance:
+                    candidates.append((current[length], prefix))
+            if depth == length or min(current) > max_distance:
+                continue
+            for next_char, child in node.items():
+                if next_char is not None:
+                    stack.append((prefix + next_char, child, current, previous))
+        return sorted(candidates)
+
+    @staticmethod
+    def _max_distance(word):
+        return 1 if len(word) <= 4 else 2
+
+    def _covers(self, key, words):
+        """
+        Whether every word is a (possibly misspelled) prefix of one of the
+        suggestion's terms.
+        """
+        terms = self._terms_by_key[key]
+        return all(
+            any(
+                bounded_edit_distance(word, term[:len(word)], self._max_distance(word))
+                <= self._max_distance(word)
+                for term in terms
+            )
+            for word in words
+        )
+
+    def suggest(self, query, limit=8):
+        """
+        Return up to ``limit`` suggestions for a partially typed query.
+        """
+        self._ensure_fresh()
+        words = tokenize(query)
+        if not words:
+            return []
+
+        with self._lock:
+            phrase = ' '.join(words)
+            matches = self._prefix_matches(phrase)
+
+            if len(matches) < limit:
+                # Typo tolerance on the word being typed
+                last, earlier = words[-1], words[:-1]
+                for distance, word in self._fuzzy_words(last, self._max_distance(last)):
+                    for key, rank in self._prefix_matches(word).items():
+                        if key not in matches and self._covers(key, earlier):
+                            matches[key] = 2 + distance + rank
+
+            ranked = sorted(
+                matches.items(),
+                key=lambda item: (
+                    item[1],
+                    self.TYPE_PRIORITY[item[0][0]],
+                    len(self._suggestions[item[0]]['text'])
+                )
+            )
+            return [self._suggestions[key] for key, _ in ranked[:limit]]
+
+
+autocomplete_index = AutocompleteIndex()
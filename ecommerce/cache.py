@@ -0,0 +1,102 @@
+import time
+
+from django.core.cache import cache
+
+SITE_CHROME_NAMESPACE = 'site_chrome'
+PRODUCT_DETAIL_NAMESPACE = 'product_detail'
+
+
+class VersionedCache:
+    """
+    Namespaced cache keys that are invalidated by bumping a version counter
+    instead of deleting every key in the namespace.
+    """
+    VERSION_KEY = 'cache-version:{namespace}'
+
+    @classmethod
+    def get_version(cls, namespace):
+        """
+        Return the current version for a namespace, initialising it if needed.
+        """
+        return cache.get_or_set(cls.VERSION_KEY.format(namespace=namespace), 1, timeout=None)
+
+    @classmethod
+    def bump_version(cls, namespace):
+        """
+        Invalidate every key in a namespace by moving to a new version.
+        """
+        key = cls.VERSION_KEY.format(namespace=namespace)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Version key was evicted or never set
+            cache.set(key, 2, timeout=None)
+            return 2
+
+    @classmethod
+    def make_key(cls, namespace, *parts):
+        """
+        Build a cache key bound to the namespace's current version.
+        """
+        suffix = ':'.join(str(part) for part in parts)
+        return f"{namespace}:v{cls.get_version(namespace)}:{suffix}"
+
+    @classmethod
+    def get_or_set(cls, namespace, parts, default, timeout=None):
+        """
+        Fetch a versioned value, computing it with ``default()`` on a miss.
+        """
+        key = cls.make_key(namespace, *parts)
+        value = cache.get(key)
+        if value is None:
+            value = default()
+            cache.set(key, value, timeout)
+        return value
+
+
+def single_flight(key, compute, timeout, lock_timeout=30, wait=10, poll_interval=0.05):
+    """
+    Cached value of ``key``, recomputed by one caller at a time.
+
+    Values are kept for twice ``timeout`` and marked stale after
+    ``timeout``. A stale value is refreshed by whichever caller takes the
+    lock first while everyone else keeps serving it; on a cold miss the
+    other callers wait up to ``wait`` seconds for the lock holder's result
+    before computing it themselves. ``lock_timeout`` bounds how long a
+    crashed holder can block refreshes.
+
+    The lock is a cache entry, so it only spans worker processes that share
+    the default cache; the ecommerce.E001 system check rejects per-process
+    backends outside DEBUG.
+    """
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is not None and time.time() < entry[1]:
+        return entry[0]
+
+    locked = cache.add(lock_key, True, timeout=lock_timeout)
+    if not locked:
+        if entry is not None:
+            # Stale, and another caller is already refreshing it
+            return entry[0]
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            time.sleep(poll_interval)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+
+    try:
+        value = compute()
+        cache.set(key, (value, time.time() + timeout), timeout * 2)
+        return value
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def invalidate_product_detail(product_id):
+    """
+    Drop the cached product page payload for one product.
+    """
+    VersionedCache.bump_version(f'{PRODUCT_DETAIL_NAMESPACE}:{product_id}')
@@ -0,0 +1,354 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from ecommerce.autocomplete import AUTOCOMPLETE_NAMESPACE
+from ecommerce.cache import VersionedCache, PRODUCT_DETAIL_NAMESPACE
+from ecommerce.facets import FACETS_NAMESPACE
+from ecommerce.models import ParentCategory, Category, Brand, Product, ProductVariant, ProductImage
+from ecommerce.pricing import refresh_price_bounds
+from ecommerce.search import get_search_backend
+
+# Record types in dependency order; exports write them in this order
+RECORD_TYPES = ('parent_category', 'category', 'brand', 'product', 'variant', 'image')
+
+# Union of every record's fields, used as the CSV header
+CSV_COLUMNS = [
+    'type', 'ref', 'name', 'parent_category', 'title', 'category', 'brand',
+    'price', 'discount', 'quantity', 'description', 'keywords', 'prod_img',
+    'featured', 'product', 'size', 'color', 'stock', 'variant_price',
+    'image', 'alt_text',
+]
+
+
+class InvalidCatalogRecord(ValidationError):
+    """
+    Raised when an import record is malformed or references something unknown.
+    """
+
+
+# Export
+
+def _export_records(batch_size):
+    for name in ParentCategory.objects.order_by('id').values_list('parent_name', flat=True):
+        yield {'type': 'parent_category', 'name': name}
+
+    categories = Category.objects.order_by('id').values_list('category_name', 'parent_category__parent_name')
+    for name, parent in categories:
+        yield {'type': 'category', 'name': name, 'parent_category': parent}
+
+    for title in Brand.objects.order_by('id').values_list('brand_title', flat=True):
+        yield {'type': 'brand', 'name': title}
+
+    products = Product.objects.order_by('id').values(
+        'id', 'title', 'category__slug', 'brand__brand_title', 'price', 'discount',
+        'quantity', 'description', 'keywords', 'prod_img', 'featured'
+    )
+    for product in products.iterator(chunk_size=batch_size):
+        yield {
+            'type': 'product',
+            'ref': product['id'],
+            'title': product['title'],
+            'category': product['category__slug'],
+            'brand': product['brand__brand_title'],
+            'price': product['price'],
+            'discount': product['discount'],
+            'quantity': product['quantity'],
+            'description': product['description'],
+            'keywords': product['keywords'],
+            'prod_img': product['prod_img'],
+            'featured': product['featured'],
+        }
+
+    variants = ProductVariant.objects.order_by('id').values_list(
+        'product_id', 'size', 'color', 'stock', 'variant_price'
+    )
+    for product_id, size, color, stock, variant_price in variants.iterator(chunk_size=batch_size):
+        yield {
+            'type': 'variant', 'product': product_id, 'size': size, 'color': color,
+            'stock': stock, 'variant_price': variant_price,
+        }
+
+    images = ProductImage.objects.order_by('id').values_list('product_id', 'image', 'alt_text')
+    for product_id, image, alt_text in images.iterator(chunk_size=batch_size):
+        yield {'type': 'image', 'product': product_id, 'image': image, 'alt_text': alt_text}
+
+
+def export_catalog(handle, fmt='jsonl', batch_size=2000):
+    """
+    Stream the whole catalog to ``handle`` as JSONL or CSV, one record per
+    line, without loading any table into memory.
+
+    Returns:
+        dict: Number of records written per type
+    """
+    counts = dict.fromkeys(RECORD_TYPES, 0)
+    if fmt == 'csv':
+        writer = csv.DictWriter(handle, fieldnames=CSV_COLUMNS, restval='')
+        writer.writeheader()
+        write = lambda record: writer.writerow({k: '' if v is None else v for k, v in record.items()})
+    else:
+        write = lambda record: handle.write(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+
+    for record in _export_records(batch_size):
+        write(record)
+        counts[record['type']] += 1
+    return counts
+
+
+# Import
+
+def read_records(handle, fmt='jsonl'):
+    """
+    Yield (line number, record) pairs from a JSONL or CSV stream.
+    """
+    if fmt == 'csv':
+        for line, row in enumerate(csv.DictReader(handle), 2):
+            yield line, {key: value for key, value in row.items() if value not in (None, '')}
+        return
+
+    for line, text in enumerate(handle, 1):
+        text = text.strip()
+        if not text:
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError:
+            raise InvalidCatalogRecord(f"Line {line}: invalid JSON")
+
+
+def _decimal(value, default=None):
+    if value in (None, ''):
+        return default
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"invalid number {value!r}")
+
+
+def _integer(value, default=0):
+    return default if value in (None, '') else int(value)
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes')
+
+
+class CatalogImporter:
+    """
+    Create catalog rows from a stream of records.
+
+    Taxonomy rows (parent categories, categories, brands) are few and are
+    matched by name or created one by one. Products, variants and images
+    are buffered and written with bulk_create in batches; foreign keys are
+    resolved through dictionaries built once up front and extended as rows
+    are created, so no lookup query is issued per record.
+
+    Product ``ref`` values only need to be unique within the file; variants
+    and images point at their product through it.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.counts = dict.fromkeys(RECORD_TYPES, 0)
+        self.parents = dict(ParentCategory.objects.values_list('parent_name', 'id'))
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        self.category_names = {
+            (name, parent_id): slug
+            for name, parent_id, slug in Category.objects.values_list('category_name', 'parent_category_id', 'slug')
+        }
+        self.brands = dict(Brand.objects.values_list('brand_title', 'id'))
+        self.product_refs = {}
+        self.product_ids = []
+        self.pending_products = []
+        self.pending_refs = {}
+        self.pending_variants = []
+        self.pending_images = []
+
+    # Taxonomy
+
+    def _parent_category(self, record):
+        name = record['name']
+        if name not in self.parents:
+            self.parents[name] = ParentCategory.objects.create(parent_name=name).id
+            self.counts['parent_category'] += 1
+
+    def _category(self, record):
+        parent_id = self.parents.get(record.get('parent_category'))
+        if parent_id is None:
+            raise ValueError(f"unknown parent category {record.get('parent_category')!r}")
+        key = (record['name'], parent_id)
+        if key not in self.category_names:
+            category = Category(category_name=record['name'], parent_category=ParentCategory(
+                pk=parent_id, parent_name=record['parent_category']
+            ))
+            category.save()
+            self.category_names[key] = category.slug
+            self.categories[category.slug] = category.id
+            self.counts['category'] += 1
+
+    def _brand(self, record):
+        name = record['name']
+        if name not in self.brands:
+            self.brands[name] = Brand.objects.create(brand_title=name).id
+            self.counts['brand'] += 1
+
+    # Catalog rows
+
+    def _product(self, record):
+        ref = str(record.get('ref', ''))
+        if not ref or ref in self.product_refs or ref in self.pending_refs:
+            raise ValueError("product ref missing or repeated")
+        category = record.get('category')
+        if category and category not in self.categories:
+            raise ValueError(f"unknown category {category!r}")
+        brand = record.get('brand')
+        if brand and brand not in self.brands:
+            raise ValueError(f"unknown brand {brand!r}")
+
+        product = Product(
+            title=record['title'],
+            category_id=self.categories.get(category),
+            brand_id=self.brands.get(brand),
+            price=_decimal(record.get('price')),
+            discount=_decimal(record.get('discount'), Decimal('0')),
+            quantity=_integer(record.get('quantity')),
+            description=record.get('description', ''),
+            keywords=record.get('keywords', ''),
+            prod_img=record.get('prod_img', ''),
+            featured=_boolean(record.get('featured', False)),
+        )
+        if product.price is None:
+            raise ValueError("price is required")
+        # bulk_create skips save(); variant bounds are refreshed after the variants land
+        product.min_selling_price, product.max_selling_price = product.compute_selling_price_bounds()
+        self.pending_products.append((ref, product))
+        self.pending_refs[ref] = product
+        if len(self.pending_products) >= self.batch_size:
+            self._flush_products()
+
+    def _product_link(self, record):
+        """
+        The product a variant or image points at: an id for products already
+        written, or the buffered instance, whose id is set when the product
+        batch is written (always before the variants and images).
+        """
+        ref = str(record.get('product', ''))
+        if ref in self.product_refs:
+            return {'product_id': self.product_refs[ref]}
+        if ref in self.pending_refs:
+            return {'product': self.pending_refs[ref]}
+        raise ValueError(f"unknown product ref {ref!r}")
+
+    def _variant(self, record):
+        self.pending_variants.append(ProductVariant(
+            **self._product_link(record),
+            size=record.get('size', ''),
+            color=record.get('color', ''),
+            stock=_integer(record.get('stock')),
+            variant_price=_decimal(record.get('variant_price')),
+        ))
+        if len(self.pending_variants) >= self.batch_size:
+            self._flush_variants()
+
+    def _image(self, record):
+        self.pending_images.append(ProductImage(
+            **self._product_link(record),
+            image=record['image'],
+            alt_text=record.get('alt_text', ''),
+        ))
+        if len(self.pending_images) >= self.batch_size:
+            self._flush_images()
+
+    def _flush_products(self):
+        if not self.pending_products:
+            return
+        products = [product for _, product in self.pending_products]
+        if connections[router.db_for_write(Product)].features.can_return_rows_from_bulk_insert:
+            Product.objects.bulk_create(products, batch_size=self.batch_size)
+        else:
+            # The backend (e.g. MySQL) cannot report the ids of a multi-row
+            # INSERT, and the buffered variants and images need them. Raw
+            # saves tell the post_save receivers to stand down, as during
+            # loaddata; _publish_import refreshes the derived data once.
+            # Raw saves also leave the auto_now fields to us
+            now = timezone.now()
+            for product in products:
+                product.created_at = product.updated_at = now
+                product.save_base(raw=True, force_insert=True)
+        for (ref, _), product in zip(self.pending_products, products):
+            self.product_refs[ref] = product.id
+            self.product_ids.append(product.id)
+        self.counts['product'] += len(products)
+        self.pending_products = []
+        self.pending_refs = {}
+
+    def _flush_variants(self):
+        self._flush_products()
+        ProductVariant.objects.bulk_create(self.pending_variants, batch_size=self.batch_size)
+        self.counts['variant'] += len(self.pending_variants)
+        self.pending_variants = []
+
+    def _flush_images(self):
+        self._flush_products()
+        ProductImage.objects.bulk_create(self.pending_images, batch_size=self.batch_size)
+        self.counts['image'] += len(self.pending_images)
+        self.pending_images = []
+
+    def feed(self, line, record):
+        handlers = {
+            'parent_category': self._parent_category,
+            'category': self._category,
+            'brand': self._brand,
+            'product': self._product,
+            'variant': self._variant,
+            'image': self._image,
+        }
+        handler = handlers.get(record.get('type'))
+        if handler is None:
+            raise InvalidCatalogRecord(f"Line {line}: unknown record type {record.get('type')!r}")
+        try:
+            handler(record)
+        except (KeyError, ValueError, TypeError) as e:
+            raise InvalidCatalogRecord(f"Line {line}: {e}")
+
+    def finish(self):
+        self._flush_products()
+        self._flush_variants()
+        self._flush_images()
+        refresh_price_bounds(self.product_ids, batch_size=self.batch_size)
+
+
+def _publish_import(product_ids, batch_size):
+    """
+    Bring the derived indexes and caches up to date after a bulk import,
+    which bypassed the per-row save signals.
+    """
+    backend = get_search_backend()
+    for start in range(0, len(product_ids), batch_size):
+        backend.index_products(product_ids[start:start + batch_size])
+    for namespace in (AUTOCOMPLETE_NAMESPACE, FACETS_NAMESPACE, PRODUCT_DETAIL_NAMESPACE):
+        VersionedCache.bump_version(namespace)
+
+
+def import_catalog(records, batch_size=1000):
+    """
+    Import (line, record) pairs in one transaction.
+
+    Returns:
+        dict: Number of records created per type
+    """
+    with transaction.atomic():
+        importer = CatalogImporter(batch_size=batch_size)
+        for line, record in records:
+            importer.feed(line, record)
+        importer.finish()
+        transaction.on_commit(lambda: _publish_import(importer.product_ids, batch_size))
+    return importer.counts
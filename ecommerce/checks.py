@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Backends whose entries live inside a single process
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Cache versions, refresh locks and stale markers only work when every
+    worker process sees the same cache; refuse to run without one.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if settings.DEBUG or backend not in PER_PROCESS_CACHES:
+        return []
+    return [Error(
+        f"The default cache backend {backend} is private to each process.",
+        hint="Use a shared cache such as DatabaseCache (run createcachetable) or Redis.",
+        id='ecommerce.E001',
+    )]
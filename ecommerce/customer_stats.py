@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+
+from ecommerce.models import CustomerStats, Order
+
+
+def _totals():
+    # Aggregates over paid orders, named after the CustomerStats fields
+    return {
+        'paid_orders': Count('id'),
+        'total_spent': Sum('total'),
+        'first_order_at': Min('created_at'),
+        'last_order_at': Max('created_at'),
+    }
+
+
+def refresh_customer_stats(user_id):
+    """
+    Recompute a customer's stats row from their paid orders.
+
+    The row is locked before the orders are read, so two transactions
+    changing the same customer's orders apply one after the other and the
+    second sees the first one's order.
+    """
+    with transaction.atomic():
+        CustomerStats.objects.get_or_create(user_id=user_id)
+        stats = CustomerStats.objects.select_for_update().get(user_id=user_id)
+        totals = Order.objects.filter(user_id=user_id, payment_status='Paid').aggregate(**_totals())
+        stats.paid_orders = totals['paid_orders']
+        stats.total_spent = totals['total_spent'] or Decimal('0.00')
+        stats.first_order_at = totals['first_order_at']
+        stats.last_order_at = totals['last_order_at']
+        stats.tier = CustomerStats.tier_for(stats.total_spent)
+        stats.save()
+    return stats
+
+
+def rebuild_customer_stats(batch_size=1000):
+    """
+    Recompute every customer's stats row from paid orders, creating rows
+    for users that have none.
+
+    Returns:
+        int: Number of rows written
+    """
+    totals = {
+        row['user_id']: row
+        for row in Order.objects.filter(payment_status='Paid').values('user_id').annotate(
+            **_totals()
+        ).order_by().iterator(chunk_size=batch_size)
+    }
+    rows = []
+    for user_id in get_user_model().objects.values_list('id', flat=True).iterator(chunk_size=batch_size):
+        row = totals.get(user_id, {})
+        total_spent = row.get('total_spent') or Decimal('0.00')
+        rows.append(CustomerStats(
+            user_id=user_id,
+            paid_orders=row.get('paid_orders', 0),
+            total_spent=total_spent,
+            first_order_at=row.get('first_order_at'),
+            last_order_at=row.get('last_order_at'),
+            tier=CustomerStats.tier_for(total_spent)
+        ))
+    with transaction.atomic():
+        CustomerStats.objects.all().delete()
+        CustomerStats.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
@@ -0,0 +1,54 @@
+import logging
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingBatch:
+    """
+    Items collected during a transaction, handed to ``flush`` on commit.
+    """
+    def __init__(self, flush):
+        self.items = set()
+        self.flushed = False
+        self._flush = flush
+
+    def flush(self):
+        self.flushed = True
+        self._flush(self.items)
+
+
+def _is_scheduled(connection, callback):
+    return any(entry[1] == callback for entry in connection.run_on_commit)
+
+
+def defer_batch(name, flush, item, using=None, robust=False):
+    """
+    Pass ``item`` to ``flush`` once the current transaction commits.
+
+    Every item deferred under the same ``name`` in a transaction is
+    collected into one set and handed to a single ``flush(items)`` call.
+    Outside a transaction ``flush`` runs immediately with just this item.
+    With ``robust`` set, an exception raised by ``flush`` is logged instead
+    of propagating to the code that committed.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        try:
+            flush({item})
+        except Exception:
+            if not robust:
+                raise
+            logger.exception("Deferred %s refresh failed", name)
+        return
+
+    batches = getattr(connection, 'pending_batches', None)
+    if batches is None:
+        batches = connection.pending_batches = {}
+    pending = batches.get(name)
+    # A rolled-back savepoint drops its callback; start a new batch then
+    if pending is None or pending.flushed or not _is_scheduled(connection, pending.flush):
+        pending = batches[name] = _PendingBatch(flush)
+        transaction.on_commit(pending.flush, using=using, robust=robust)
+    pending.items.add(item)
@@ -0,0 +1,295 @@
+import hashlib
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+
+from django.conf import settings
+
+from ecommerce.cache import VersionedCache
+from ecommerce.models import Product, ProductVariant
+
+FACETS_NAMESPACE = 'facets'
+
+# Selling price buckets (Ksh); the last bucket is open-ended
+PRICE_BUCKETS = [
+    (Decimal('0'), Decimal('500')),
+    (Decimal('500'), Decimal('1000')),
+    (Decimal('1000'), Decimal('2500')),
+    (Decimal('2500'), Decimal('5000')),
+    (Decimal('5000'), Decimal('10000')),
+    (Decimal('10000'), None),
+]
+
+
+def _bucket_label(low, high):
+    return f"{low}+" if high is None else f"{low}-{high}"
+
+
+class FacetIndex:
+    """
+    Bitmap index over the catalogue used to count facet values.
+
+    Every product gets a bit position; each facet value (brand, category,
+    parent category, price bucket) and each variant (color, size) pair holds
+    an integer bitmap of the products that carry it. Color and size are
+    counted from the pairs, so like the product filter they only match
+    products with a single variant of the chosen color and size. Categories
+    are keyed by slug, and a category filter may also name one (in any
+    case), as the product filter allows. Counting a
+    facet for any filter state is then a handful of ANDs and popcounts,
+    with no query per facet.
+
+    The index is built with two queries and cached under a versioned key
+    that signals bump whenever products, variants, brands or categories
+    change. Facet results are cached per filter signature under the same
+    version.
+    """
+
+    def __init__(self, product_ids, prices, bitmaps, labels, variants, category_slugs):
+        self.product_ids = product_ids
+        self.prices = prices            # position -> (min selling, max selling)
+        self.bitmaps = bitmaps          # facet -> {value: bitmap}
+        self.labels = labels            # facet -> {value: display name}
+        self.variants = variants        # (color, size) -> bitmap
+        self.category_slugs = category_slugs  # casefolded category name -> slug
+        self.all = (1 << len(product_ids)) - 1
+        # Positions sorted by each price bound, for bisecting price ranges
+        self.by_min = sorted(range(len(prices)), key=lambda position: prices[position][0])
+        self.by_max = sorted(range(len(prices)), key=lambda position: prices[position][1])
+        self.min_prices = [prices[position][0] for position in self.by_min]
+        self.max_prices = [prices[position][1] for position in self.by_max]
+
+    @classmethod
+    def build(cls):
+        rows = Product.objects.order_by('id').values_list(
+            'id', 'brand_id', 'brand__brand_title', 'category_id',
+            'category__category_name', 'category__slug',
+            'category__parent_category__slug', 'category__parent_category__parent_name',
+            'min_selling_price', 'max_selling_price'
+        )
+
+        product_ids, prices, positions = [], [], {}
+        bitmaps = {facet: {} for facet in ('brand', 'category', 'parent_category', 'price')}
+        labels = {facet: {} for facet in (*bitmaps, 'color', 'size')}
+        variant_bitmaps = {}
+        category_slugs = {}
+
+        def mark(facet, value, label, bit):
+            bitmaps[facet][value] = bitmaps[facet].get(value, 0) | bit
+            labels[facet][value] = label
+
+        for (product_id, brand_id, brand_title, category_id, category_name,
+             category_slug, parent_slug, parent_name, min_price, max_price) in rows:
+            position = len(product_ids)
+            bit = 1 << position
+            positions[product_id] = position
+            product_ids.append(product_id)
+            prices.append((min_price, max_price))
+
+            if brand_id is not None:
+                mark('brand', brand_id, brand_title, bit)
+            if category_id is not None:
+                mark('category', category_slug, category_name, bit)
+                category_slugs[category_name.casefold()] = category_slug
+                mark('parent_category', parent_slug, parent_name, bit)
+            for low, high in PRICE_BUCKETS:
+                # Products whose variant price range overlaps the bucket
+                if max_price >= low and (high is None or min_price < high):
+                    mark('price', _bucket_label(low, high), _bucket_label(low, high), bit)
+
+        variants = ProductVariant.objects.values_list('product_id', 'color', 'size').distinct()
+        for product_id, color, size in variants:
+            if product_id not in positions:
+                continue
+            key = ((color or '').lower(), (size or '').upper())
+            variant_bitmaps[key] = variant_bitmaps.get(key, 0) | 1 << positions[product_id]
+            if color:
+                labels['color'][key[0]] = color
+            if size:
+                labels['size'][key[1]] = size
+
+        return cls(product_ids, prices, bitmaps, labels, variant_bitmaps, category_slugs)
+
+    @classmethod
+    def get(cls):
+        return VersionedCache.get_or_set(
+            # Bumped with the index layout so cached indexes of the old shape are ignored
+            FACETS_NAMESPACE, ['index', 3], cls.build,
+            timeout=getattr(settings, 'FACET_CACHE_TIMEOUT', 60 * 15)
+        )
+
+    def _union(self, facet, values):
+        bitmap = 0
+        for value in values:
+            bitmap |= self.bitmaps[facet].get(value, 0)
+        return bitmap
+
+    def _category_slug(self, category):
+        """
+        Slug of a category filter given as a slug or a category name.
+        """
+        if category in self.bitmaps['category']:
+            return category
+        return self.category_slugs.get(category.casefold(), category)
+
+    def _variant_mask(self, colors, sizes):
+        """
+        Products with one variant matching any of ``colors`` and any of
+        ``sizes``; an empty list leaves that side unrestricted.
+        """
+        bitmap = 0
+        for (color, size), variant_bitmap in self.variants.items():
+            if (not colors or color in colors) and (not sizes or size in sizes):
+                bitmap |= variant_bitmap
+        return bitmap
+
+    def _bitmap(self, positions):
+        bits = bytearray((len(self.product_ids) + 7) // 8)
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(bits, 'little')
+
+    def _set_positions(self, bitmap):
+        return {
+            position for position, bit in enumerate(reversed(bin(bitmap)[2:])) if bit == '1'
+        }
+
+    def _price_mask(self, min_price, max_price):
+        """
+        Products whose selling price range overlaps [min_price, max_price],
+        located by bisecting the positions sorted on each bound.
+        """
+        mask = self.all
+        if min_price is not None:
+            mask &= self._bitmap(self.by_max[bisect_left(self.max_prices, min_price):])
+        if max_price is not None:
+            mask &= self._bitmap(self.by_min[:bisect_right(self.min_prices, max_price)])
+        return mask
+
+    def _masks(self, filters):
+        """
+        One bitmap per active filter, keyed by the facet it restricts.
+        """
+        masks = {}
+        if filters.get('parent_category'):
+            masks['parent_category'] = self._union('parent_category', [filters['parent_category']])
+        if filters.get('category'):
+            masks['category'] = self._union('category', [self._category_slug(filters['category'])])
+        if filters.get('brands'):
+            masks['brand'] = self._union('brand', filters['brands'])
+        if filters.get('colors') or filters.get('sizes'):
+            masks['variant'] = self._variant_mask(filters.get('colors'), filters.get('sizes'))
+        if filters.get('min_price') is not None or filters.get('max_price') is not None:
+            masks['price'] = self._price_mask(filters.get('min_price'), filters.get('max_price'))
+        return masks
+
+    def _selection(self, masks, exclude=None):
+        selected = self.all
+        for facet, mask in masks.items():
+            if facet != exclude:
+                selected &= mask
+        return selected
+
+    def _counts(self, facet, base, bitmaps=None):
+        bitmaps = self.bitmaps[facet] if bitmaps is None else bitmaps
+        counts = [
+            {'value': value, 'label': self.labels[facet][value], 'count': (bitmap & base).bit_count()}
+            for value, bitmap in bitmaps.items()
+        ]
+        return [entry for entry in counts if entry['count']]
+
+    def _variant_counts(self, facet, masks, filters):
+        """
+        Count colors (or sizes) keeping the other side of the variant filter,
+        so a color's count is the products with that color in a chosen size.
+        """
+        base = self._selection(masks, exclude='variant')
+        colors, sizes = filters.get('colors'), filters.get('sizes')
+        bitmaps = {
+            value: (self._variant_mask([value], sizes) if facet == 'color'
+                    else self._variant_mask(colors, [value]))
+            for value in self.labels[facet]
+        }
+        return self._counts(facet, base, bitmaps)
+
+    def facet_counts(self, filters):
+        """
+        Count every facet value for the given filter state.
+
+        Each facet is counted with all filters applied except its own, so the
+        sidebar shows how many products selecting another value would give.
+        """
+        masks = self._masks(filters)
+        selected = self._selection(masks)
+
+        facets = {}
+        for facet in ('brand', 'category', 'color', 'size'):
+            counts = (self._variant_counts(facet, masks, filters) if facet in ('color', 'size')
+                      else self._counts(facet, self._selection(masks, exclude=facet)))
+            facets[facet] = sorted(
+                counts, key=lambda entry: (-entry['count'], str(entry['label']))
+            )
+
+        bucket_order = [_bucket_label(low, high) for low, high in PRICE_BUCKETS]
+        facets['price'] = sorted(
+            self._counts('price', self._selection(masks, exclude='price')),
+            key=lambda entry: bucket_order.index(entry['value'])
+        )
+
+        positions = self._set_positions(selected)
+        return {
+            'total': len(positions),
+            'price_range': {
+                'min_price': next(
+                    (self.prices[p][0] for p in self.by_min if p in positions), None
+                ),
+                'max_price': next(
+                    (self.prices[p][1] for p in reversed(self.by_max) if p in positions), None
+                ),
+            },
+            'facets': facets,
+        }
+
+
+def normalize_price(value):
+    """Decimal price from a query value; blank means no bound."""
+    return Decimal(str(value)) if value not in (None, '') else None
+
+
+def normalize_filters(category=None, parent_category=None, brands=None, colors=None,
+                      sizes=None, min_price=None, max_price=None):
+    """
+    Canonical form of a filter state, used both to filter and as cache key.
+    """
+    return {
+        'category': category or None,
+        'parent_category': parent_category or None,
+        'brands': sorted({int(brand) for brand in brands or []}),
+        'colors': sorted({color.lower() for color in colors or []}),
+        'sizes': sorted({size.upper() for size in sizes or []}),
+        'min_price': normalize_price(min_price),
+        'max_price': normalize_price(max_price),
+    }
+
+
+def filter_signature(filters):
+    """
+    Short, cache-key-safe digest of a normalized filter state.
+    """
+    raw = '|'.join(
+        f"{key}={','.join(map(str, value)) if isinstance(value, list) else value}"
+        for key, value in sorted(filters.items())
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def get_facet_counts(**filters):
+    """
+    Facet counts for a filter state, cached per filter signature.
+    """
+    filters = normalize_filters(**filters)
+    return VersionedCache.get_or_set(
+        FACETS_NAMESPACE,
+        ['counts', filter_signature(filters)],
+        lambda: FacetIndex.get().facet_counts(filters),
+        timeout=getattr(settings, 'FACET_CACHE_TIMEOUT', 60 * 15)
+    )
@@ -0,0 +1,128 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from ecommerce.models import IdempotencyKey
+
+# Form field carrying the key rendered into checkout pages
+KEY_FIELD = 'idempotency_key'
+# Fields that change between otherwise identical submissions
+IGNORED_FIELDS = {'csrfmiddlewaretoken', KEY_FIELD}
+
+
+class IdempotencyConflict(ValidationError):
+    """
+    The key was already used for a request with different contents.
+    """
+
+
+def _digest(*parts):
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def request_fingerprint(request, scope):
+    """
+    Digest of who sent the request, where, and what it submitted.
+    """
+    fields = sorted(
+        (name, tuple(values)) for name, values in request.POST.lists()
+        if name not in IGNORED_FIELDS
+    )
+    return _digest(scope, request.user.pk, request.path, fields)
+
+
+def _client_key(request):
+    return (
+        request.headers.get('Idempotency-Key')
+        or request.POST.get(KEY_FIELD)
+        or ''
+    ).strip()
+
+
+def claim_request(request, scope):
+    """
+    Register a request under its idempotency key.
+
+    Clients send the key in an ``Idempotency-Key`` header or the
+    ``idempotency_key`` form field; without one the request fingerprint is
+    the key, which still absorbs double submissions of the same form. Such
+    keys are only kept for IDEMPOTENCY_FINGERPRINT_TTL, since a genuine
+    retry of the same form a few minutes later looks just like them.
+
+    Returns:
+        tuple: The IdempotencyKey record and whether it belongs to an
+        earlier request (a replay) rather than this one
+    Raises:
+        IdempotencyConflict: The key was used for a different request
+    """
+    fingerprint = request_fingerprint(request, scope)
+    client_key = _client_key(request)
+    key = _digest(request.user.pk, client_key) if client_key else fingerprint
+    ttl = settings.IDEMPOTENCY_KEY_TTL if client_key else settings.IDEMPOTENCY_FINGERPRINT_TTL
+    now = timezone.now()
+
+    # Expired records no longer count as the original request
+    IdempotencyKey.objects.filter(scope=scope, key=key, expires_at__lte=now).delete()
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                scope=scope,
+                key=key,
+                fingerprint=fingerprint,
+                user=request.user if request.user.is_authenticated else None,
+                expires_at=now + timedelta(seconds=ttl)
+            )
+        return record, False
+    except IntegrityError:
+        record = IdempotencyKey.objects.get(scope=scope, key=key)
+
+    if record.fingerprint != fingerprint:
+        raise IdempotencyConflict("This request key was already used for a different request.")
+    return record, True
+
+
+def complete_request(record, response_url, order=None):
+    """
+    Store where the original request led, so replays can go there too.
+    """
+    record.response_url = response_url
+    record.order = order
+    record.save(update_fields=['response_url', 'order'])
+
+
+def abandon_request(record):
+    """
+    Forget a request that failed, so a retry is processed from scratch.
+    """
+    IdempotencyKey.objects.filter(pk=record.pk, response_url='').delete()
+
+
+def release_order_requests(scope, order):
+    """
+    Forget the completed requests that led to ``order``, e.g. once its
+    payment failed, so the customer can try again.
+    """
+    IdempotencyKey.objects.filter(scope=scope, order=order).delete()
+
+
+def purge_expired_keys(batch_size=1000, now=None):
+    """
+    Delete expired records in batches.
+
+    Returns:
+        int: Number of records deleted
+    """
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
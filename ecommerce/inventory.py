@@ -0,0 +1,462 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q, Case, When, Value, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from ecommerce.cache import VersionedCache, invalidate_product_detail
+from ecommerce.facets import FACETS_NAMESPACE
+from ecommerce.models import Product, ProductVariant, StockReservation
+from ecommerce.pricing import refresh_price_bounds
+
+
+class InsufficientStock(ValidationError):
+    """
+    Raised when a reservation asks for more units than are in stock.
+    """
+    def __init__(self, available):
+        self.available = available
+        super().__init__(f"Only {available} items available")
+
+
+def _stock_rows(product_id, variant_id):
+    """
+    Stock lives on the variant for variant lines and on the product otherwise.
+    """
+    if variant_id:
+        return ProductVariant.objects.filter(pk=variant_id), 'stock'
+    return Product.objects.filter(pk=product_id), 'quantity'
+
+
+def reserve_stock(product_id, variant_id, quantity):
+    """
+    Take ``quantity`` units out of stock.
+
+    Runs a single ``UPDATE ... SET stock = stock - n WHERE stock >= n``;
+    the database applies the check and the decrement atomically, so
+    concurrent buyers can never drive stock negative and no row lock is
+    held between a read and a write.
+
+    Returns:
+        bool: Whether the units were reserved
+    """
+    if quantity <= 0:
+        return True
+    rows, field = _stock_rows(product_id, variant_id)
+    reserved = rows.filter(**{f'{field}__gte': quantity}).update(**{field: F(field) - quantity})
+    if reserved:
+        transaction.on_commit(lambda: invalidate_product_detail(product_id))
+    return bool(reserved)
+
+
+def release_stock(product_id, variant_id, quantity):
+    """
+    Put ``quantity`` previously reserved units back into stock.
+    """
+    if quantity <= 0:
+        return
+    rows, field = _stock_rows(product_id, variant_id)
+    rows.update(**{field: F(field) + quantity})
+    transaction.on_commit(lambda: invalidate_product_detail(product_id))
+
+
+def available_stock(product_id, variant_id):
+    rows, field = _stock_rows(product_id, variant_id)
+    return rows.values_list(field, flat=True).first() or 0
+
+
+def reserve_or_raise(product_id, variant_id, quantity):
+    """
+    Reserve stock, raising InsufficientStock (a ValidationError) on failure.
+    """
+    if not reserve_stock(product_id, variant_id, quantity):
+        raise InsufficientStock(available_stock(product_id, variant_id))
+
+
+def reservation_expiry():
+    return timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL)
+
+
+def hold_cart_item(cart_item, quantity):
+    """
+    Make a cart line hold exactly ``quantity`` units and renew its expiry.
+
+    Only the difference from what the line already holds is reserved or
+    released, so lines whose hold was swept simply re-reserve everything.
+    Raises InsufficientStock with the most the line could hold.
+    """
+    reservation = StockReservation.objects.select_for_update().filter(cart_item=cart_item).first()
+    held = reservation.quantity if reservation else 0
+    difference = quantity - held
+
+    if difference > 0 and not reserve_stock(cart_item.product_id, cart_item.variant_id, difference):
+        raise InsufficientStock(available_stock(cart_item.product_id, cart_item.variant_id) + held)
+    if difference < 0:
+        release_stock(cart_item.product_id, cart_item.variant_id, -difference)
+
+    if reservation:
+        reservation.quantity = quantity
+        reservation.expires_at = reservation_expiry()
+        reservation.save(update_fields=['quantity', 'expires_at'])
+    else:
+        StockReservation.objects.create(
+            cart_item=cart_item,
+            product_id=cart_item.product_id,
+            variant_id=cart_item.variant_id,
+            quantity=quantity,
+            expires_at=reservation_expiry()
+        )
+
+
+def release_cart_item(cart_item):
+    """
+    Return whatever a cart line still holds to stock.
+    """
+    reservation = StockReservation.objects.select_for_update().filter(cart_item=cart_item).first()
+    if reservation:
+        release_stock(reservation.product_id, reservation.variant_id, reservation.quantity)
+        reservation.delete()
+
+
+def _invalidate_products(product_ids):
+    for product_id in product_ids:
+        invalidate_product_detail(product_id)
+
+
+def _restock(model, field, totals):
+    """
+    Add per-row quantities (negative to take them out) in one UPDATE using
+    a CASE expression.
+    """
+    if not totals:
+        return
+    model.objects.filter(pk__in=totals).update(**{
+        field: F(field) + Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in totals.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    })
+
+
+def _stock_key(product_id, variant_id):
+    return ('variant', variant_id) if variant_id else ('product', product_id)
+
+
+def allocate_cart(cart, cart_items=None):
+    """
+    Turn a cart's holds into order allocations at checkout.
+
+    Every line is topped up to its full quantity (re-reserving anything the
+    sweeper released), then the holds are deleted so the decremented stock
+    stays with the order instead of expiring. The holds and the stock rows
+    are each locked with one query and the stock is adjusted with one
+    UPDATE per table, however many lines the cart has. Pass ``cart_items``
+    when the lines are already loaded (with their products).
+    """
+    if cart_items is None:
+        cart_items = cart.cart_items.select_related('product')
+    cart_items = list(cart_items)
+
+    held = {
+        reservation.cart_item_id: reservation.quantity
+        for reservation in StockReservation.objects.select_for_update().filter(
+            cart_item__in=[cart_item.pk for cart_item in cart_items]
+        ).order_by('pk')
+    }
+
+    # Units each stock row still has to give (negative: units to return)
+    shortfall, held_units, lines = {}, {}, {}
+    for cart_item in cart_items:
+        key = _stock_key(cart_item.product_id, cart_item.variant_id)
+        shortfall[key] = shortfall.get(key, 0) + cart_item.quantity - held.get(cart_item.pk, 0)
+        held_units[key] = held_units.get(key, 0) + held.get(cart_item.pk, 0)
+        lines.setdefault(key, cart_item)
+
+    variant_ids = sorted(pk for kind, pk in shortfall if kind == 'variant')
+    product_ids = sorted(pk for kind, pk in shortfall if kind == 'product')
+    stock = {}
+    for kind, model, field, ids in (
+        ('variant', ProductVariant, 'stock', variant_ids),
+        ('product', Product, 'quantity', product_ids),
+    ):
+        if ids:
+            rows = model.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', field)
+            stock.update(((kind, pk), value) for pk, value in rows)
+
+    for key, needed in shortfall.items():
+        if needed > stock.get(key, 0):
+            raise ValidationError(
+                f"{lines[key].product.title} is no longer available in that quantity "
+                f"(only {stock.get(key, 0) + held_units[key]} left)"
+            )
+
+    taken = {key: -needed for key, needed in shortfall.items() if needed}
+    _restock(ProductVariant, 'stock', {pk: units for (kind, pk), units in taken.items() if kind == 'variant'})
+    _restock(Product, 'quantity', {pk: units for (kind, pk), units in taken.items() if kind == 'product'})
+    StockReservation.objects.filter(cart_item__cart=cart).delete()
+    transaction.on_commit(partial(_invalidate_products, {cart_item.product_id for cart_item in cart_items}))
+
+
+def release_expired_reservations(batch_size=500, now=None):
+    """
+    Return expired and orphaned holds to stock in batches.
+
+    Each batch locks its reservation rows (skipping rows another sweeper or
+    a checkout holds), restocks variants and products with one UPDATE each
+    and deletes the batch.
+
+    Returns:
+        tuple: Number of reservations released and units returned
+    """
+    now = now or timezone.now()
+    released = units = 0
+
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(skip_locked=True).filter(
+                    Q(expires_at__lte=now) | Q(cart_item__isnull=True)
+                ).order_by('id').values_list('id', 'product_id', 'variant_id', 'quantity')[:batch_size]
+            )
+            if not batch:
+                break
+
+            variant_totals, product_totals = {}, {}
+            for _, product_id, variant_id, quantity in batch:
+                if variant_id:
+                    variant_totals[variant_id] = variant_totals.get(variant_id, 0) + quantity
+                else:
+                    product_totals[product_id] = product_totals.get(product_id, 0) + quantity
+
+            _restock(ProductVariant, 'stock', variant_totals)
+            _restock(Product, 'quantity', product_totals)
+            StockReservation.objects.filter(id__in=[row[0] for row in batch]).delete()
+
+            transaction.on_commit(partial(_invalidate_products, {row[1] for row in batch}))
+
+        released += len(batch)
+        units += sum(row[3] for row in batch)
+        if len(batch) < batch_size:
+            break
+
+    return released, units
+
+
+# Bulk adjustments
+
+ADJUSTMENT_MODES = ('delta', 'set')
+
+
+class InvalidAdjustment(ValidationError):
+    """
+    Raised when an inventory adjustment payload cannot be parsed.
+    """
+
+
+def _parse_adjustment(row, default_mode, line):
+    if not isinstance(row, dict):
+        raise InvalidAdjustment(f"Row {line}: expected an object")
+
+    def number(name, cast):
+        value = row.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return cast(str(value).strip())
+        except (ValueError, ArithmeticError):
+            raise InvalidAdjustment(f"Row {line}: invalid {name} {value!r}")
+
+    mode = row.get('mode') or default_mode
+    if not isinstance(mode, str) or mode.strip().lower() not in ADJUSTMENT_MODES:
+        raise InvalidAdjustment(f"Row {line}: mode must be one of {', '.join(ADJUSTMENT_MODES)}")
+    mode = mode.strip().lower()
+
+    adjustment = {
+        'line': line,
+        'product': number('product', int),
+        'variant': number('variant', int),
+        'quantity': number('quantity', int),
+        'price': number('price', Decimal),
+        'mode': mode,
+    }
+    if adjustment['product'] is None and adjustment['variant'] is None:
+        raise InvalidAdjustment(f"Row {line}: a product or variant id is required")
+    if adjustment['quantity'] is None and adjustment['price'] is None:
+        raise InvalidAdjustment(f"Row {line}: nothing to adjust")
+    if mode == 'set' and adjustment['quantity'] is not None and adjustment['quantity'] < 0:
+        raise InvalidAdjustment(f"Row {line}: stock cannot be set below zero")
+    price = adjustment['price']
+    if price is not None and (not price.is_finite() or price < 0):
+        raise InvalidAdjustment(f"Row {line}: invalid price {row.get('price')!r}")
+    return adjustment
+
+
+def parse_adjustments(content, fmt='csv', mode='delta'):
+    """
+    Parse inventory adjustments from CSV text or JSON.
+
+    Each row names a ``product`` or ``variant`` id and a ``quantity`` and/or
+    ``price``. Quantities are deltas or absolute values according to the
+    row's ``mode`` column (falling back to ``mode``); prices are always
+    absolute. JSON may be a list of rows or ``{"mode": ..., "items": [...]}``.
+    """
+    if fmt == 'csv':
+        rows = csv.DictReader(io.StringIO(content) if isinstance(content, str) else content)
+    elif fmt == 'json':
+        data = json.loads(content) if isinstance(content, (str, bytes)) else content
+        if isinstance(data, dict):
+            mode = data.get('mode', mode)
+            data = data.get('items', [])
+        if not isinstance(data, list):
+            raise InvalidAdjustment("Expected a list of adjustments")
+        rows = data
+    else:
+        raise InvalidAdjustment(f"Unsupported format {fmt!r}")
+
+    return [_parse_adjustment(row, mode, line) for line, row in enumerate(rows, 1)]
+
+
+def _fold(adjustments, key):
+    """
+    Combine every adjustment per stock row in payload order.
+
+    Returns a dict of row id -> {'set': absolute stock or None,
+    'delta': units added after it, 'price': last price or None}.
+    """
+    folded = {}
+    for adjustment in adjustments:
+        entry = folded.setdefault(adjustment[key], {'set': None, 'delta': 0, 'price': None})
+        quantity = adjustment['quantity']
+        if quantity is not None:
+            if adjustment['mode'] == 'set':
+                entry['set'], entry['delta'] = quantity, 0
+            else:
+                entry['delta'] += quantity
+        if adjustment['price'] is not None:
+            entry['price'] = adjustment['price']
+    return folded
+
+
+def _held_units(model):
+    """
+    Units of the updated row currently held by cart reservations. They were
+    already taken out of stock and go back in when the holds are released.
+    """
+    if model is ProductVariant:
+        holds = StockReservation.objects.filter(variant=OuterRef('pk')).values('variant')
+    else:
+        holds = StockReservation.objects.filter(product=OuterRef('pk'), variant__isnull=True).values('product')
+    held = holds.order_by().annotate(total=Sum('quantity')).values('total')
+    return Coalesce(Subquery(held, output_field=IntegerField()), Value(0))
+
+
+def _stock_expression(model, field, entry):
+    if entry['set'] is not None:
+        # An absolute count includes the held units, which stock excludes
+        return Greatest(Value(entry['set'] + entry['delta']) - _held_units(model), Value(0))
+    # Relative to the current row so concurrent reservations are not lost
+    return Greatest(F(field) + entry['delta'], Value(0))
+
+
+def _apply(model, stock_field, price_field, folded, objects, chunk_size):
+    to_update = []
+    for pk, entry in folded.items():
+        obj = objects[pk]
+        fields = set()
+        if entry['set'] is not None or entry['delta']:
+            setattr(obj, stock_field, _stock_expression(model, stock_field, entry))
+            fields.add(stock_field)
+        if entry['price'] is not None:
+            setattr(obj, price_field, entry['price'])
+            fields.add(price_field)
+        to_update.append((obj, fields))
+
+    # bulk_update writes one field list per call, so group rows by what they change
+    groups = {}
+    for obj, fields in to_update:
+        groups.setdefault(tuple(sorted(fields)), []).append(obj)
+    for fields, objs in groups.items():
+        if fields:
+            model.objects.bulk_update(objs, list(fields), batch_size=chunk_size)
+    return len(to_update)
+
+
+def apply_adjustments(adjustments, chunk_size=500):
+    """
+    Apply parsed inventory adjustments with bulk updates.
+
+    Rows for unknown products or variants (or a variant under the wrong
+    product) are skipped and reported. Stock never drops below zero. Each
+    chunk of rows commits on its own; price bounds are recomputed once per
+    product whose prices changed, and caches are invalidated on commit.
+
+    Returns:
+        dict: Counts of updated products and variants, and skipped rows
+    """
+    errors, variant_rows, product_rows = [], [], []
+    variants = ProductVariant.objects.only('id', 'product_id').in_bulk(
+        {a['variant'] for a in adjustments if a['variant'] is not None}
+    )
+    product_ids = Product.objects.filter(
+        pk__in={a['product'] for a in adjustments if a['variant'] is None}
+    ).values_list('id', flat=True)
+    product_ids = set(product_ids)
+
+    for adjustment in adjustments:
+        if adjustment['variant'] is not None:
+            variant = variants.get(adjustment['variant'])
+            if variant is None or adjustment['product'] not in (None, variant.product_id):
+                errors.append({'row': adjustment['line'], 'error': 'Unknown variant'})
+            else:
+                variant_rows.append(adjustment)
+        elif adjustment['product'] in product_ids:
+            product_rows.append(adjustment)
+        else:
+            errors.append({'row': adjustment['line'], 'error': 'Unknown product'})
+
+    variant_folded = _fold(variant_rows, 'variant')
+    product_folded = _fold(product_rows, 'product')
+    touched = {variants[pk].product_id for pk in variant_folded} | set(product_folded)
+    repriced = (
+        {variants[pk].product_id for pk, entry in variant_folded.items() if entry['price'] is not None}
+        | {pk for pk, entry in product_folded.items() if entry['price'] is not None}
+    )
+
+    updated_variants = updated_products = 0
+    variant_ids, product_keys = list(variant_folded), list(product_folded)
+    for start in range(0, max(len(variant_ids), len(product_keys)), chunk_size):
+        with transaction.atomic():
+            chunk = variant_ids[start:start + chunk_size]
+            updated_variants += _apply(
+                ProductVariant, 'stock', 'variant_price',
+                {pk: variant_folded[pk] for pk in chunk},
+                {pk: variants[pk] for pk in chunk}, chunk_size
+            )
+            chunk = product_keys[start:start + chunk_size]
+            updated_products += _apply(
+                Product, 'quantity', 'price',
+                {pk: product_folded[pk] for pk in chunk},
+                {pk: Product(pk=pk) for pk in chunk}, chunk_size
+            )
+
+    with transaction.atomic():
+        refresh_price_bounds(repriced, batch_size=chunk_size)
+        if repriced:
+            transaction.on_commit(lambda: VersionedCache.bump_version(FACETS_NAMESPACE))
+        transaction.on_commit(partial(_invalidate_products, touched))
+
+    return {
+        'updated_products': updated_products,
+        'updated_variants': updated_variants,
+        'repriced_products': len(repriced),
+        'skipped': errors,
+    }
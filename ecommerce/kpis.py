@@ -0,0 +1,120 @@
+from collections import namedtuple
+from datetime import date, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Window(namedtuple('Window', ['start', 'end'])):
+    """
+    Inclusive range of days; a None bound leaves that side open.
+    """
+    __slots__ = ()
+
+    def condition(self, field):
+        condition = Q()
+        if self.start is not None:
+            condition &= Q(**{f'{field}__gte': self.start})
+        if self.end is not None:
+            condition &= Q(**{f'{field}__lte': self.end})
+        return condition
+
+
+ALL_TIME = Window(None, None)
+
+
+def _day(value):
+    return value if type(value) is date else timezone.localdate(value)
+
+
+def calendar_windows(today=None):
+    """
+    The usual reporting windows around ``today``: today, this and last
+    (Monday-based) week, this and last month.
+    """
+    today = today or timezone.localdate()
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    last_month_end = month_start - timedelta(days=1)
+    return {
+        'today': Window(today, today),
+        'this_week': Window(week_start, today),
+        'last_week': Window(week_start - timedelta(days=7), week_start - timedelta(days=1)),
+        'this_month': Window(month_start, today),
+        'last_month': Window(last_month_end.replace(day=1), last_month_end),
+    }
+
+
+def period_windows(start, end):
+    """
+    The days from ``start`` to ``end`` (dates or datetimes) and the period
+    of the same length just before it.
+    """
+    start, end = _day(start), _day(end)
+    length = end - start + timedelta(days=1)
+    return Window(start, end), Window(start - length, start - timedelta(days=1))
+
+
+class KpiQuery:
+    """
+    Named counts and sums, each over its own window and filters, computed
+    in a single aggregate query.
+
+    Every measure becomes a filtered aggregate (``Sum(field, filter=Q(...))``)
+    and the rows read are limited to the span of the windows, so "revenue
+    today, this week, this month and last month" is one round trip over a
+    bounded date range instead of one query per figure::
+
+        windows = calendar_windows()
+        kpis = KpiQuery(order_sales().filter(payment_status='Paid'))
+        for name, window in windows.items():
+            kpis.add(f'revenue_{name}', Sum, 'total', window)
+        figures = kpis.evaluate()
+    """
+
+    def __init__(self, queryset, date_field='date'):
+        self.queryset = queryset
+        self.date_field = date_field
+        self.aggregates = {}
+        self.defaults = {}
+        self.windows = []
+
+    def add(self, name, function, field, window=ALL_TIME, default=0, **filters):
+        """
+        Add ``function(field)`` (Sum, Count, Avg...) over the rows in
+        ``window`` matching ``filters``; ``default`` replaces a NULL result.
+        """
+        condition = window.condition(self.date_field) & Q(**filters)
+        self.aggregates[name] = function(field, filter=condition) if condition else function(field)
+        self.defaults[name] = default
+        self.windows.append(window)
+        return self
+
+    def span(self):
+        """
+        The smallest window covering every measure.
+        """
+        starts = [window.start for window in self.windows]
+        ends = [window.end for window in self.windows]
+        return Window(
+            None if None in starts else min(starts),
+            None if None in ends else max(ends)
+        )
+
+    def evaluate(self):
+        """
+        Run the query.
+
+        Returns:
+            dict: Value of every measure by name
+        """
+        if not self.aggregates:
+            return {}
+        rows = self.queryset.filter(self.span().condition(self.date_field))
+        # Positional aliases, so measure names may repeat model field names
+        names = list(self.aggregates)
+        values = rows.aggregate(**{f'kpi_{index}': self.aggregates[name] for index, name in enumerate(names)})
+        return {
+            name: self.defaults[name] if values[f'kpi_{index}'] is None else values[f'kpi_{index}']
+            for index, name in enumerate(names)
+        }
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from ecommerce.inventory import parse_adjustments, apply_adjustments, InvalidAdjustment
+
+
+class Command(BaseCommand):
+    help = 'Apply stock and price adjustments for products and variants from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file with product, variant, quantity, price and mode columns')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Defaults to the file extension')
+        parser.add_argument('--mode', choices=['delta', 'set'], default='delta',
+                            help='How quantities are applied when a row has no mode')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('json' if path.endswith('.json') else 'csv')
+        started = time.monotonic()
+
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as handle:
+                adjustments = parse_adjustments(
+                    handle if fmt == 'csv' else handle.read(), fmt, mode=options['mode']
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        except InvalidAdjustment as e:
+            raise CommandError(e.messages[0])
+
+        result = apply_adjustments(adjustments, chunk_size=options['chunk_size'])
+        for skipped in result['skipped']:
+            self.stderr.write(f"Row {skipped['row']}: {skipped['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {result['updated_variants']} variants and {result['updated_products']} products "
+            f"({result['repriced_products']} repriced) in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min, Max
+from ecommerce.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored min/max selling prices for all products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of products updated per query'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['has_variants', 'min_variant_price', 'max_variant_price', 'min_selling_price', 'max_selling_price']
+
+        products = Product.objects.annotate(
+            variant_min=Min('variants__variant_price'),
+            variant_max=Max('variants__variant_price')
+        ).order_by('id')
+
+        batch = []
+        updated = 0
+        for product in products.iterator(chunk_size=batch_size):
+            if product.variant_min is not None:
+                product.has_variants = True
+                product.min_variant_price = product.variant_min
+                product.max_variant_price = product.variant_max
+            product.min_selling_price, product.max_selling_price = product.compute_selling_price_bounds()
+            batch.append(product)
+
+            if len(batch) >= batch_size:
+                updated += self._flush(batch, fields)
+
+        if batch:
+            updated += self._flush(batch, fields)
+
+        self.stdout.write(self.style.SUCCESS(f'Updated selling prices for {updated} products'))
+
+    @staticmethod
+    def _flush(batch, fields):
+        with transaction.atomic():
+            Product.objects.bulk_update(batch, fields)
+        count = len(batch)
+        batch.clear()
+        return count
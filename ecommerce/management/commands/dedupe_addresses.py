@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from ecommerce.views.services import AddressService
+
+
+class Command(BaseCommand):
+    help = 'Merge duplicate addresses per user and repoint their orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        groups, removed = AddressService.collapse_duplicates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {groups} duplicate address groups ({removed} addresses removed)'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from ecommerce.customer_stats import rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-customer lifetime stats table from paid orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_customer_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} customers'))
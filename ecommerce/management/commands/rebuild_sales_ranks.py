@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from ecommerce.sales import rebuild_sales_ranks
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily product sales table from paid orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_sales_ranks(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} product sales rows'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from ecommerce.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index for the configured search backend'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search index using {backend.__class__.__name__}'))
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ecommerce.rollups import changed_order_dates, rebuild_order_rollups, refresh_order_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily order rollups for recently changed orders, or all of them with --full'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=2,
+            help='Refresh the days of orders updated within this many days'
+        )
+        parser.add_argument('--full', action='store_true', help='Rebuild the whole rollup table')
+        parser.add_argument('--batch-size', type=int, default=31, help='Days aggregated per query')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            count = rebuild_order_rollups(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} order rollup rows'))
+            return
+
+        dates = changed_order_dates(timezone.now() - timedelta(days=options['days']))
+        count = refresh_order_rollups(dates, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {len(dates)} days ({count} rollup rows)'))
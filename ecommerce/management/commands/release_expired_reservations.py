@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from ecommerce.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Return stock held by expired cart reservations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        released, units = release_expired_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} reservations ({units} units)'))
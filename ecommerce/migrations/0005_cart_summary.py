@@ -0,0 +1,42 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:20
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def backfill_cart_summary(apps, schema_editor):
+    Cart = apps.get_model('ecommerce', 'Cart')
+    CartItem = apps.get_model('ecommerce', 'CartItem')
+
+    summaries = {}
+    for item in CartItem.objects.select_related('product', 'variant').iterator():
+        base_price = (item.variant.variant_price
+                      if item.variant and item.variant.variant_price
+                      else item.product.price)
+        unit_price = round(base_price - base_price * (item.product.discount / 100), 2)
+        count, amount = summaries.get(item.cart_id, (0, Decimal('0.00')))
+        summaries[item.cart_id] = (count + 1, amount + unit_price * item.quantity)
+
+    for cart_id, (count, amount) in summaries.items():
+        Cart.objects.filter(pk=cart_id).update(total_items=count, total_amount=amount)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0004_brand_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_cart_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:22
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0005_cart_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='max_selling_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='min_selling_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['min_selling_price', 'id'], name='ecommerce_p_min_sel_ecc6e2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['max_selling_price'], name='ecommerce_p_max_sel_d363bf_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SEARCH_INDEX_NAME = 'product_search_vector_gin'
+
+
+def search_vector_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    # Must match PostgresSearchBackend.search_vector()
+    return GinIndex(
+        SearchVector('title', weight='A', config='simple') +
+        SearchVector('keywords', weight='C', config='simple'),
+        name=SEARCH_INDEX_NAME,
+    )
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('ecommerce', 'Product'), search_vector_index())
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('ecommerce', 'Product'), search_vector_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0006_product_selling_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='ecommerce.product')),
+            ],
+            options={
+                'unique_together': {('term', 'product')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
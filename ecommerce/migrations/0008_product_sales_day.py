@@ -0,0 +1,71 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:30
+
+import django.db.models.deletion
+from datetime import date
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_sales_days(apps, schema_editor):
+    Order = apps.get_model('ecommerce', 'Order')
+    OrderItem = apps.get_model('ecommerce', 'OrderItem')
+    ProductSalesDay = apps.get_model('ecommerce', 'ProductSalesDay')
+    # Same forward-decay weight as ecommerce.sales.decay_weight
+    half_life = getattr(settings, 'SALES_RANK_HALF_LIFE_DAYS', 14)
+
+    order_dates = {
+        order_id: timezone.localdate(paid_at or created_at)
+        for order_id, paid_at, created_at in Order.objects.filter(
+            payment_status='Paid'
+        ).values_list('id', 'paid_at', 'created_at').iterator()
+    }
+    totals = {}
+    items = OrderItem.objects.filter(order__payment_status='Paid').values_list(
+        'order_id', 'product_id', 'quantity', 'subtotal'
+    )
+    for order_id, product_id, quantity, subtotal in items.iterator():
+        key = (product_id, order_dates[order_id])
+        units, revenue, orders = totals.get(key, (0, Decimal('0.00'), set()))
+        orders.add(order_id)
+        totals[key] = (units + quantity, revenue + subtotal, orders)
+
+    ProductSalesDay.objects.bulk_create([
+        ProductSalesDay(
+            product_id=product_id,
+            date=sale_date,
+            units=units,
+            revenue=revenue,
+            orders=len(orders),
+            weighted_units=units * 2.0 ** ((sale_date - date(2024, 1, 1)).days / half_life)
+        )
+        for (product_id, sale_date), (units, revenue, orders) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0007_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('orders', models.IntegerField(default=0)),
+                ('weighted_units', models.FloatField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_days', to='ecommerce.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'product'], name='ecommerce_p_date_acebc1_idx')],
+                'unique_together': {('product', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_sales_days, migrations.RunPython.noop),
+    ]
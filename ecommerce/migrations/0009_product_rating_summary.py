@@ -0,0 +1,57 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:32
+
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+from django.db.models import Avg, Count, Q
+
+
+def backfill_rating_summary(apps, schema_editor):
+    Review = apps.get_model('ecommerce', 'Review')
+    Product = apps.get_model('ecommerce', 'Product')
+    # Same star buckets as Product.refresh_rating_summary
+    star_ranges = {
+        5: Q(rating__gte=Decimal('4.5')),
+        4: Q(rating__gte=Decimal('3.5'), rating__lt=Decimal('4.5')),
+        3: Q(rating__gte=Decimal('2.5'), rating__lt=Decimal('3.5')),
+        2: Q(rating__gte=Decimal('1.5'), rating__lt=Decimal('2.5')),
+        1: Q(rating__lt=Decimal('1.5')),
+    }
+    summaries = Review.objects.values('product_id').annotate(
+        count=Count('id'),
+        average=Avg('rating'),
+        **{f'stars_{stars}': Count('id', filter=condition) for stars, condition in star_ranges.items()}
+    ).order_by()
+    for summary in summaries:
+        average = round(Decimal(str(summary['average'] or 0)), 2)
+        Product.objects.filter(pk=summary['product_id']).update(
+            review_count=summary['count'],
+            average_rating=average,
+            rating_histogram={str(stars): summary[f'stars_{stars}'] for stars in star_ranges},
+            rating=int(average.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0008_product_sales_day'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='average_rating',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_histogram',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_summary, migrations.RunPython.noop),
+    ]
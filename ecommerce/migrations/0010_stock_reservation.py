@@ -0,0 +1,51 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:34
+
+import django.db.models.deletion
+from datetime import timedelta
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def hold_existing_cart_items(apps, schema_editor):
+    # Stock for existing cart lines was already decremented; give those
+    # holds a normal lifetime so the sweeper eventually returns them
+    CartItem = apps.get_model('ecommerce', 'CartItem')
+    StockReservation = apps.get_model('ecommerce', 'StockReservation')
+    expires_at = timezone.now() + timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', 30 * 60))
+    StockReservation.objects.bulk_create([
+        StockReservation(
+            cart_item_id=item.id,
+            product_id=item.product_id,
+            variant_id=item.variant_id,
+            quantity=item.quantity,
+            expires_at=expires_at
+        )
+        for item in CartItem.objects.all().iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0009_product_rating_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cart_item', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservation', to='ecommerce.cartitem')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='ecommerce.product')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='ecommerce.productvariant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='ecommerce_s_expires_a71453_idx')],
+            },
+        ),
+        migrations.RunPython(hold_existing_cart_items, migrations.RunPython.noop),
+    ]
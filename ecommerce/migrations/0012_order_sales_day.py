@@ -0,0 +1,43 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:51
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_address_fingerprint'),
+        ('ecommerce', '0011_idempotency_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('payment_status', models.CharField(max_length=20)),
+                ('payment_method', models.CharField(blank=True, max_length=50)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('county', models.CharField(blank=True, max_length=100)),
+                ('orders', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='ecommerce_o_created_86a742_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordersalesday',
+            index=models.Index(fields=['payment_status', 'date'], name='ecommerce_o_payment_dc8939_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ordersalesday',
+            unique_together={('date', 'status', 'payment_status', 'payment_method', 'city', 'county')},
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:57
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+# Same thresholds as CustomerStats.TIERS
+TIERS = (
+    ('Platinum', Decimal('30000')),
+    ('Gold', Decimal('10000')),
+    ('Silver', Decimal('5000')),
+    ('Bronze', Decimal('0')),
+)
+
+
+def backfill_customer_stats(apps, schema_editor):
+    CustomerStats = apps.get_model('ecommerce', 'CustomerStats')
+    Order = apps.get_model('ecommerce', 'Order')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    totals = {
+        row['user_id']: row
+        for row in Order.objects.filter(payment_status='Paid').values('user_id').annotate(
+            paid_orders=Count('id'),
+            total_spent=Sum('total'),
+            first_order_at=Min('created_at'),
+            last_order_at=Max('created_at')
+        ).order_by()
+    }
+    rows = []
+    for user_id in User.objects.values_list('id', flat=True).iterator():
+        row = totals.get(user_id, {})
+        total_spent = row.get('total_spent') or Decimal('0.00')
+        rows.append(CustomerStats(
+            user_id=user_id,
+            paid_orders=row.get('paid_orders', 0),
+            total_spent=total_spent,
+            first_order_at=row.get('first_order_at'),
+            last_order_at=row.get('last_order_at'),
+            tier=next(name for name, minimum in TIERS if total_spent >= minimum)
+        ))
+    CustomerStats.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_address_fingerprint'),
+        ('ecommerce', '0012_order_sales_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='lifetime_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('paid_orders', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('first_order_at', models.DateTimeField(blank=True, null=True)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+                ('tier', models.CharField(choices=[('Platinum', 'Platinum'), ('Gold', 'Gold'), ('Silver', 'Silver'), ('Bronze', 'Bronze')], default='Bronze', max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Customer stats',
+                'indexes': [models.Index(fields=['total_spent'], name='ecommerce_c_total_s_061212_idx'), models.Index(fields=['tier', 'total_spent'], name='ecommerce_c_tier_62f4d5_idx'), models.Index(fields=['last_order_at'], name='ecommerce_c_last_or_c7889c_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_customer_stats, migrations.RunPython.noop),
+    ]
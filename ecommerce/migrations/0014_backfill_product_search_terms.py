@@ -0,0 +1,66 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:40
+
+import re
+
+from django.db import migrations
+
+# Same tokenization and weights as ecommerce.search at the time of writing
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERM_LENGTH = 64
+FIELD_WEIGHTS = {
+    'title': 8,
+    'brand': 4,
+    'category': 4,
+    'parent_category': 2,
+    'keywords': 1,
+}
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text.lower())]
+
+
+def backfill_search_terms(apps, schema_editor):
+    # PostgreSQL searches through the GIN index instead of the posting table
+    if schema_editor.connection.vendor == 'postgresql':
+        return
+    Product = apps.get_model('ecommerce', 'Product')
+    ProductSearchTerm = apps.get_model('ecommerce', 'ProductSearchTerm')
+    products = Product.objects.select_related('brand', 'category__parent_category').order_by('id')
+
+    batch = []
+    for product in products.iterator(chunk_size=500):
+        fields = {
+            'title': product.title,
+            'keywords': product.keywords,
+            'brand': product.brand.brand_title if product.brand else '',
+            'category': product.category.category_name if product.category else '',
+            'parent_category': (
+                product.category.parent_category.parent_name if product.category else ''
+            ),
+        }
+        weights = {}
+        for field, text in fields.items():
+            for term in set(tokenize(text)):
+                weights[term] = weights.get(term, 0) + FIELD_WEIGHTS[field]
+        batch += [
+            ProductSearchTerm(product_id=product.id, term=term, weight=weight)
+            for term, weight in weights.items()
+        ]
+        if len(batch) >= 1000:
+            ProductSearchTerm.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    ProductSearchTerm.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0013_customer_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_terms, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,13 @@
 from django.db import models
+from django.db.models import Avg, Count, Q
 from django.forms import ValidationError
 from accounts.models import Address, CustomUser as User
+from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from django.core.validators import MinValueValidator
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 import uuid
 
 
@@ -82,7 +84,7 @@ class Product(models.Model):
     # slug = models.SlugField(unique=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     featured = models.BooleanField(default=False)
-    discount = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'))
     quantity = models.PositiveIntegerField(default=0)
     description = models.TextField()
     prod_img = models.ImageField(upload_to='prod_images/')
@@ -103,34 +105,130 @@ class Product(models.Model):
         null=True, 
         blank=True
     )
+    
+    # Effective (discounted) price bounds, maintained on save for indexed price filtering
+    min_selling_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
+    max_selling_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
+
+    # Review summary, maintained from Review save/delete by refresh_rating_summary
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
+    # Number of reviews per star ("1".."5"), ratings rounded to the nearest star
+    rating_histogram = models.JSONField(default=dict, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['min_selling_price', 'id']),
+            models.Index(fields=['max_selling_price']),
+        ]
+
+    # Fields the selling price bounds are computed from, besides the variant bounds
+    PRICING_FIELDS = ('price', 'discount', 'has_variants')
+    SELLING_PRICE_FIELDS = ('min_selling_price', 'max_selling_price')
+
+    # Pricing fields as last loaded from or written to the database
+    _saved_pricing = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_pricing = instance._pricing()
+        return instance
+
+    def _pricing(self):
+        return tuple(self.__dict__.get(name) for name in self.PRICING_FIELDS)
+
+    @property
+    def pricing_changed(self):
+        """
+        Whether price, discount or has_variants differ from the stored values.
+        Valid inside post_save receivers, before save() records the new values.
+        """
+        return self._pricing() != self._saved_pricing
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)  # Save initial data to get access to related objects
-
-        # Update min and max variant prices if variants exist
-        if self.variants.exists():
-            variant_prices = self.variants.values_list('variant_price', flat=True)
-            variant_prices = [p for p in variant_prices if p is not None]
-
-            if variant_prices:
-                self.has_variants = True
-                self.min_variant_price = min(variant_prices)
-                self.max_variant_price = max(variant_prices)
-        #     else:
-        #         self.has_variants = False
-        #         self.min_variant_price = None
-        #         self.max_variant_price = None
-        # else:
-        #     self.has_variants = False
-        #     self.min_variant_price = None
-        #     self.max_variant_price = None
-
-        # Save again to persist updated variant-related fields
-        super().save(update_fields=[
-            'has_variants',
-            'min_variant_price',
-            'max_variant_price'
-        ])
+        # Selling bounds follow price and discount. The variant price bounds
+        # (and the selling bounds derived from them) are recomputed from the
+        # variants when the transaction commits; see ecommerce.pricing.
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            write_pricing = self.pricing_changed
+        else:
+            write_pricing = self.pricing_changed and bool(set(update_fields) & set(self.PRICING_FIELDS))
+        if write_pricing:
+            self.min_selling_price, self.max_selling_price = self.compute_selling_price_bounds()
+
+        if update_fields is not None:
+            if write_pricing:
+                kwargs['update_fields'] = set(update_fields) | set(self.SELLING_PRICE_FIELDS)
+        elif not self._state.adding:
+            # Never write back bounds that may have been loaded before a
+            # variant changed; they are only rewritten along with new pricing
+            skipped = {'min_variant_price', 'max_variant_price'}
+            if not write_pricing:
+                skipped.update(self.SELLING_PRICE_FIELDS)
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+        self._saved_pricing = self._pricing()
+
+    def refresh_rating_summary(self):
+        """
+        Recompute the review count, average and star histogram with one
+        aggregate query and store them without re-running save().
+        """
+        star_ranges = {
+            5: Q(rating__gte=Decimal('4.5')),
+            4: Q(rating__gte=Decimal('3.5'), rating__lt=Decimal('4.5')),
+            3: Q(rating__gte=Decimal('2.5'), rating__lt=Decimal('3.5')),
+            2: Q(rating__gte=Decimal('1.5'), rating__lt=Decimal('2.5')),
+            1: Q(rating__lt=Decimal('1.5')),
+        }
+        summary = Review.objects.filter(product=self).aggregate(
+            count=Count('id'),
+            average=Avg('rating'),
+            **{f'stars_{stars}': Count('id', filter=condition) for stars, condition in star_ranges.items()}
+        )
+
+        self.review_count = summary['count']
+        self.average_rating = round(Decimal(str(summary['average'] or 0)), 2)
+        self.rating_histogram = {str(stars): summary[f'stars_{stars}'] for stars in star_ranges}
+        self.rating = int(self.average_rating.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+        Product.objects.filter(pk=self.pk).update(
+            review_count=self.review_count,
+            average_rating=self.average_rating,
+            rating_histogram=self.rating_histogram,
+            rating=self.rating
+        )
+
+    def compute_selling_price_bounds(self):
+        """
+        Return the (min, max) discounted price across the product or its variants
+        """
+        if self.has_variants and self.min_variant_price and self.max_variant_price:
+            return (
+                self.calculate_selling_price(variant_price=self.min_variant_price),
+                self.calculate_selling_price(variant_price=self.max_variant_price)
+            )
+        selling_price = self.current_selling_price
+        return selling_price, selling_price
 
 
     def calculate_selling_price(self, custom_discount=None, variant_price=None):
@@ -143,6 +241,9 @@ class Product(models.Model):
         """
         discount = custom_discount if custom_discount is not None else self.discount
         base_price = variant_price if variant_price is not None else self.price
+        # Unsaved instances may still hold ints or floats (e.g. field defaults)
+        discount = Decimal(str(discount))
+        base_price = Decimal(str(base_price))
         
         if discount < 0 or discount > 100:
             raise ValueError("Discount percentage must be between 0 and 100")
@@ -198,8 +299,6 @@ class ProductVariant(models.Model):
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
-        
-        self.product.save()
     
     @property
     def selling_price(self):
@@ -282,12 +381,37 @@ class Order(models.Model):
             models.Index(fields=['order_number']),
             models.Index(fields=['status']),
             models.Index(fields=['payment_status']),
+            models.Index(fields=['created_at']),
         ]
 
+    # Payment status as last loaded from or written to the database
+    _saved_payment_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_payment_status = instance.__dict__.get('payment_status')
+        return instance
+
+    @property
+    def payment_status_changed(self):
+        """
+        Whether payment_status differs from the stored value. Valid inside
+        post_save receivers, before save() records the new value.
+        """
+        return self.payment_status != self._saved_payment_status
+
+    @property
+    def was_paid(self):
+        return self._saved_payment_status == "Paid"
+
     def save(self, *args, **kwargs):
         if not self.order_number:
             self.order_number = self.generate_order_number()
+        if self.payment_status == "Paid" and not self.paid_at:
+            self.paid_at = timezone.now()
         super().save(*args, **kwargs)
+        self._saved_payment_status = self.payment_status
 
     def generate_order_number(self):
         """Generate a unique order number"""
@@ -348,10 +472,129 @@ class OrderItem(models.Model):
         variant_info = f" ({self.variant})" if self.variant else ""
         return f"{self.quantity}x {self.product_name}{variant_info}"
 
+class ProductSalesDay(models.Model):
+    """
+    Units, revenue and orders per product per day, counted when an order
+    becomes Paid (and reversed if it stops being Paid).
+
+    ``weighted_units`` stores units scaled by a forward-decay weight that
+    grows with the sale date (see ecommerce.sales), so a plain SUM ranks
+    products by time-decayed sales.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_days')
+    date = models.DateField()
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    # Paid orders containing the product; each order lands on a single day
+    orders = models.IntegerField(default=0)
+    weighted_units = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ['product', 'date']
+        indexes = [
+            models.Index(fields=['date', 'product']),
+        ]
+
+    def __str__(self):
+        return f"{self.product} on {self.date}: {self.units} units"
+
+class OrderSalesDay(models.Model):
+    """
+    Number and value of orders per day (in the local timezone of
+    created_at) for every combination of status, payment status, payment
+    method and shipping location seen that day.
+
+    A day's rows are recomputed from its orders whenever one of them
+    changes (see ecommerce.rollups), so analytics read a few rows per day
+    instead of scanning the order history.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20)
+    payment_status = models.CharField(max_length=20)
+    payment_method = models.CharField(max_length=50, blank=True)
+    city = models.CharField(max_length=100, blank=True)
+    county = models.CharField(max_length=100, blank=True)
+    orders = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        unique_together = ['date', 'status', 'payment_status', 'payment_method', 'city', 'county']
+        indexes = [
+            models.Index(fields=['payment_status', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}/{self.payment_status}: {self.orders} orders"
+
+class CustomerStats(models.Model):
+    """
+    Lifetime figures of a customer's paid orders: one row per user, created
+    with the user and recomputed in the same transaction whenever one of
+    their orders becomes, or stops being, Paid (see ecommerce.customer_stats).
+    """
+    # Minimum lifetime spend per tier, highest first
+    TIERS = (
+        ('Platinum', Decimal('30000')),
+        ('Gold', Decimal('10000')),
+        ('Silver', Decimal('5000')),
+        ('Bronze', Decimal('0')),
+    )
+    VIP_TIER = 'Platinum'
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='lifetime_stats'
+    )
+    paid_orders = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    first_order_at = models.DateTimeField(null=True, blank=True)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    tier = models.CharField(max_length=10, choices=[(name, name) for name, _ in TIERS], default='Bronze')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Customer stats"
+        indexes = [
+            models.Index(fields=['total_spent']),
+            models.Index(fields=['tier', 'total_spent']),
+            models.Index(fields=['last_order_at']),
+        ]
+
+    @classmethod
+    def tier_for(cls, total_spent):
+        for name, minimum in cls.TIERS:
+            if total_spent >= minimum:
+                return name
+        return cls.TIERS[-1][0]
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        The user's stats row, or an unsaved empty one if it does not exist.
+        """
+        try:
+            return user.lifetime_stats
+        except cls.DoesNotExist:
+            return cls(user=user)
+
+    @property
+    def is_vip(self):
+        return self.tier == self.VIP_TIER
+
+    @property
+    def avg_order_value(self):
+        return self.total_spent / self.paid_orders if self.paid_orders else Decimal('0.00')
+
+    def __str__(self):
+        return f"{self.user}: {self.paid_orders} paid orders, {self.total_spent} ({self.tier})"
+
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    
+    # Denormalized summary for the header mini-cart, maintained by CartService
+    total_items = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
 
     def __str__(self):
         return f"Cart for {self.user.email}"
@@ -359,6 +602,15 @@ class Cart(models.Model):
     def total_price(self):
         return sum(item.total_item_price for item in self.cart_items.all())
 
+    def recalculate_summary(self):
+        """
+        Rebuild the denormalized item count and total from the cart items
+        """
+        items = list(self.cart_items.select_related('product', 'variant__product'))
+        self.total_items = len(items)
+        self.total_amount = sum((item.total_item_price for item in items), Decimal('0.00'))
+        self.save(update_fields=['total_items', 'total_amount', 'updated_at'])
+
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="cart_items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -409,6 +661,75 @@ class CartItem(models.Model):
             raise ValidationError(_('Requested quantity exceeds available stock'))
 
 
+class StockReservation(models.Model):
+    """
+    Units held out of stock for a cart line until ``expires_at``.
+
+    Stock is decremented when the hold is taken. Expired holds, and holds
+    whose cart line was deleted, are returned to stock in bulk by the
+    release_expired_reservations command; checkout deletes the holds of
+    the ordered lines, turning them into order allocations.
+    """
+    cart_item = models.OneToOneField(
+        CartItem,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reservation'
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    variant = models.ForeignKey(
+        ProductVariant,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='reservations'
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} of {self.product_id} held until {self.expires_at}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of a checkout or payment request, keyed by the client's
+    idempotency key so retries replay the original result.
+
+    ``key`` is a digest of the user and the client key (or, when the client
+    sent none, of the request itself). A record without ``response_url`` is
+    still being processed. Records are ignored once ``expires_at`` passes.
+    """
+    scope = models.CharField(max_length=32)
+    key = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=64)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True)
+    response_url = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['scope', 'key']
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    @property
+    def completed(self):
+        return bool(self.response_url)
+
+    def __str__(self):
+        return f"{self.scope} {self.key[:12]}"
+
+
 class Wishlist(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -427,6 +748,21 @@ class WishlistItem(models.Model):
 
     def __str__(self):
         return f"{self.product.title} in {self.wishlist.user.email}'s wishlist"
+
+
+class ProductSearchTerm(models.Model):
+    """
+    Inverted index posting used by the portable product search backend
+    """
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ['term', 'product']
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id} ({self.weight})"
     
 models_ = [
     Slider,
@@ -0,0 +1,238 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from functools import cached_property, reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """
+    A single page of keyset-paginated results.
+
+    Mirrors the parts of django.core.paginator.Page that the templates use,
+    but navigates with opaque cursors instead of page numbers.
+    """
+    is_cursor_page = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Cursor-based paginator that seeks past the last row seen instead of
+    using OFFSET, so every page costs the same as the first one.
+
+    The ordering must end with a unique column (``id``) so cursors are
+    unambiguous. No COUNT query is issued unless ``count`` is accessed.
+    """
+    ORDERINGS = {
+        'newest': ('-created_at', '-id'),
+        'oldest': ('created_at', 'id'),
+        'price_asc': ('min_selling_price', 'id'),
+        'price_desc': ('-min_selling_price', '-id'),
+        # Only offered for querysets annotated by a search backend
+        'relevance': ('-search_rank', '-id'),
+    }
+    DEFAULT_ORDERING = 'newest'
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.per_page = int(per_page)
+        self.base_queryset = queryset
+        self._set_ordering(ordering)
+
+    def _set_ordering(self, ordering):
+        if ordering not in self.ORDERINGS or not self._supports(ordering):
+            ordering = self.DEFAULT_ORDERING
+        self.ordering_name = ordering
+        self.ordering = self.ORDERINGS[ordering]
+        self.queryset = self.base_queryset.order_by(*self.ordering)
+
+    @staticmethod
+    def _field_name(order):
+        return order.lstrip('-')
+
+    def _field(self, name):
+        """
+        The model field or annotation output field a cursor value is read from.
+        """
+        annotation = self.base_queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.base_queryset.model._meta.get_field(name)
+
+    def _supports(self, ordering):
+        # e.g. relevance needs the search_rank annotation
+        try:
+            for order in self.ORDERINGS[ordering]:
+                self._field(self._field_name(order))
+        except FieldDoesNotExist:
+            return False
+        return True
+
+    def encode_cursor(self, values, reverse=False):
+        payload = json.dumps({'v': values, 'r': reverse, 'o': self.ordering_name})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Returns:
+            tuple: Position values, reverse flag and ordering name
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            return payload['v'], bool(payload.get('r', False)), payload.get('o')
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError, AttributeError):
+            raise InvalidCursor("Invalid pagination cursor")
+
+    @staticmethod
+    def _serialize_value(value):
+        # Keep full precision; DjangoJSONEncoder truncates microseconds
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def _position(self, obj):
+        return [
+            self._serialize_value(getattr(obj, self._field_name(order)))
+            for order in self.ordering
+        ]
+
+    def _parse_position(self, values):
+        """
+        Convert cursor values back to the types of the ordering fields, so a
+        tampered cursor is rejected here rather than by the database.
+        """
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor("Cursor does not match the requested ordering")
+        try:
+            parsed = [
+                self._field(self._field_name(order)).to_python(value)
+                for order, value in zip(self.ordering, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor("Invalid pagination cursor")
+        if None in parsed:
+            raise InvalidCursor("Invalid pagination cursor")
+        return parsed
+
+    def _seek_filter(self, values, reverse):
+        """
+        Build ``(a, b) > (x, y)`` style predicates for the ordering,
+        expanded into ORs so they work on every database backend.
+        """
+        values = self._parse_position(values)
+
+        clauses = []
+        for index, order in enumerate(self.ordering):
+            descending = order.startswith('-')
+            if reverse:
+                descending = not descending
+            lookup = 'lt' if descending else 'gt'
+
+            clause = {
+                self._field_name(prev): values[i]
+                for i, prev in enumerate(self.ordering[:index])
+            }
+            clause[f"{self._field_name(order)}__{lookup}"] = values[index]
+            clauses.append(Q(**clause))
+        return reduce(or_, clauses)
+
+    def get_page(self, cursor=None):
+        """
+        Return the page that follows (or, for reverse cursors, precedes) the cursor.
+
+        Raises:
+            InvalidCursor: The cursor cannot be decoded or does not fit the ordering
+        """
+        values, reverse = (None, False)
+        if cursor:
+            values, reverse, ordering = self.decode_cursor(cursor)
+            # A cursor is only meaningful in the ordering that produced it
+            if ordering is not None and ordering != self.ordering_name:
+                if ordering not in self.ORDERINGS or not self._supports(ordering):
+                    raise InvalidCursor("Cursor does not match the requested ordering")
+                self._set_ordering(ordering)
+
+        queryset = self.queryset
+        if reverse:
+            queryset = queryset.reverse()
+        if values is not None:
+            queryset = queryset.filter(self._seek_filter(values, reverse))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                next_cursor = self.encode_cursor(self._position(rows[-1]))
+            if values is not None and (has_more or not reverse):
+                previous_cursor = self.encode_cursor(self._position(rows[0]), reverse=True)
+
+        return KeysetPage(rows, self, next_cursor=next_cursor, previous_cursor=previous_cursor)
+
+    @cached_property
+    def count(self):
+        """
+        Approximate number of rows, only computed when explicitly accessed.
+        """
+        return approximate_count(self.queryset)
+
+
+def approximate_count(queryset):
+    """
+    Estimate the size of a queryset.
+
+    On PostgreSQL this reads the planner's row estimate from EXPLAIN, which
+    costs the same regardless of table size. Other backends fall back to an
+    exact COUNT(*).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+TASK_FAILED = 'Failed'
+TASK_TIMED_OUT = 'Timed out'
+TASK_NOT_STARTED = 'Not started in time'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.DASHBOARD_WORKERS, thread_name_prefix='dashboard'
+            )
+        return _executor
+
+
+def _run(task, name, started):
+    started[name] = time.monotonic()
+    # Pool threads hold their own database connections; treat every task
+    # like a request so they are recycled per CONN_MAX_AGE
+    close_old_connections()
+    try:
+        return task()
+    finally:
+        close_old_connections()
+
+
+def run_parallel(tasks, timeout, timeouts=None, queue_timeout=None):
+    """
+    Run independent callables on the shared worker pool.
+
+    Each task may run for its entry in ``timeouts`` (``timeout`` when it
+    has none) counted from when a worker picks it up, so tasks queued
+    behind others keep their whole allowance. A task still queued after
+    ``queue_timeout`` seconds (default: the largest allowance) is cancelled
+    without running. A task that timed out once started keeps running in
+    the background, so work that caches its result still benefits the next
+    caller. With DASHBOARD_WORKERS set to 0 the tasks run one after another
+    in the calling thread.
+
+    Failures are logged; the returned messages are generic so exception
+    details never reach the caller's response.
+
+    Args:
+        tasks (dict): Callables by name
+        timeout (float): Seconds a task may run once started
+        timeouts (dict, optional): Per-task overrides of ``timeout``
+        queue_timeout (float, optional): Seconds a task may wait to start
+    Returns:
+        tuple: Results by name, and error messages by name for the tasks
+        that failed, timed out or never started
+    """
+    timeouts = timeouts or {}
+    results, errors = {}, {}
+
+    if settings.DASHBOARD_WORKERS <= 0:
+        for name, task in tasks.items():
+            try:
+                results[name] = task()
+            except Exception:
+                logger.exception("Task %s failed", name)
+                errors[name] = TASK_FAILED
+        return results, errors
+
+    limits = {name: timeouts.get(name, timeout) for name in tasks}
+    if queue_timeout is None:
+        queue_timeout = max(limits.values(), default=timeout)
+
+    executor = _get_executor()
+    queue_deadline = time.monotonic() + queue_timeout
+    started = {}
+    futures = {executor.submit(_run, task, name, started): name for name, task in tasks.items()}
+    pending = set(futures)
+    while pending:
+        now = time.monotonic()
+        next_deadline = None
+        for future in list(pending):
+            name = futures[future]
+            if future.done():
+                continue
+            if name in started:
+                deadline = started[name] + limits[name]
+                if deadline <= now:
+                    logger.warning("Task %s timed out after %ss", name, limits[name])
+                    errors[name] = TASK_TIMED_OUT
+                    pending.discard(future)
+                    continue
+            elif queue_deadline <= now and future.cancel():
+                logger.warning("Task %s did not start within %ss", name, queue_timeout)
+                errors[name] = TASK_NOT_STARTED
+                pending.discard(future)
+                continue
+            else:
+                # A task that just left the queue records its start momentarily
+                deadline = max(queue_deadline, now + 0.005)
+            next_deadline = deadline if next_deadline is None else min(next_deadline, deadline)
+
+        done, pending = wait(
+            pending,
+            timeout=None if next_deadline is None else max(next_deadline - now, 0),
+            return_when=FIRST_COMPLETED
+        )
+        for future in done:
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception:
+                logger.exception("Task %s failed", name)
+                errors[name] = TASK_FAILED
+    return results, errors
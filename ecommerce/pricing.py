@@ -0,0 +1,64 @@
+from django.db.models import Min, Max
+
+from ecommerce.cache import VersionedCache, invalidate_product_detail
+from ecommerce.deferred import defer_batch
+from ecommerce.facets import FACETS_NAMESPACE
+from ecommerce.models import Product
+
+PRICE_BOUND_FIELDS = [
+    'has_variants', 'min_variant_price', 'max_variant_price',
+    'min_selling_price', 'max_selling_price',
+]
+
+
+def refresh_price_bounds(product_ids, batch_size=500, update_batch_size=100):
+    """
+    Recompute the stored variant and selling price bounds of the given
+    products: one aggregate query per batch, written back with bulk_update
+    in smaller batches to keep its CASE statements short.
+
+    Returns:
+        int: Number of products updated
+    """
+    product_ids = sorted(set(product_ids))
+    updated = 0
+    for start in range(0, len(product_ids), batch_size):
+        products = list(
+            Product.objects.filter(pk__in=product_ids[start:start + batch_size]).annotate(
+                variant_min=Min('variants__variant_price'),
+                variant_max=Max('variants__variant_price')
+            ).only('id', 'price', 'discount', *PRICE_BOUND_FIELDS)
+        )
+        for product in products:
+            if product.variant_min is not None:
+                product.has_variants = True
+                product.min_variant_price = product.variant_min
+                product.max_variant_price = product.variant_max
+            else:
+                # The last variant (with a price) is gone
+                product.has_variants = False
+                product.min_variant_price = product.max_variant_price = None
+            product.min_selling_price, product.max_selling_price = product.compute_selling_price_bounds()
+        Product.objects.bulk_update(products, PRICE_BOUND_FIELDS, batch_size=update_batch_size)
+        updated += len(products)
+    return updated
+
+
+def _refresh_and_invalidate(product_ids):
+    refresh_price_bounds(product_ids)
+    # bulk_update skips the save signals that normally drop these caches
+    for product_id in product_ids:
+        invalidate_product_detail(product_id)
+    VersionedCache.bump_version(FACETS_NAMESPACE)
+
+
+def defer_price_bounds_refresh(product_id, using=None):
+    """
+    Recompute a product's price bounds once the transaction commits.
+
+    Every product touched in the same transaction is refreshed by a single
+    on_commit callback, so saving thirty variants costs one aggregate
+    query instead of thirty product saves. Outside a transaction the
+    refresh runs immediately.
+    """
+    defer_batch('price_bounds', _refresh_and_invalidate, product_id, using=using)
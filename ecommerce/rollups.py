@@ -0,0 +1,152 @@
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from ecommerce.deferred import defer_batch
+from ecommerce.models import Order, OrderSalesDay
+
+# Order attributes the daily rollup is broken down by
+DIMENSIONS = ('status', 'payment_status', 'payment_method', 'city', 'county')
+
+
+def rollup_date(order):
+    """
+    The rollup day an order is counted on.
+    """
+    return timezone.localdate(order.created_at)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _day_rows(dates):
+    """
+    Aggregate the orders created on ``dates`` into unsaved OrderSalesDay rows.
+    """
+    dates = set(dates)
+    orders = Order.objects.filter(
+        created_at__gte=_day_start(min(dates)),
+        created_at__lt=_day_start(max(dates) + timedelta(days=1))
+    ).annotate(
+        day=TruncDate('created_at'),
+        city=Coalesce('shipping_address__city', Value('')),
+        county=Coalesce('shipping_address__county', Value(''))
+    ).values('day', *DIMENSIONS).annotate(
+        count=Count('id'),
+        value=Sum('total')
+    ).order_by()
+
+    for row in orders:
+        if row['day'] in dates:
+            yield OrderSalesDay(
+                date=row['day'],
+                orders=row['count'],
+                total=row['value'],
+                **{name: row[name] for name in DIMENSIONS}
+            )
+
+
+def _rollup_key(row):
+    return (row.date, *(getattr(row, name) for name in DIMENSIONS))
+
+
+def _write_day_rows(dates, rows):
+    """
+    Make the stored rows of ``dates`` match ``rows``: update changed rows,
+    create missing ones and delete the ones no longer present.
+
+    Rows are upserted by key rather than the days being deleted and
+    re-inserted, so refreshes of the same day running side by side (one per
+    committed order) cannot collide on the unique key.
+    """
+    stored = {_rollup_key(row): row for row in OrderSalesDay.objects.filter(date__in=dates)}
+    for row in rows:
+        key = _rollup_key(row)
+        current = stored.pop(key, None)
+        if current is not None:
+            if (current.orders, current.total) != (row.orders, row.total):
+                OrderSalesDay.objects.filter(pk=current.pk).update(orders=row.orders, total=row.total)
+            continue
+        try:
+            with transaction.atomic():
+                row.save(force_insert=True)
+        except IntegrityError:
+            # Another refresh created the row first
+            OrderSalesDay.objects.filter(
+                date=row.date, **{name: getattr(row, name) for name in DIMENSIONS}
+            ).update(orders=row.orders, total=row.total)
+    if stored:
+        OrderSalesDay.objects.filter(pk__in=[row.pk for row in stored.values()]).delete()
+
+
+def refresh_order_rollups(dates, batch_size=31):
+    """
+    Recompute the OrderSalesDay rows of the given days from their orders:
+    one aggregate query per batch of days, then only the rows that changed
+    are written.
+
+    Returns:
+        int: Number of rows the days now have
+    """
+    dates = sorted(set(dates))
+    written = 0
+    for start in range(0, len(dates), batch_size):
+        batch = dates[start:start + batch_size]
+        rows = list(_day_rows(batch))
+        with transaction.atomic():
+            _write_day_rows(batch, rows)
+        written += len(rows)
+    return written
+
+
+def changed_order_dates(since):
+    """
+    Rollup days of the orders updated at or after ``since``.
+    """
+    orders = Order.objects.filter(updated_at__gte=since)
+    return [timezone.localdate(day) for day in orders.datetimes('created_at', 'day')]
+
+
+def rebuild_order_rollups(batch_size=31):
+    """
+    Recompute the whole rollup table, dropping days that no longer have orders.
+
+    Returns:
+        int: Number of rows written
+    """
+    dates = sorted(timezone.localdate(day) for day in Order.objects.datetimes('created_at', 'day'))
+    written = 0
+    with transaction.atomic():
+        OrderSalesDay.objects.all().delete()
+        for start in range(0, len(dates), batch_size):
+            rows = OrderSalesDay.objects.bulk_create(_day_rows(dates[start:start + batch_size]))
+            written += len(rows)
+    return written
+
+
+def defer_rollup_refresh(day, using=None):
+    """
+    Recompute a day's rollup rows once the transaction commits.
+
+    Every day touched in the same transaction is refreshed by a single
+    on_commit callback. Outside a transaction the refresh runs immediately.
+    The order is already committed by then, so a failed refresh is logged
+    rather than raised; refresh_order_rollups --days catches the day up.
+    """
+    defer_batch('order_rollups', refresh_order_rollups, day, using=using, robust=True)
+
+
+def order_sales(start=None, end=None):
+    """
+    OrderSalesDay rows between two dates (inclusive), for analytics.
+    """
+    rows = OrderSalesDay.objects.all()
+    if start is not None:
+        rows = rows.filter(date__gte=start)
+    if end is not None:
+        rows = rows.filter(date__lte=end)
+    return rows
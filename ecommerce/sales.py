@@ -0,0 +1,128 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum, Value, FloatField, DecimalField, IntegerField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ecommerce.models import Order, OrderItem, ProductSalesDay
+
+# Reference date for forward-decay weights; never change it without
+# running rebuild_sales_ranks
+DECAY_EPOCH = date(2024, 1, 1)
+
+
+def decay_weight(sale_date):
+    """
+    Forward-decay weight of a sale: 2 ** (age since epoch / half-life).
+
+    Weights grow with the sale date instead of shrinking with its age, so
+    scores never need rewriting as time passes: dividing any product's
+    total by the weight of "today" gives its exponentially decayed sales,
+    and the common divisor does not change the ranking. Floats overflow
+    after roughly 1000 half-lives, so move the epoch forward (and rebuild)
+    long before that.
+    """
+    half_life = getattr(settings, 'SALES_RANK_HALF_LIFE_DAYS', 14)
+    return 2.0 ** ((sale_date - DECAY_EPOCH).days / half_life)
+
+
+def _add_sales(product_id, sale_date, units, revenue, orders, weight):
+    increments = {
+        'units': F('units') + units,
+        'revenue': F('revenue') + revenue,
+        'orders': F('orders') + orders,
+        'weighted_units': F('weighted_units') + units * weight,
+    }
+    rows = ProductSalesDay.objects.filter(product_id=product_id, date=sale_date)
+    if rows.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            ProductSalesDay.objects.create(
+                product_id=product_id,
+                date=sale_date,
+                units=units,
+                revenue=revenue,
+                orders=orders,
+                weighted_units=units * weight
+            )
+    except IntegrityError:
+        # Another transaction created the row first
+        rows.update(**increments)
+
+
+def record_order_sales(order, sign=1):
+    """
+    Add (``sign=1``) or remove (``sign=-1``) an order's items from the
+    daily sales table. Called when an order becomes, or stops being, Paid.
+    """
+    sale_date = timezone.localdate(order.paid_at) if order.paid_at else timezone.localdate()
+    weight = decay_weight(sale_date)
+
+    lines = OrderItem.objects.filter(order=order).values('product_id').annotate(
+        units=Sum('quantity'),
+        revenue=Sum('subtotal')
+    ).order_by()
+    for line in lines:
+        _add_sales(
+            line['product_id'], sale_date,
+            sign * line['units'], sign * line['revenue'], sign, weight
+        )
+
+
+def annotate_sales(queryset, days=None, prefix='sales_days__'):
+    """
+    Annotate a Product queryset with ``units_sold``, ``sales_revenue`` and
+    the time-decayed ``sales_score``, optionally limited to the last ``days``.
+    """
+    window = Q()
+    if days:
+        window = Q(**{f'{prefix}date__gte': timezone.localdate() - timedelta(days=days)})
+    return queryset.annotate(
+        units_sold=Coalesce(Sum(f'{prefix}units', filter=window), Value(0), output_field=IntegerField()),
+        sales_revenue=Coalesce(
+            Sum(f'{prefix}revenue', filter=window),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+        sales_score=Coalesce(Sum(f'{prefix}weighted_units', filter=window), Value(0.0), output_field=FloatField()),
+    )
+
+
+def rebuild_sales_ranks(batch_size=1000):
+    """
+    Recompute the whole daily sales table from paid orders.
+    """
+    totals = {}
+    paid_orders = Order.objects.filter(payment_status='Paid').values('id', 'paid_at', 'created_at')
+    order_dates = {
+        row['id']: timezone.localdate(row['paid_at'] or row['created_at'])
+        for row in paid_orders.iterator(chunk_size=batch_size)
+    }
+    items = OrderItem.objects.filter(order__payment_status='Paid').values_list(
+        'order_id', 'product_id', 'quantity', 'subtotal'
+    )
+    for order_id, product_id, quantity, subtotal in items.iterator(chunk_size=batch_size):
+        key = (product_id, order_dates[order_id])
+        units, revenue, orders = totals.get(key, (0, Decimal('0.00'), set()))
+        orders.add(order_id)
+        totals[key] = (units + quantity, revenue + subtotal, orders)
+
+    rows = [
+        ProductSalesDay(
+            product_id=product_id,
+            date=sale_date,
+            units=units,
+            revenue=revenue,
+            orders=len(orders),
+            weighted_units=units * decay_weight(sale_date)
+        )
+        for (product_id, sale_date), (units, revenue, orders) in totals.items()
+    ]
+    with transaction.atomic():
+        ProductSalesDay.objects.all().delete()
+        ProductSalesDay.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
@@ -0,0 +1,197 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Sum, Max, Case, When, Value, IntegerField, FloatField, OuterRef, Subquery
+from django.utils.module_loading import import_string
+
+from ecommerce.models import Product, ProductSearchTerm, Brand, Category
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+# Relative importance of each product field when ranking results
+FIELD_WEIGHTS = {
+    'title': 8,
+    'brand': 4,
+    'category': 4,
+    'parent_category': 2,
+    'keywords': 1,
+}
+
+
+def tokenize(text):
+    """
+    Split text into lowercase search terms.
+    """
+    if not text:
+        return []
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text.lower())]
+
+
+class BaseSearchBackend:
+    """
+    Interface for product search backends.
+    """
+    def search(self, query, queryset=None):
+        """
+        Return ``queryset`` filtered to products matching ``query``,
+        annotated with ``search_rank`` and ordered by relevance.
+        """
+        raise NotImplementedError
+
+    def index_products(self, product_ids):
+        """
+        (Re)index the given products. Backends whose index is maintained by
+        the database can leave this as a no-op.
+        """
+
+    def rebuild(self):
+        """
+        Rebuild the whole index.
+        """
+        self.index_products(Product.objects.values_list('id', flat=True))
+
+
+class InvertedIndexSearchBackend(BaseSearchBackend):
+    """
+    Portable backend storing weighted term postings in ProductSearchTerm.
+
+    Each query term is matched by prefix against the term index, every term
+    must match, and products are ranked by the summed field weights.
+    Used for development and tests (SQLite, MySQL).
+    """
+    batch_size = 500
+
+    def _document_terms(self, product):
+        weights = {}
+        fields = {
+            'title': product.title,
+            'keywords': product.keywords,
+            'brand': product.brand.brand_title if product.brand else '',
+            'category': product.category.category_name if product.category else '',
+            'parent_category': (
+                product.category.parent_category.parent_name if product.category else ''
+            ),
+        }
+        for field, text in fields.items():
+            for term in set(tokenize(text)):
+                weights[term] = weights.get(term, 0) + FIELD_WEIGHTS[field]
+        return weights
+
+    def index_products(self, product_ids):
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), self.batch_size):
+            chunk = product_ids[start:start + self.batch_size]
+            products = Product.objects.filter(id__in=chunk).select_related(
+                'brand', 'category__parent_category'
+            )
+            postings = [
+                ProductSearchTerm(product_id=product.id, term=term, weight=weight)
+                for product in products
+                for term, weight in self._document_terms(product).items()
+            ]
+            with transaction.atomic():
+                ProductSearchTerm.objects.filter(product_id__in=chunk).delete()
+                ProductSearchTerm.objects.bulk_create(postings, batch_size=self.batch_size)
+
+    def search(self, query, queryset=None):
+        queryset = queryset if queryset is not None else Product.objects.all()
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        if not terms:
+            return queryset.none()
+
+        # One grouped query: total weight per product plus a flag per query term
+        term_flags = {
+            f'match_{index}': Max(Case(
+                When(term__startswith=term, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField()
+            ))
+            for index, term in enumerate(terms)
+        }
+        matches = ProductSearchTerm.objects.filter(
+            reduce(or_, [Q(term__startswith=term) for term in terms])
+        ).values('product_id').annotate(
+            score=Sum('weight'), **term_flags
+        ).filter(**{flag: 1 for flag in term_flags})
+
+        return queryset.filter(
+            id__in=matches.values('product_id')
+        ).annotate(
+            search_rank=Subquery(
+                matches.filter(product_id=OuterRef('pk')).values('score')[:1]
+            )
+        ).order_by('-search_rank', '-id')
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL full-text backend.
+
+    Title and keywords are matched through a weighted tsvector expression
+    backed by the ``product_search_vector_gin`` GIN index (created by the
+    0007 migration on PostgreSQL only). Brand and category names live in
+    small tables and are matched separately, then folded into the rank.
+    """
+    config = 'simple'
+
+    def search_vector(self):
+        from django.contrib.postgres.search import SearchVector
+        # Must stay in sync with the GIN index expression in the migration
+        return (
+            SearchVector('title', weight='A', config=self.config) +
+            SearchVector('keywords', weight='C', config=self.config)
+        )
+
+    def search(self, query, queryset=None):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        queryset = queryset if queryset is not None else Product.objects.all()
+        if not tokenize(query):
+            return queryset.none()
+
+        search_query = SearchQuery(query, config=self.config, search_type='websearch')
+        vector = self.search_vector()
+        brand_ids = Brand.objects.filter(brand_title__icontains=query).values('id')
+        category_ids = Category.objects.filter(
+            Q(category_name__icontains=query) |
+            Q(parent_category__parent_name__icontains=query)
+        ).values('id')
+
+        return queryset.annotate(
+            search=vector
+        ).filter(
+            Q(search=search_query) |
+            Q(brand_id__in=brand_ids) |
+            Q(category_id__in=category_ids)
+        ).annotate(
+            search_rank=SearchRank(vector, search_query) + Case(
+                When(brand_id__in=brand_ids, then=Value(0.4)),
+                default=Value(0.0),
+                output_field=FloatField()
+            ) + Case(
+                When(category_id__in=category_ids, then=Value(0.3)),
+                default=Value(0.0),
+                output_field=FloatField()
+            )
+        ).order_by('-search_rank', '-id')
+
+
+def get_search_backend():
+    """
+    Return the configured search backend.
+
+    ``PRODUCT_SEARCH_BACKEND`` may be a dotted path to a backend class;
+    by default PostgreSQL databases use full-text search and everything
+    else uses the inverted index.
+    """
+    backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return InvertedIndexSearchBackend()
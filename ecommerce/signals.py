@@ -0,0 +1,195 @@
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from ecommerce.autocomplete import autocomplete_index
+from ecommerce.cache import (
+    VersionedCache, SITE_CHROME_NAMESPACE, PRODUCT_DETAIL_NAMESPACE, invalidate_product_detail
+)
+from ecommerce.customer_stats import refresh_customer_stats
+from ecommerce.facets import FACETS_NAMESPACE
+from ecommerce.pricing import defer_price_bounds_refresh
+from ecommerce.models import (
+    AppContent, Slider, Brand, Category, ParentCategory, Product, ProductVariant, ProductImage,
+    Review, Order, CustomerStats
+)
+from ecommerce.rollups import defer_rollup_refresh, rollup_date
+from ecommerce.sales import record_order_sales
+from ecommerce.search import get_search_backend
+
+# Fields written by Product.save's second pass; they never affect search
+DERIVED_PRODUCT_FIELDS = {
+    'has_variants', 'min_variant_price', 'max_variant_price',
+    'min_selling_price', 'max_selling_price',
+}
+
+
+@receiver([post_save, post_delete], sender=AppContent)
+@receiver([post_save, post_delete], sender=Slider)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=ParentCategory)
+def invalidate_site_chrome(sender, **kwargs):
+    VersionedCache.bump_version(SITE_CHROME_NAMESPACE)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductVariant)
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=ParentCategory)
+def invalidate_facets(sender, raw=False, **kwargs):
+    if raw:
+        return
+    VersionedCache.bump_version(FACETS_NAMESPACE)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_own_product_detail(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_product_detail(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+@receiver([post_save, post_delete], sender=ProductImage)
+def invalidate_parent_product_detail(sender, instance, **kwargs):
+    invalidate_product_detail(instance.product_id)
+
+
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=ParentCategory)
+def invalidate_all_product_details(sender, **kwargs):
+    # Breadcrumbs and brand names appear on every product page
+    VersionedCache.bump_version(PRODUCT_DETAIL_NAMESPACE)
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+def refresh_variant_price_bounds(sender, instance, **kwargs):
+    defer_price_bounds_refresh(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_price_bounds(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # New products have no variants yet, and the bounds only need
+    # recomputing when a write changed the pricing they are derived from
+    if raw or created or not instance.pricing_changed:
+        return
+    if update_fields is not None and not set(update_fields) & set(Product.PRICING_FIELDS):
+        return
+    defer_price_bounds_refresh(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def refresh_rating_summary(sender, instance, **kwargs):
+    # A bare instance avoids loading a product that may be mid cascade-delete
+    Product(pk=instance.product_id).refresh_rating_summary()
+    invalidate_product_detail(instance.product_id)
+
+
+def _reindex_on_commit(product_ids):
+    transaction.on_commit(lambda: get_search_backend().index_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or update_fields and set(update_fields) <= DERIVED_PRODUCT_FIELDS:
+        return
+    _reindex_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+def reindex_brand_products(sender, instance, created, **kwargs):
+    if not created:
+        _reindex_on_commit(list(instance.product_brand.values_list('id', flat=True)))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    if not created:
+        _reindex_on_commit(list(instance.product.values_list('id', flat=True)))
+
+
+@receiver(post_save, sender=ParentCategory)
+def reindex_parent_category_products(sender, instance, created, **kwargs):
+    if not created:
+        _reindex_on_commit(list(
+            Product.objects.filter(category__parent_category=instance).values_list('id', flat=True)
+        ))
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_suggestion(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or update_fields and set(update_fields) <= DERIVED_PRODUCT_FIELDS:
+        return
+    transaction.on_commit(lambda: autocomplete_index.update_product(instance))
+
+
+@receiver(post_save, sender=Brand)
+def refresh_brand_suggestion(sender, instance, **kwargs):
+    transaction.on_commit(lambda: autocomplete_index.update_brand(instance))
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_suggestion(sender, instance, **kwargs):
+    transaction.on_commit(lambda: autocomplete_index.update_category(instance))
+
+
+@receiver(post_save, sender=ParentCategory)
+def refresh_parent_category_suggestions(sender, instance, created, **kwargs):
+    # Category suggestions include the parent name
+    if not created:
+        categories = list(instance.category_set.select_related('parent_category'))
+
+        def refresh():
+            for category in categories:
+                autocomplete_index.update_category(category)
+        transaction.on_commit(refresh)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def remove_suggestion(sender, instance, **kwargs):
+    kind, pk = sender._meta.model_name, instance.pk
+    transaction.on_commit(lambda: autocomplete_index.remove(kind, pk))
+
+
+@receiver(post_save, sender=Order)
+def record_paid_order_sales(sender, instance, **kwargs):
+    if not instance.payment_status_changed:
+        return
+    if instance.payment_status == 'Paid':
+        sign = 1
+    elif instance.was_paid:
+        # Refunded or otherwise reversed after being counted
+        sign = -1
+    else:
+        return
+    # An order created already Paid gets its items later in the same
+    # transaction, so count the lines once they are committed
+    transaction.on_commit(lambda: record_order_sales(instance, sign=sign))
+
+
+@receiver(post_save, sender=Order)
+def refresh_paid_order_customer_stats(sender, instance, **kwargs):
+    if instance.payment_status_changed and (instance.payment_status == 'Paid' or instance.was_paid):
+        refresh_customer_stats(instance.user_id)
+
+
+@receiver(post_delete, sender=Order)
+def refresh_deleted_order_customer_stats(sender, instance, **kwargs):
+    if instance.payment_status == 'Paid':
+        refresh_customer_stats(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def create_customer_stats(sender, instance, created, **kwargs):
+    if created:
+        CustomerStats.objects.get_or_create(user=instance)
+
+
+@receiver([post_save, post_delete], sender=Order)
+def refresh_order_rollup(sender, instance, **kwargs):
+    defer_rollup_refresh(rollup_date(instance))
@@ -1,3 +1,1515 @@
-from django.test import TestCase
+import base64
+import importlib
+import csv
+import re
+import io
+import zipfile
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from html import unescape
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import IntegrityError, connection
+from django.db.models import Count, FloatField, Sum, Value
+from django.http import QueryDict
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import Address
+from ecommerce.autocomplete import AutocompleteIndex, bounded_edit_distance
+from ecommerce.cache import single_flight
+from ecommerce.catalog import import_catalog
+from ecommerce.checks import check_shared_cache
+from ecommerce.customer_stats import rebuild_customer_stats
+from ecommerce.exports import stream_csv, stream_xlsx
+from ecommerce.facets import FacetIndex, get_facet_counts
+from ecommerce.idempotency import (
+    IdempotencyConflict, abandon_request, claim_request, complete_request, release_order_requests
+)
+from ecommerce.inventory import (
+    InsufficientStock, InvalidAdjustment, allocate_cart, apply_adjustments, hold_cart_item,
+    parse_adjustments, release_cart_item, release_expired_reservations, reserve_stock
+)
+from ecommerce.kpis import ALL_TIME, KpiQuery, Window, calendar_windows, period_windows
+from ecommerce.models import (
+    AppContent, Brand, Cart, CartItem, Category, CustomerStats, IdempotencyKey, Order, OrderItem,
+    OrderSalesDay, ParentCategory, Product, ProductImage, ProductSalesDay, ProductSearchTerm,
+    ProductVariant, Review, StockReservation
+)
+from ecommerce.pagination import InvalidCursor, KeysetPaginator
+from ecommerce.parallel import TASK_FAILED, TASK_NOT_STARTED, TASK_TIMED_OUT, run_parallel
+from ecommerce.rollups import rebuild_order_rollups, refresh_order_rollups
+from ecommerce.sales import DECAY_EPOCH, annotate_sales, decay_weight, rebuild_sales_ranks
+from ecommerce.search import InvertedIndexSearchBackend, PostgresSearchBackend, get_search_backend
+from ecommerce.views.services import AddressService, CartService, CommonService, OrderService, ProductService
+
+User = get_user_model()
+
+
+def make_user(email='customer@example.com'):
+    return User.objects.create_user(email=email, password='pass12345')
+
+
+def make_address(user, **fields):
+    fields.setdefault('email', user.email)
+    fields.setdefault('first_name', 'Jane')
+    fields.setdefault('last_name', 'Doe')
+    fields.setdefault('phone', '0712345678')
+    fields.setdefault('street_address', '1 Moi Avenue')
+    fields.setdefault('city', 'Nairobi')
+    fields.setdefault('county', 'Nairobi')
+    fields.setdefault('postal_code', '00100')
+    return Address.objects.create(user=user, **fields)
+
+
+def make_order(user, total=Decimal('100.00'), **fields):
+    address = fields.pop('address', None) or make_address(user)
+    return Order.objects.create(
+        user=user,
+        shipping_address=address,
+        billing_address=address,
+        subtotal=total,
+        total=total,
+        **fields
+    )
+
+
+def make_product(**fields):
+    fields.setdefault('title', 'Test product')
+    fields.setdefault('price', Decimal('100.00'))
+    fields.setdefault('description', 'Description')
+    fields.setdefault('prod_img', 'prod_images/test.jpg')
+    fields.setdefault('keywords', 'test')
+    return Product.objects.create(**fields)
+
+
+class SellingPriceTests(TestCase):
+    def test_create_without_discount(self):
+        product = Product.objects.create(
+            title='Plain', price=250, description='d', prod_img='prod_images/p.jpg', keywords='k'
+        )
+        product.refresh_from_db()
+        self.assertEqual(product.min_selling_price, Decimal('250.00'))
+        self.assertEqual(product.max_selling_price, Decimal('250.00'))
+
+    def test_discount_applied_on_save(self):
+        product = make_product(price=Decimal('200.00'), discount=Decimal('25.00'))
+        product.refresh_from_db()
+        self.assertEqual(product.min_selling_price, Decimal('150.00'))
+
+        product.discount = 10
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.min_selling_price, Decimal('180.00'))
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.factory = RequestFactory()
+
+    def post(self, data, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        request = self.factory.post('/payment/initiate/1/', data, **headers)
+        request.user = self.user
+        return request
+
+    def test_replay_returns_original_record(self):
+        record, replayed = claim_request(self.post({'phone': '0712345678'}, key='abc'), 'payment')
+        self.assertFalse(replayed)
+        complete_request(record, '/payment/waiting/1/')
+
+        again, replayed = claim_request(self.post({'phone': '0712345678'}, key='abc'), 'payment')
+        self.assertTrue(replayed)
+        self.assertEqual(again.pk, record.pk)
+        self.assertEqual(again.response_url, '/payment/waiting/1/')
+
+    def test_key_reused_for_different_request(self):
+        claim_request(self.post({'phone': '0712345678'}, key='abc'), 'payment')
+        with self.assertRaises(IdempotencyConflict):
+            claim_request(self.post({'phone': '0799999999'}, key='abc'), 'payment')
+
+    def test_abandoned_request_can_be_retried(self):
+        record, _ = claim_request(self.post({'phone': '0712345678'}, key='abc'), 'payment')
+        abandon_request(record)
+
+        retry, replayed = claim_request(self.post({'phone': '0712345678'}, key='abc'), 'payment')
+        self.assertFalse(replayed)
+        self.assertNotEqual(retry.pk, record.pk)
+
+    def test_completed_request_is_not_abandoned(self):
+        record, _ = claim_request(self.post({'phone': '0712345678'}, key='abc'), 'payment')
+        complete_request(record, '/payment/waiting/1/')
+        abandon_request(record)
+        self.assertTrue(IdempotencyKey.objects.filter(pk=record.pk).exists())
+
+    @override_settings(IDEMPOTENCY_KEY_TTL=3600, IDEMPOTENCY_FINGERPRINT_TTL=60)
+    def test_fingerprint_keys_expire_sooner(self):
+        keyed, _ = claim_request(self.post({'phone': '0712345678'}, key='abc'), 'payment')
+        unkeyed, _ = claim_request(self.post({'phone': '0712345678'}), 'payment')
+        self.assertGreater(keyed.expires_at - keyed.created_at, timedelta(minutes=59))
+        self.assertLess(unkeyed.expires_at - unkeyed.created_at, timedelta(minutes=2))
+
+    def test_expired_key_starts_a_new_request(self):
+        record, _ = claim_request(self.post({'phone': '0712345678'}), 'payment')
+        complete_request(record, '/payment/waiting/1/')
+        IdempotencyKey.objects.filter(pk=record.pk).update(expires_at=timezone.now())
+
+        retry, replayed = claim_request(self.post({'phone': '0712345678'}), 'payment')
+        self.assertFalse(replayed)
+
+    def test_released_order_can_be_paid_again(self):
+        order = make_order(self.user)
+        record, _ = claim_request(self.post({'phone': '0712345678'}), 'payment')
+        complete_request(record, '/payment/waiting/1/', order=order)
+
+        release_order_requests('payment', order)
+        retry, replayed = claim_request(self.post({'phone': '0712345678'}), 'payment')
+        self.assertFalse(replayed)
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [make_product(title=f'Product {i}', price=Decimal(100 + i % 3)) for i in range(7)]
+
+    def paginate(self, ordering, per_page=3):
+        return KeysetPaginator(Product.objects.all(), per_page, ordering=ordering)
+
+    def walk(self, ordering):
+        ids, cursor = [], None
+        while True:
+            page = self.paginate(ordering).get_page(cursor)
+            ids.extend(product.id for product in page)
+            if not page.has_next():
+                return ids
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = list(Product.objects.order_by('min_selling_price', 'id').values_list('id', flat=True))
+        self.assertEqual(self.walk('price_asc'), expected)
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('newest'), expected)
+
+    def test_previous_cursor_returns_preceding_page(self):
+        first = self.paginate('price_asc').get_page()
+        second = self.paginate('price_asc').get_page(first.next_cursor)
+        back = self.paginate('price_asc').get_page(second.previous_cursor)
+        self.assertEqual([p.id for p in back], [p.id for p in first])
+        self.assertFalse(first.has_previous())
+
+    def test_cursor_keeps_its_ordering(self):
+        first = self.paginate('price_desc').get_page()
+        paginator = self.paginate(None)
+        paginator.get_page(first.next_cursor)
+        self.assertEqual(paginator.ordering_name, 'price_desc')
+
+    def test_undecodable_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            self.paginate('newest').get_page('not-a-cursor')
+
+    def test_tampered_cursor_values(self):
+        paginator = self.paginate('newest')
+        for values in (['yesterday', 1], [None, 1], {'a': 1}, ['2024-01-01T00:00:00+03:00', 'x']):
+            with self.subTest(values=values), self.assertRaises(InvalidCursor):
+                paginator.get_page(paginator.encode_cursor(values))
+
+    def test_page_links_keep_the_query_string(self):
+        first = self.paginate('price_asc').get_page()
+        second = self.paginate('price_asc').get_page(first.next_cursor)
+        request = RequestFactory().get('/search/', {'q': 'phone & case', 'brand': ['a', 'b'], 'cursor': 'old'})
+        html = render_to_string('includes/pagination.html', {'products': second}, request=request)
+        links = [unescape(link) for link in re.findall(r'href="([^"]*)"', html)]
+        self.assertEqual(len(links), 2)
+        for link, cursor in zip(links, (second.previous_cursor, second.next_cursor)):
+            query = QueryDict(link.lstrip('?'))
+            self.assertEqual(query['q'], 'phone & case')
+            self.assertEqual(query.getlist('brand'), ['a', 'b'])
+            self.assertEqual(query.getlist('cursor'), [cursor])
+
+        numbered = Paginator(Product.objects.order_by('id'), 3).get_page(2)
+        html = render_to_string('includes/pagination.html', {'products': numbered}, request=request)
+        for link in re.findall(r'href="([^"]*)"', html):
+            query = QueryDict(unescape(link).lstrip('?'))
+            self.assertEqual(query['q'], 'phone & case')
+            self.assertNotIn('cursor', query)
+            self.assertIn(query['page'], {'1', '2', '3'})
+
+    def test_api_rejects_invalid_cursor(self):
+        response = APIClient().get('/api/ecommerce/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_relevance_requires_search_rank(self):
+        paginator = self.paginate('relevance')
+        self.assertEqual(paginator.ordering_name, KeysetPaginator.DEFAULT_ORDERING)
+        self.assertEqual(len(paginator.get_page()), 3)
+
+        forged = base64.urlsafe_b64encode(b'{"v": [1.0, 1], "r": false, "o": "relevance"}').decode()
+        with self.assertRaises(InvalidCursor):
+            self.paginate('newest').get_page(forged)
+
+    def test_relevance_for_search_results(self):
+        ranked = Product.objects.annotate(search_rank=Value(1.0, output_field=FloatField()))
+        paginator = KeysetPaginator(ranked, 3, ordering='relevance')
+        self.assertEqual(paginator.ordering_name, 'relevance')
+        first = paginator.get_page()
+        second = KeysetPaginator(ranked, 3).get_page(first.next_cursor)
+        self.assertEqual(len({p.id for p in first} | {p.id for p in second}), 6)
+
+    def test_api_relevance_without_search(self):
+        response = APIClient().get('/api/ecommerce/products/', {'cursor': '', 'ordering': 'relevance'})
+        self.assertEqual(response.status_code, 200)
+
+
+class CatalogImportTests(TestCase):
+    RECORDS = [
+        {'type': 'parent_category', 'name': 'Men'},
+        {'type': 'category', 'name': 'Shirts', 'parent_category': 'Men'},
+        {'type': 'brand', 'name': 'Acme'},
+        {'type': 'product', 'ref': 'p1', 'title': 'Oxford', 'category': 'shirts-for-men',
+         'brand': 'Acme', 'price': '1000', 'discount': '10'},
+        {'type': 'variant', 'product': 'p1', 'size': 'M', 'color': 'Blue', 'stock': 3, 'variant_price': '1200'},
+        {'type': 'variant', 'product': 'p1', 'size': 'L', 'color': 'Blue', 'stock': 2, 'variant_price': '1500'},
+        {'type': 'image', 'product': 'p1', 'image': 'product_images/oxford.jpg'},
+        {'type': 'product', 'ref': 'p2', 'title': 'Polo', 'price': '500'},
+    ]
+
+    def run_import(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = import_catalog(enumerate(self.RECORDS, start=1), batch_size=2)
+        self.assertEqual(counts['product'], 2)
+        self.assertEqual(counts['variant'], 2)
+        self.assertEqual(counts['image'], 1)
+
+        oxford = Product.objects.get(title='Oxford')
+        self.assertEqual(oxford.variants.count(), 2)
+        self.assertEqual(oxford.images.count(), 1)
+        self.assertTrue(oxford.has_variants)
+        self.assertEqual(oxford.min_selling_price, Decimal('1080.00'))
+        self.assertEqual(oxford.max_selling_price, Decimal('1350.00'))
+
+    def test_import(self):
+        self.run_import()
+
+    def test_import_without_bulk_insert_ids(self):
+        # As on MySQL, whose bulk INSERT does not return the new ids
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert',
+            new_callable=mock.PropertyMock, return_value=False
+        ), mock.patch('ecommerce.signals._reindex_on_commit') as reindex, \
+                mock.patch('ecommerce.signals.invalidate_product_detail') as invalidate:
+            self.run_import()
+        # Per-product receivers stand down; the import publishes once
+        reindex.assert_not_called()
+        invalidate.assert_not_called()
+        self.assertTrue(ProductSearchTerm.objects.filter(product__title='Polo', term='polo').exists())
+
+
+class PriceBoundsTests(TestCase):
+    def setUp(self):
+        self.product = make_product(price=Decimal('1000.00'), discount=Decimal('10.00'))
+
+    def add_variant(self, price, size='M'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProductVariant.objects.create(product=self.product, size=size, stock=1, variant_price=price)
+
+    def test_variants_set_bounds(self):
+        self.add_variant(Decimal('1200.00'))
+        self.add_variant(Decimal('1500.00'), size='L')
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.has_variants)
+        self.assertEqual(self.product.min_variant_price, Decimal('1200.00'))
+        self.assertEqual(self.product.max_variant_price, Decimal('1500.00'))
+        self.assertEqual(self.product.min_selling_price, Decimal('1080.00'))
+        self.assertEqual(self.product.max_selling_price, Decimal('1350.00'))
+
+    def test_deleting_last_variant_clears_bounds(self):
+        variant = self.add_variant(Decimal('1200.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.delete()
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.has_variants)
+        self.assertIsNone(self.product.min_variant_price)
+        self.assertIsNone(self.product.max_variant_price)
+        self.assertEqual(self.product.min_selling_price, Decimal('900.00'))
+        self.assertEqual(self.product.display_price, 'Ksh 900.00')
+
+    def test_discount_change_uses_current_variant_bounds(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.add_variant(Decimal('2000.00'))
+        stale.discount = Decimal('50.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.min_selling_price, Decimal('1000.00'))
+
+    def test_saves_without_pricing_changes_skip_refresh(self):
+        self.add_variant(Decimal('1200.00'))
+        product = Product.objects.get(pk=self.product.pk)
+        product.title = 'Renamed'
+        with mock.patch('ecommerce.signals.defer_price_bounds_refresh') as defer:
+            product.save()
+            product.discount = Decimal('20.00')
+            product.save(update_fields=['title'])
+        defer.assert_not_called()
+
+        product.refresh_from_db()
+        self.assertEqual(product.discount, Decimal('10.00'))
+        self.assertEqual(product.min_selling_price, Decimal('1080.00'))
+
+    def test_stale_instance_does_not_overwrite_bounds(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.add_variant(Decimal('1200.00'))
+        stale.title = 'Renamed'
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.title, 'Renamed')
+        self.assertEqual(self.product.min_selling_price, Decimal('1080.00'))
+
+
+class OrderRollupTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.address = make_address(self.user)
+        self.today = timezone.localdate()
+
+    def place(self, total, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_order(self.user, total=Decimal(total), address=self.address, **fields)
+
+    def rows(self):
+        return {
+            (row.status, row.payment_status): (row.orders, row.total)
+            for row in OrderSalesDay.objects.filter(date=self.today)
+        }
+
+    def test_orders_are_rolled_up_per_day(self):
+        self.place('100.00')
+        self.place('50.00')
+        paid = self.place('70.00', payment_status='Paid')
+        self.assertEqual(self.rows(), {
+            ('Pending', 'Pending'): (2, Decimal('150.00')),
+            ('Pending', 'Paid'): (1, Decimal('70.00')),
+        })
+        row = OrderSalesDay.objects.get(date=self.today, payment_status='Paid')
+        self.assertEqual((row.city, row.county, row.payment_method), ('Nairobi', 'Nairobi', ''))
+
+        paid.payment_status = 'Refunded'
+        with self.captureOnCommitCallbacks(execute=True):
+            paid.save()
+        self.assertEqual(self.rows(), {
+            ('Pending', 'Pending'): (2, Decimal('150.00')),
+            ('Pending', 'Refunded'): (1, Decimal('70.00')),
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            paid.delete()
+        self.assertEqual(self.rows(), {('Pending', 'Pending'): (2, Decimal('150.00'))})
+
+    def test_refresh_tolerates_rows_created_concurrently(self):
+        self.place('100.00')
+        OrderSalesDay.objects.all().update(orders=5, total=Decimal('1.00'))
+
+        # The row appears after this refresh read the day's stored rows
+        real_filter = OrderSalesDay.objects.filter
+        calls = []
+
+        def filter_(*args, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                return OrderSalesDay.objects.none()
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(OrderSalesDay.objects, 'filter', side_effect=filter_):
+            refresh_order_rollups([self.today])
+        self.assertEqual(self.rows(), {('Pending', 'Pending'): (1, Decimal('100.00'))})
+
+    def test_rebuild_matches_incremental_rows(self):
+        self.place('100.00')
+        self.place('30.00', payment_status='Paid')
+        incremental = self.rows()
+        OrderSalesDay.objects.create(date=self.today - timedelta(days=3), status='Pending', payment_status='Paid')
+
+        rebuild_order_rollups()
+        self.assertEqual(self.rows(), incremental)
+        self.assertEqual(OrderSalesDay.objects.count(), 2)
+
+    def test_failed_refresh_does_not_fail_the_commit(self):
+        with mock.patch('ecommerce.rollups.refresh_order_rollups', side_effect=RuntimeError), \
+                self.assertLogs('django', 'ERROR'):
+            self.place('100.00')
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class KpiQueryTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+
+    def day(self, days_ago, orders, total, **fields):
+        fields.setdefault('status', 'Pending')
+        fields.setdefault('payment_status', 'Paid')
+        return OrderSalesDay.objects.create(
+            date=self.today - timedelta(days=days_ago), orders=orders, total=Decimal(total), **fields
+        )
+
+    def test_weeks_start_on_monday(self):
+        for today in (date(2025, 1, 13), date(2025, 1, 15), date(2025, 1, 19)):
+            windows = calendar_windows(today)
+            self.assertEqual(windows['this_week'], Window(date(2025, 1, 13), today))
+            self.assertEqual(windows['last_week'], Window(date(2025, 1, 6), date(2025, 1, 12)))
+        self.assertEqual(calendar_windows(date(2025, 1, 15))['today'], Window(date(2025, 1, 15), date(2025, 1, 15)))
+
+    def test_last_month_rolls_over_the_year(self):
+        windows = calendar_windows(date(2025, 1, 1))
+        self.assertEqual(windows['this_month'], Window(date(2025, 1, 1), date(2025, 1, 1)))
+        self.assertEqual(windows['last_month'], Window(date(2024, 12, 1), date(2024, 12, 31)))
+        self.assertEqual(calendar_windows(date(2024, 3, 31))['last_month'], Window(date(2024, 2, 1), date(2024, 2, 29)))
+
+    def test_period_windows_match_length(self):
+        start = timezone.make_aware(datetime(2025, 3, 1, 9, 30))
+        current, previous = period_windows(start, start + timedelta(days=9, hours=5))
+        self.assertEqual(current, Window(date(2025, 3, 1), date(2025, 3, 10)))
+        self.assertEqual(previous, Window(date(2025, 2, 19), date(2025, 2, 28)))
+
+    def test_rows_are_narrowed_to_the_span(self):
+        week = Window(self.today - timedelta(days=6), self.today)
+        older = Window(self.today - timedelta(days=20), self.today - timedelta(days=14))
+        kpis = KpiQuery(OrderSalesDay.objects.all()).add('week', Sum, 'orders', week).add(
+            'older', Sum, 'orders', older
+        )
+        self.assertEqual(kpis.span(), Window(older.start, week.end))
+
+        self.day(2, 3, '30.00')
+        self.day(15, 4, '40.00')
+        self.day(40, 5, '50.00')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(kpis.evaluate(), {'week': 3, 'older': 4})
+        self.assertIn(str(older.start), queries.captured_queries[0]['sql'])
+
+        kpis.add('ever', Sum, 'orders')
+        self.assertEqual(kpis.span(), ALL_TIME)
+        self.assertEqual(kpis.evaluate()['ever'], 12)
+
+    def test_null_aggregates_use_defaults(self):
+        self.day(1, 2, '20.00', payment_status='Pending')
+        figures = KpiQuery(OrderSalesDay.objects.all()).add(
+            'orders', Sum, 'orders', payment_status='Paid'
+        ).add(
+            'revenue', Sum, 'total', default=Decimal('0'), payment_status='Paid'
+        ).add(
+            'rows', Count, 'id', payment_status='Paid'
+        ).add(
+            'pending', Sum, 'total', payment_status='Pending'
+        ).evaluate()
+        self.assertEqual(figures, {'orders': 0, 'revenue': Decimal('0'), 'rows': 0, 'pending': Decimal('20.00')})
+        self.assertEqual(KpiQuery(OrderSalesDay.objects.all()).evaluate(), {})
+
+    def test_dashboard_stats_read_the_rollup_once(self):
+        self.day(0, 2, '200.00')
+        self.day(0, 1, '50.00', status='Processing', payment_status='Failed')
+        self.day(400, 3, '300.00', payment_status='Pending')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(email='admin@example.com', password='pass12345'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/analytics/dashboard-stats/')
+        self.assertEqual(response.status_code, 200)
+        rollup_queries = [query for query in queries.captured_queries
+                          if 'ecommerce_ordersalesday' in query['sql']]
+        self.assertEqual(len(rollup_queries), 1)
+        self.assertEqual(response.data['today'], {'orders': 3, 'revenue': 200.0})
+        self.assertEqual(response.data['pending_orders'], 5)
+        self.assertEqual(response.data['processing_orders'], 1)
+        self.assertEqual(response.data['failed_payments'], 1)
+        self.assertEqual(response.data['conversion_rate'], round(2 / 6 * 100, 2))
+
+
+class FacetIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.split = make_product(title='Split')
+        self.exact = make_product(title='Exact', price=Decimal('2000.00'))
+        ProductVariant.objects.create(product=self.split, color='Red', size='S')
+        ProductVariant.objects.create(product=self.split, color='Blue', size='M')
+        ProductVariant.objects.create(product=self.exact, color='red', size='m')
+
+    def test_color_and_size_counts_match_filter(self):
+        page, _, context = ProductService.filter_products(colors=['red'], sizes=['M'])
+        self.assertEqual(list(page), [self.exact])
+
+        result = get_facet_counts(colors=['red'], sizes=['M'])
+        self.assertEqual(result['total'], 1)
+        colors = {entry['value']: entry['count'] for entry in result['facets']['color']}
+        sizes = {entry['value']: entry['count'] for entry in result['facets']['size']}
+        # Colors available in size M, and sizes available in red
+        self.assertEqual(colors, {'red': 1, 'blue': 1})
+        self.assertEqual(sizes, {'S': 1, 'M': 1})
+        self.assertEqual(context['facets'], result['facets'])
+
+    def test_category_name_counts_match_filter(self):
+        parent = ParentCategory.objects.create(parent_name='Footwear')
+        category = Category.objects.create(category_name='Running Shoes', parent_category=parent)
+        Product.objects.filter(pk=self.exact.pk).update(category=category)
+        cache.clear()
+
+        for value in (category.slug, 'Running Shoes', 'running shoes'):
+            with self.subTest(category=value):
+                page, _, context = ProductService.filter_products(category_slug=value)
+                self.assertEqual(list(page), [self.exact])
+                result = get_facet_counts(category=value)
+                self.assertEqual(result['total'], 1)
+                self.assertEqual(context['facets'], result['facets'])
+                self.assertEqual(
+                    [(entry['value'], entry['count']) for entry in result['facets']['category']],
+                    [(category.slug, 1)]
+                )
+        self.assertEqual(get_facet_counts(category='Walking Shoes')['total'], 0)
+
+    def test_price_mask_matches_overlapping_ranges(self):
+        index = FacetIndex.build()
+        for low, high in [(None, Decimal('100')), (Decimal('101'), None),
+                          (Decimal('150'), Decimal('1999')), (Decimal('100'), Decimal('2000'))]:
+            expected = {
+                index.product_ids[position]
+                for position, (min_price, max_price) in enumerate(index.prices)
+                if (low is None or max_price >= low) and (high is None or min_price <= high)
+            }
+            mask = index._price_mask(low, high)
+            self.assertEqual(
+                {index.product_ids[position] for position in index._set_positions(mask)},
+                expected
+            )
+
+        result = get_facet_counts(min_price='150')
+        self.assertEqual(result['total'], 1)
+        self.assertEqual(result['price_range'], {
+            'min_price': Decimal('2000.00'), 'max_price': Decimal('2000.00')
+        })
+
+
+@override_settings(DASHBOARD_WORKERS=1)
+class RunParallelTests(TestCase):
+    def setUp(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        patcher = mock.patch('ecommerce.parallel._executor', executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_queued_task_gets_its_own_deadline(self):
+        with self.assertLogs('ecommerce.parallel', 'WARNING'):
+            results, errors = run_parallel(
+                {'slow': lambda: time.sleep(0.3), 'quick': lambda: 'done'},
+                timeout=1, timeouts={'slow': 0.05}
+            )
+        self.assertEqual(errors, {'slow': TASK_TIMED_OUT})
+        self.assertEqual(results, {'quick': 'done'})
+
+    def test_task_never_started_is_cancelled(self):
+        ran = []
+        with self.assertLogs('ecommerce.parallel', 'WARNING'):
+            results, errors = run_parallel(
+                {'slow': lambda: time.sleep(0.3), 'queued': lambda: ran.append(True)},
+                timeout=0.05, queue_timeout=0.05
+            )
+        time.sleep(0.35)
+        self.assertEqual(results, {})
+        self.assertEqual(errors, {'slow': TASK_TIMED_OUT, 'queued': TASK_NOT_STARTED})
+        self.assertEqual(ran, [])
+
+    def test_failure_message_hides_exception(self):
+        def fail():
+            raise RuntimeError('password=secret')
+
+        with self.assertLogs('ecommerce.parallel', 'ERROR'):
+            results, errors = run_parallel({'broken': fail}, timeout=1)
+        self.assertEqual(results, {})
+        self.assertEqual(errors, {'broken': TASK_FAILED})
+
+
+# The database cache would need a connection per thread, which TestCase's
+# transaction cannot share; locmem is shared by every thread of the process
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'single-flight-tests'
+}})
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, value='fresh', delay=0):
+        def compute_():
+            self.calls.append(value)
+            time.sleep(delay)
+            return value
+        return compute_
+
+    def test_concurrent_misses_compute_once(self):
+        callers = 6
+        barrier = threading.Barrier(callers)
+
+        def call():
+            barrier.wait()
+            return single_flight('key', self.compute(delay=0.2), timeout=60, poll_interval=0.01)
+
+        with ThreadPoolExecutor(max_workers=callers) as executor:
+            results = list(executor.map(lambda _: call(), range(callers)))
+        self.assertEqual(results, ['fresh'] * callers)
+        self.assertEqual(self.calls, ['fresh'])
+        self.assertIsNone(cache.get('key:lock'))
+
+    def test_fresh_value_skips_compute(self):
+        single_flight('key', self.compute('first'), timeout=60)
+        self.assertEqual(single_flight('key', self.compute('second'), timeout=60), 'first')
+        self.assertEqual(self.calls, ['first'])
+
+    def test_stale_value_served_while_another_refreshes(self):
+        cache.set('key', ('stale', time.time() - 1), 60)
+        cache.add('key:lock', True)
+        self.assertEqual(single_flight('key', self.compute(), timeout=60), 'stale')
+        self.assertEqual(self.calls, [])
+
+        cache.delete('key:lock')
+        self.assertEqual(single_flight('key', self.compute(), timeout=60), 'fresh')
+        self.assertEqual(cache.get('key')[0], 'fresh')
+
+    def test_waiter_computes_when_holder_never_finishes(self):
+        cache.add('key:lock', True)
+        self.assertEqual(single_flight('key', self.compute(), timeout=60, wait=0.05, poll_interval=0.01), 'fresh')
+        # The abandoned lock is left for its holder's lock_timeout
+        self.assertTrue(cache.get('key:lock'))
+
+    def test_failed_compute_releases_lock(self):
+        def fail():
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            single_flight('key', fail, timeout=60)
+        self.assertIsNone(cache.get('key:lock'))
+        self.assertEqual(single_flight('key', self.compute(), timeout=60), 'fresh')
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        for title in ('Running shoes', 'Rugby ball', 'Runner socks', 'Rain jacket', 'Radio'):
+            make_product(title=title)
+        Brand.objects.create(brand_title='Marks & Spencer')
+        self.index = AutocompleteIndex()
+        self.index.build()
+
+    def test_brand_url_is_encoded(self):
+        suggestion = self.index.suggest('marks')[0]
+        self.assertEqual(suggestion['type'], 'brand')
+        self.assertTrue(suggestion['url'].endswith('?query=Marks+%26+Spencer'))
+
+    def test_fuzzy_words_match_full_scan(self):
+        words = {term for term, _ in self.index._entries if ' ' not in term}
+        for query in ('rnning', 'runer', 'rugbi', 'ra', 'radoi', 'sokcs', 'x'):
+            max_distance = AutocompleteIndex._max_distance(query)
+            expected = {
+                (bounded_edit_distance(query, word[:len(query)], max_distance), word[:len(query)])
+                for word in words if word[0] == query[0]
+            }
+            expected = sorted(entry for entry in expected if entry[0] <= max_distance)
+            self.assertEqual(self.index._fuzzy_words(query, max_distance), expected, query)
+
+    def test_misspelled_prefix_suggests_product(self):
+        titles = [suggestion['text'] for suggestion in self.index.suggest('rnning')]
+        self.assertIn('Running shoes', titles)
+
+    def test_removal_prunes_trie_words(self):
+        radio = Product.objects.get(title='Radio')
+        self.index.remove('product', radio.id)
+        self.assertEqual(self.index._fuzzy_words('radoi', 2), [])
+        self.assertNotIn('d', self.index._trie['r']['a'])
+        # Words other suggestions still use stay
+        self.assertTrue(self.index._fuzzy_words('rain', 1))
+
+    @override_settings(AUTOCOMPLETE_REFRESH_INTERVAL=0)
+    def test_other_process_changes_trigger_rebuild(self):
+        # Changes made elsewhere without touching this process's cache version
+        Product.objects.filter(title='Radio').update(title='Walkman', updated_at=timezone.now())
+        titles = [suggestion['text'] for suggestion in self.index.suggest('walk')]
+        self.assertEqual(titles, ['Walkman'])
+
+        Product.objects.filter(title='Walkman').delete()
+        self.assertEqual(self.index.suggest('walk'), [])
+
+
+class CustomerStatsTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.address = make_address(self.user)
+
+    def stats(self):
+        return CustomerStats.objects.get(user=self.user)
+
+    def test_row_created_with_user(self):
+        stats = self.stats()
+        self.assertEqual(stats.paid_orders, 0)
+        self.assertEqual(stats.total_spent, Decimal('0.00'))
+        self.assertEqual(stats.tier, 'Bronze')
+
+    def test_paid_orders_update_stats(self):
+        first = make_order(self.user, Decimal('6000.00'), address=self.address, payment_status='Paid')
+        make_order(self.user, Decimal('9000.00'), address=self.address)
+        stats = self.stats()
+        self.assertEqual((stats.paid_orders, stats.total_spent), (1, Decimal('6000.00')))
+        self.assertEqual(stats.tier, 'Silver')
+        self.assertEqual(stats.first_order_at, first.created_at)
+
+        second = Order.objects.get(total=Decimal('9000.00'))
+        second.payment_status = 'Paid'
+        second.save()
+        stats = self.stats()
+        self.assertEqual((stats.paid_orders, stats.total_spent), (2, Decimal('15000.00')))
+        self.assertEqual(stats.tier, 'Gold')
+
+    def test_unpaid_and_deleted_orders_leave_totals(self):
+        order = make_order(self.user, Decimal('12000.00'), address=self.address, payment_status='Paid')
+        order = Order.objects.get(pk=order.pk)
+        order.payment_status = 'Refunded'
+        order.save()
+        self.assertEqual(self.stats().paid_orders, 0)
+        self.assertEqual(self.stats().tier, 'Bronze')
+
+        paid = make_order(self.user, Decimal('500.00'), address=self.address, payment_status='Paid')
+        paid.delete()
+        self.assertEqual(self.stats().total_spent, Decimal('0.00'))
+
+    def test_unrelated_save_skips_refresh(self):
+        order = make_order(self.user, address=self.address, payment_status='Paid')
+        order = Order.objects.get(pk=order.pk)
+        with mock.patch('ecommerce.signals.refresh_customer_stats') as refresh:
+            order.tracking_number = 'TRK1'
+            order.save()
+        refresh.assert_not_called()
+
+    def test_rebuild_matches_incremental(self):
+        make_order(self.user, Decimal('40000.00'), address=self.address, payment_status='Paid')
+        make_user('idle@example.com')
+        CustomerStats.objects.all().delete()
+
+        self.assertEqual(rebuild_customer_stats(), 2)
+        stats = self.stats()
+        self.assertEqual((stats.paid_orders, stats.total_spent), (1, Decimal('40000.00')))
+        self.assertTrue(stats.is_vip)
+
+
+class SalesRankTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.address = make_address(self.user)
+        self.phone = make_product(title='Phone')
+        self.case = make_product(title='Case', price=Decimal('10.00'))
+
+    def paid_order(self, lines, paid_at=None):
+        # Mirrors checkout: the order row is saved before its items
+        with self.captureOnCommitCallbacks(execute=True):
+            order = make_order(
+                self.user, address=self.address, payment_status='Paid',
+                paid_at=paid_at or timezone.now()
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, product=product, quantity=quantity,
+                    unit_price=product.price, subtotal=product.price * quantity,
+                    product_name=product.title
+                )
+                for product, quantity in lines
+            ])
+        return order
+
+    def sales(self, product):
+        return ProductSalesDay.objects.get(product=product)
+
+    def test_order_created_paid_records_items(self):
+        order = self.paid_order([(self.phone, 2), (self.case, 1), (self.case, 3)])
+        phone, case = self.sales(self.phone), self.sales(self.case)
+        self.assertEqual(phone.date, timezone.localdate(order.paid_at))
+        self.assertEqual((phone.units, phone.revenue, phone.orders), (2, Decimal('200.00'), 1))
+        self.assertEqual((case.units, case.revenue, case.orders), (4, Decimal('40.00'), 1))
+        self.assertEqual(case.weighted_units, 4 * decay_weight(case.date))
+
+    def test_order_paid_later_records_once(self):
+        order = make_order(self.user, address=self.address)
+        OrderItem.objects.create(
+            order=order, product=self.phone, quantity=1, unit_price=Decimal('100.00'),
+            subtotal=Decimal('100.00'), product_name='Phone'
+        )
+        self.assertFalse(ProductSalesDay.objects.exists())
+
+        order = Order.objects.get(pk=order.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.payment_status = 'Paid'
+            order.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.tracking_number = 'TRK1'
+            order.save()
+        self.assertEqual(self.sales(self.phone).units, 1)
+
+    def test_refund_reverses_sales(self):
+        order = Order.objects.get(pk=self.paid_order([(self.phone, 2)]).pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.payment_status = 'Refunded'
+            order.save()
+        sales = self.sales(self.phone)
+        self.assertEqual((sales.units, sales.revenue, sales.orders), (0, Decimal('0.00'), 0))
+        self.assertEqual(sales.weighted_units, 0)
+
+    def test_decay_score_favours_recent_sales(self):
+        half_life = settings.SALES_RANK_HALF_LIFE_DAYS
+        later = DECAY_EPOCH + timedelta(days=half_life)
+        self.assertEqual(decay_weight(DECAY_EPOCH), 1.0)
+        self.assertAlmostEqual(decay_weight(later), 2.0)
+
+        now = timezone.now()
+        self.paid_order([(self.case, 3)], paid_at=now - timedelta(days=4 * half_life))
+        self.paid_order([(self.phone, 1)], paid_at=now)
+        ranked = annotate_sales(Product.objects.all())
+        self.assertEqual(list(ranked.order_by('-units_sold')), [self.case, self.phone])
+        self.assertEqual(list(ranked.order_by('-sales_score')), [self.phone, self.case])
+
+        recent = {product.pk: product.units_sold for product in annotate_sales(Product.objects.all(), days=7)}
+        self.assertEqual(recent, {self.phone.pk: 1, self.case.pk: 0})
+
+    def test_rebuild_matches_incremental(self):
+        self.paid_order([(self.phone, 2), (self.case, 1)])
+        self.paid_order([(self.phone, 1)], paid_at=timezone.now() - timedelta(days=3))
+        refunded = Order.objects.get(pk=self.paid_order([(self.case, 5)]).pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            refunded.payment_status = 'Refunded'
+            refunded.save()
+        fields = ('product_id', 'date', 'units', 'revenue', 'orders')
+        incremental = set(ProductSalesDay.objects.filter(units__gt=0).values_list(*fields))
+        scores = dict(annotate_sales(Product.objects.all()).values_list('pk', 'sales_score'))
+
+        self.assertEqual(rebuild_sales_ranks(), 3)
+        self.assertEqual(set(ProductSalesDay.objects.values_list(*fields)), incremental)
+        rebuilt = dict(annotate_sales(Product.objects.all()).values_list('pk', 'sales_score'))
+        for pk, score in scores.items():
+            self.assertAlmostEqual(rebuilt[pk] / score, 1.0)
+
+
+class ExportTests(TestCase):
+    HEADER = ['Name', 'Total', 'Paid', 'Date']
+    ROWS = [
+        ['Jane, "JD" Doe', Decimal('10.50'), True, datetime(2026, 1, 2, 3, 4)],
+        ['Tom & <Jerry>\x01', 3, False, None],
+    ]
+    SHEET_NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+    def read_sheet(self, content):
+        with zipfile.ZipFile(io.BytesIO(content)) as workbook:
+            self.assertIsNone(workbook.testzip())
+            root = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+        rows = []
+        for row in root.iterfind('s:sheetData/s:row', self.SHEET_NS):
+            rows.append([
+                cell.findtext('s:v', namespaces=self.SHEET_NS)
+                or cell.findtext('s:is/s:t', namespaces=self.SHEET_NS)
+                for cell in row
+            ])
+        return rows
+
+    def test_csv_chunks_rows(self):
+        chunks = list(stream_csv(self.HEADER, self.ROWS * 3, flush_every=2))
+        self.assertEqual(len(chunks), 4)
+        rows = list(csv.reader(io.StringIO(''.join(chunks))))
+        self.assertEqual(rows[0], self.HEADER)
+        self.assertEqual(rows[1], ['Jane, "JD" Doe', '10.50', 'True', '2026-01-02 03:04'])
+        self.assertEqual(rows[2], ['Tom & <Jerry>\x01', '3', 'False', ''])
+        self.assertEqual(len(rows), 7)
+
+    def test_xlsx_is_valid_workbook(self):
+        content = b''.join(stream_xlsx(self.HEADER, self.ROWS, sheet_name='Orders & more', flush_every=1))
+        self.assertEqual(self.read_sheet(content), [
+            self.HEADER,
+            ['Jane, "JD" Doe', '10.50', '1', '2026-01-02 03:04'],
+            ['Tom & <Jerry>', '3', '0', ''],
+        ])
+        with zipfile.ZipFile(io.BytesIO(content)) as workbook:
+            self.assertIn(b'name="Orders &amp; more"', workbook.read('xl/workbook.xml'))
+
+    def test_order_export_endpoints(self):
+        user = make_user()
+        make_order(user, Decimal('250.00'))
+        admin = User.objects.create_superuser(email='admin@example.com', password='pass12345')
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        response = client.get('/api/orders/export-csv/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders_export.csv"')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][6:8], ['250.00', '0'])
+
+        response = client.get('/api/orders/export-excel/')
+        self.assertEqual(response.status_code, 200)
+        sheet = self.read_sheet(b''.join(response.streaming_content))
+        self.assertEqual(sheet[1][3], user.email)
+
+    def test_customer_export_endpoint(self):
+        user = make_user()
+        user.first_name = 'Jane'
+        user.save()
+        make_order(user, Decimal('250.00'), payment_status='Paid')
+        make_user('new@example.com')
+        admin = User.objects.create_superuser(email='admin@example.com', password='pass12345')
+        client = APIClient()
+
+        self.assertIn(client.get('/api/accounts/customers/export/').status_code, (401, 403))
+        client.force_authenticate(user)
+        self.assertEqual(client.get('/api/accounts/customers/export/').status_code, 403)
+
+        client.force_authenticate(admin)
+        response = client.get('/api/accounts/customers/export/', {'search': 'example.com', 'ordering': 'email'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="customers.csv"')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], [
+            'ID', 'Email', 'First Name', 'Last Name', 'Phone',
+            'Status', 'Join Date', 'Total Orders', 'Total Spent', 'Tier'
+        ])
+        self.assertEqual([row[1] for row in rows[1:]], ['admin@example.com', user.email, 'new@example.com'])
+        self.assertEqual(rows[2][:4], [str(user.pk), user.email, 'Jane', ''])
+        self.assertEqual(rows[2][5:8], ['Active', timezone.localdate(user.date_joined).strftime('%Y-%m-%d'), '1'])
+        # SQLite drops trailing zeros from computed decimals
+        self.assertEqual(Decimal(rows[2][8]), Decimal('250.00'))
+        self.assertEqual(rows[2][9], 'Bronze')
+        self.assertEqual(rows[3][7], '0')
+        self.assertEqual(Decimal(rows[3][8]), 0)
+
+
+class SiteChromeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.app = AppContent.objects.create(
+            title='Shop', logo='app_logos/l.png', banner='banners/b.png',
+            tel_no='0712345678', email='shop@example.com'
+        )
+        self.parent = ParentCategory.objects.create(parent_name='Phones')
+        Category.objects.create(category_name='Smartphones', parent_category=self.parent)
+
+    def test_default_cache_is_shared(self):
+        self.assertEqual(
+            settings.CACHES['default']['BACKEND'], 'django.core.cache.backends.db.DatabaseCache'
+        )
+        self.assertEqual(check_shared_cache(None), [])
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem, DEBUG=False):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['ecommerce.E001'])
+
+    def test_cached_until_content_changes(self):
+        chrome = CommonService.get_site_chrome()
+        self.assertEqual(chrome['app_data'], self.app)
+        with CaptureQueriesContext(connection) as queries:
+            chrome = CommonService.get_site_chrome()
+            self.assertEqual(chrome['categories'][0].parent_category, self.parent)
+        # Only the shared cache table is read
+        self.assertTrue(queries.captured_queries)
+        self.assertTrue(all('"ecommerce_cache"' in query['sql'] for query in queries.captured_queries))
+
+        self.app.title = 'New shop'
+        self.app.save()
+        self.assertEqual(CommonService.get_site_chrome()['app_data'].title, 'New shop')
+
+        Category.objects.create(category_name='Tablets', parent_category=self.parent)
+        self.assertEqual(len(CommonService.get_site_chrome()['categories']), 2)
+
+
+class ProductDetailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = make_product(has_variants=True, price=Decimal('500.00'))
+
+    def post_review(self, rating):
+        return self.client.post(reverse('add_review', args=[self.product.pk]), {
+            'name': 'Jane', 'email': 'jane@example.com', 'review_title': 'Review',
+            'review': 'Text', 'rating': rating,
+        })
+
+    def detail(self):
+        return ProductService.get_product_detail(self.product.pk)
+
+    def test_posted_reviews_update_summary(self):
+        for rating in ('5', '4.2', '1.5', '4.5'):
+            self.assertEqual(self.post_review(rating).status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 4)
+        self.assertEqual(self.product.average_rating, Decimal('3.80'))
+        self.assertEqual(self.product.rating, 4)
+        self.assertEqual(self.product.rating_histogram, {'5': 2, '4': 1, '3': 0, '2': 1, '1': 0})
+
+        Review.objects.filter(rating=Decimal('1.5')).delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 3)
+        self.assertEqual(self.product.rating_histogram['2'], 0)
+
+    def test_detail_served_from_cache(self):
+        self.detail()
+        with CaptureQueriesContext(connection) as queries:
+            details = self.detail()
+        self.assertEqual(details['product'], self.product)
+        self.assertTrue(all('"ecommerce_cache"' in query['sql'] for query in queries.captured_queries))
+
+    def test_review_refreshes_cached_detail(self):
+        self.assertEqual(self.detail()['review_count'], 0)
+        self.post_review('5')
+        details = self.detail()
+        self.assertEqual(details['review_count'], 1)
+        self.assertEqual(details['rating_breakdown'][0], {'stars': 5, 'count': 1, 'width': 75})
+        self.assertEqual(len(details['reviews']), 1)
+
+    def test_variant_changes_refresh_cached_detail(self):
+        self.assertEqual(self.detail()['variants'], [])
+        variant = ProductVariant.objects.create(
+            product=self.product, size='M', color='Red', stock=2, variant_price=Decimal('450.00')
+        )
+        details = self.detail()
+        self.assertEqual(details['variants'], [variant])
+        self.assertEqual(details['unique_colors'], ['Red'])
+
+        variant.color = 'Blue'
+        variant.save()
+        self.assertEqual(self.detail()['unique_colors'], ['Blue'])
+
+        variant.delete()
+        self.assertEqual(self.detail()['variant_groups'], {})
+
+    def test_image_changes_refresh_cached_detail(self):
+        self.assertEqual(self.detail()['images'], [])
+        image = ProductImage.objects.create(product=self.product, image='product_images/side.jpg')
+        self.assertEqual(self.detail()['images'], [image])
+
+        image.delete()
+        self.assertEqual(self.detail()['images'], [])
+
+
+class InvertedIndexSearchTests(TestCase):
+    def setUp(self):
+        parent = ParentCategory.objects.create(parent_name='Sports')
+        self.category = Category.objects.create(category_name='Footwear', parent_category=parent)
+        self.brand = Brand.objects.create(brand_title='Stride')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shoes = make_product(title='Running shoes', category=self.category, brand=self.brand)
+            self.socks = make_product(title='Ankle socks', keywords='running sport')
+        self.backend = InvertedIndexSearchBackend()
+
+    def search(self, query):
+        return list(self.backend.search(query))
+
+    def test_title_match_outranks_keyword_match(self):
+        results = self.backend.search('running')
+        self.assertEqual(list(results), [self.shoes, self.socks])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+
+    def test_prefix_and_all_terms_match(self):
+        self.assertEqual(self.search('run'), [self.shoes, self.socks])
+        self.assertEqual(self.search('runn sock'), [self.socks])
+        self.assertEqual(self.search('stride'), [self.shoes])
+        self.assertEqual(self.search('sports footwear'), [self.shoes])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_reindexed_on_save_and_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.socks.title = 'Trail gaiters'
+            self.socks.save()
+        self.assertEqual(self.search('gaiters'), [self.socks])
+        self.assertEqual(self.search('ankle'), [])
+
+        shoes_id = self.shoes.id
+        self.shoes.delete()
+        self.assertEqual(self.search('shoes'), [])
+        self.assertFalse(ProductSearchTerm.objects.filter(product_id=shoes_id).exists())
+
+    def test_migration_backfills_existing_products(self):
+        ProductSearchTerm.objects.all().delete()
+        migration = importlib.import_module('ecommerce.migrations.0014_backfill_product_search_terms')
+        migration.backfill_search_terms(django_apps, mock.Mock(connection=connection))
+        self.assertEqual(self.search('running'), [self.shoes, self.socks])
+
+    def test_backend_choice(self):
+        self.assertIsInstance(get_search_backend(), InvertedIndexSearchBackend)
+        with mock.patch('ecommerce.search.connection', mock.Mock(vendor='postgresql')):
+            self.assertIsInstance(get_search_backend(), PostgresSearchBackend)
+        with override_settings(PRODUCT_SEARCH_BACKEND='ecommerce.search.PostgresSearchBackend'):
+            self.assertIsInstance(get_search_backend(), PostgresSearchBackend)
+
+
+class AddressServiceTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+
+    def test_matching_address_is_reused(self):
+        address = make_address(self.user)
+        reused = AddressService.get_or_create_address(
+            self.user, email=self.user.email, first_name='jane', last_name='DOE',
+            phone='0712 345 678', street_address='1  Moi Avenue', city='Nairobi',
+            county='Nairobi', postal_code='00100'
+        )
+        self.assertEqual(reused.pk, address.pk)
+
+    def test_editing_ordered_address_keeps_order_snapshot(self):
+        address = make_address(self.user, is_default=True)
+        order = make_order(self.user, address=address)
+
+        edited = Address.objects.get(pk=address.pk)
+        edited.city = 'Mombasa'
+        edited.save()
+
+        self.assertNotEqual(edited.pk, address.pk)
+        order.refresh_from_db()
+        self.assertEqual(order.shipping_address.city, 'Nairobi')
+        self.assertFalse(order.shipping_address.is_default)
+        self.assertTrue(Address.objects.get(pk=edited.pk).is_default)
+
+    def test_editing_unused_address_updates_in_place(self):
+        address = make_address(self.user)
+        address = Address.objects.get(pk=address.pk)
+        address.city = 'Mombasa'
+        address.save()
+        self.assertEqual(Address.objects.get(pk=address.pk).city, 'Mombasa')
+        self.assertEqual(Address.objects.count(), 1)
+
+    def test_deferred_fingerprint_is_not_loaded(self):
+        make_address(self.user)
+        make_address(self.user, city='Mombasa')
+        with self.assertNumQueries(1):
+            cities = [address.city for address in Address.objects.only('id', 'city').order_by('id')]
+        self.assertEqual(cities, ['Nairobi', 'Mombasa'])
+
+    def test_collapse_duplicates_repoints_orders(self):
+        other = make_user('other@example.com')
+        kept = make_address(self.user)
+        duplicate = make_address(self.user, is_default=True)
+        other_kept = make_address(other)
+        other_duplicate = make_address(other)
+        order = make_order(self.user, address=duplicate)
+        other_order = make_order(other, address=other_duplicate)
+
+        with CaptureQueriesContext(connection) as queries:
+            groups, removed = AddressService.collapse_duplicates()
+
+        self.assertEqual((groups, removed), (2, 2))
+        order.refresh_from_db()
+        other_order.refresh_from_db()
+        self.assertEqual(order.shipping_address_id, kept.pk)
+        self.assertEqual(other_order.billing_address_id, other_kept.pk)
+        self.assertTrue(Address.objects.get(pk=kept.pk).is_default)
+        copy_lookups = [q for q in queries if 'FROM "accounts_address"' in q['sql']
+                        and '"accounts_address"."fingerprint" IN' in q['sql']]
+        self.assertEqual(len(copy_lookups), 1)
+
+
+class InventoryAdjustmentTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.product = make_product(quantity=10)
+        self.variant = ProductVariant.objects.create(
+            product=self.product, size='M', stock=10, variant_price=Decimal('100.00')
+        )
+        self.cart = Cart.objects.create(user=self.user)
+
+    def hold(self, quantity, variant=None):
+        item = CartItem.objects.create(cart=self.cart, product=self.product, variant=variant, quantity=quantity)
+        hold_cart_item(item, quantity)
+        return item
+
+    def adjust(self, rows, mode='delta'):
+        return apply_adjustments(parse_adjustments(rows, fmt='json', mode=mode))
+
+    def test_set_accounts_for_held_units(self):
+        self.hold(3, variant=self.variant)
+        self.hold(2)
+        self.adjust([
+            {'variant': self.variant.pk, 'quantity': 20},
+            {'product': self.product.pk, 'quantity': 5},
+        ], mode='set')
+        self.variant.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(self.variant.stock, 17)
+        self.assertEqual(self.product.quantity, 3)
+
+        # Once the holds go back, stock matches the counted figures
+        StockReservation.objects.update(expires_at=timezone.now())
+        release_expired_reservations()
+        self.variant.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(self.variant.stock, 20)
+        self.assertEqual(self.product.quantity, 5)
+
+    def test_set_below_held_units_stops_at_zero(self):
+        self.hold(4, variant=self.variant)
+        self.adjust([{'variant': self.variant.pk, 'quantity': 1, 'mode': 'set'}])
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 0)
+
+    def test_delta_is_relative_to_current_stock(self):
+        self.hold(3, variant=self.variant)
+        self.adjust([{'variant': self.variant.pk, 'quantity': -2}, {'variant': self.variant.pk, 'quantity': 5}])
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 10)
+
+    def test_invalid_mode(self):
+        for mode in (5, ['set'], 'replace'):
+            with self.subTest(mode=mode), self.assertRaises(InvalidAdjustment):
+                parse_adjustments([{'variant': 1, 'quantity': 1, 'mode': mode}], fmt='json')
+        with self.assertRaises(InvalidAdjustment):
+            parse_adjustments({'mode': 1, 'items': [{'variant': 1, 'quantity': 1}]}, fmt='json')
+        with self.assertRaises(InvalidAdjustment):
+            parse_adjustments([7], fmt='json')
+
+    def test_invalid_price(self):
+        for price in ('-1.00', -5, 'NaN', 'sNaN', 'Infinity', '-inf', 'abc'):
+            with self.subTest(price=price), self.assertRaisesMessage(InvalidAdjustment, 'invalid price'):
+                parse_adjustments([{'variant': 1, 'price': price}], fmt='json')
+        with self.assertRaisesMessage(InvalidAdjustment, 'Row 1: invalid price'):
+            parse_adjustments('product,price\n1,nan\n')
+        self.assertEqual(parse_adjustments([{'product': 1, 'price': '0'}], fmt='json')[0]['price'], Decimal('0'))
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.shirt = make_product(price=Decimal('100.00'), discount=Decimal('10.00'), quantity=20)
+        self.shoe = make_product(title='Shoe', price=Decimal('1000.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.small = ProductVariant.objects.create(
+                product=self.shoe, size='40', stock=5, variant_price=Decimal('1200.00')
+            )
+        self.shoe.refresh_from_db()
+
+    def summary(self):
+        cart = Cart.objects.get(user=self.user)
+        return cart.total_items, cart.total_amount
+
+    def test_summary_follows_cart_changes(self):
+        item = CartService.add_to_cart(self.user, self.shirt, quantity=2)
+        self.assertEqual(self.summary(), (1, Decimal('180.00')))
+
+        CartService.add_to_cart(self.user, self.shirt, quantity=1)
+        shoe = CartService.add_to_cart(self.user, self.shoe, quantity=1, size='40')
+        self.assertEqual(self.summary(), (2, Decimal('1470.00')))
+
+        item.refresh_from_db()
+        CartService.update_cart_item(item, 1)
+        self.assertEqual(self.summary(), (2, Decimal('1290.00')))
+
+        CartService.remove_cart_item(shoe)
+        self.assertEqual(self.summary(), (1, Decimal('90.00')))
+
+    def test_price_change_does_not_drift_total(self):
+        item = CartService.add_to_cart(self.user, self.shirt, quantity=3)
+        self.shirt.price = Decimal('200.00')
+        self.shirt.save()
+
+        item.refresh_from_db()
+        CartService.update_cart_item(item, 1)
+        self.assertEqual(self.summary(), (1, Decimal('180.00')))
+
+        item.refresh_from_db()
+        CartService.remove_cart_item(item)
+        self.assertEqual(self.summary(), (0, Decimal('0.00')))
+
+    def test_failed_hold_leaves_summary_unchanged(self):
+        CartService.add_to_cart(self.user, self.shirt, quantity=2)
+        with self.assertRaises(ValidationError):
+            CartService.add_to_cart(self.user, self.shirt, quantity=50)
+        self.assertEqual(self.summary(), (1, Decimal('180.00')))
+
+
+class CartStockTestCase(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.cart = Cart.objects.create(user=self.user)
+        self.product = make_product(quantity=10)
+
+    def line(self, quantity, product=None, variant=None):
+        return CartItem.objects.create(
+            cart=self.cart, product=product or self.product, variant=variant, quantity=quantity
+        )
+
+    def stock(self, obj=None):
+        obj = obj or self.product
+        obj.refresh_from_db()
+        return obj.stock if isinstance(obj, ProductVariant) else obj.quantity
+
+
+class StockReservationTests(CartStockTestCase):
+    def test_reserve_never_oversells(self):
+        self.assertTrue(reserve_stock(self.product.pk, None, 10))
+        self.assertFalse(reserve_stock(self.product.pk, None, 1))
+        self.assertEqual(self.stock(), 0)
+
+    def test_hold_reserves_only_the_difference(self):
+        item = self.line(4)
+        hold_cart_item(item, 4)
+        self.assertEqual(self.stock(), 6)
+        hold_cart_item(item, 7)
+        self.assertEqual(self.stock(), 3)
+        hold_cart_item(item, 2)
+        self.assertEqual(self.stock(), 8)
+        self.assertEqual(StockReservation.objects.get(cart_item=item).quantity, 2)
+
+        with self.assertRaises(InsufficientStock) as raised:
+            hold_cart_item(item, 11)
+        self.assertEqual(raised.exception.available, 10)
+
+    def test_release_returns_held_units(self):
+        item = self.line(3)
+        hold_cart_item(item, 3)
+        release_cart_item(item)
+        self.assertEqual(self.stock(), 10)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_sweeper_returns_expired_and_orphaned_holds(self):
+        variant = ProductVariant.objects.create(product=self.product, size='M', stock=5, variant_price=Decimal('10'))
+        expired, kept, orphaned = self.line(2), self.line(1, variant=variant), self.line(3, product=make_product(quantity=3))
+        for item in (expired, kept, orphaned):
+            hold_cart_item(item, item.quantity)
+        StockReservation.objects.filter(cart_item=expired).update(expires_at=timezone.now())
+        orphaned.delete()
+
+        self.assertEqual(release_expired_reservations(), (2, 5))
+        self.assertEqual(self.stock(), 10)
+        self.assertEqual(self.stock(variant), 4)
+        self.assertEqual(self.stock(orphaned.product), 3)
+        self.assertEqual(list(StockReservation.objects.values_list('cart_item', flat=True)), [kept.pk])
+
+
+class CartAllocationTests(CartStockTestCase):
+    def test_allocate_tops_up_swept_holds(self):
+        kept, swept = self.line(2), self.line(3, product=make_product(quantity=5))
+        for item in (kept, swept):
+            hold_cart_item(item, item.quantity)
+        StockReservation.objects.filter(cart_item=swept).update(expires_at=timezone.now())
+        release_expired_reservations()
+
+        allocate_cart(self.cart)
+        self.assertEqual(self.stock(), 8)
+        self.assertEqual(self.stock(swept.product), 2)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_allocate_fails_when_stock_ran_out(self):
+        item = self.line(4)
+        hold_cart_item(item, 4)
+        StockReservation.objects.update(expires_at=timezone.now())
+        release_expired_reservations()
+        Product.objects.filter(pk=self.product.pk).update(quantity=1)
+
+        with self.assertRaisesMessage(ValidationError, 'only 1 left'):
+            allocate_cart(self.cart)
+        self.assertEqual(self.stock(), 1)
+
+    def test_allocate_query_count_does_not_grow_with_cart(self):
+        def allocate(lines):
+            cart = Cart.objects.create(user=make_user(f'buyer{lines}@example.com'))
+            items = []
+            for index in range(lines):
+                variant = ProductVariant.objects.create(
+                    product=self.product, size=f'S{lines}-{index}', stock=5, variant_price=Decimal('10')
+                )
+                items.append(CartItem.objects.create(cart=cart, product=self.product, variant=variant, quantity=1))
+                items.append(CartItem.objects.create(cart=cart, product=make_product(quantity=5), quantity=1))
+            with CaptureQueriesContext(connection) as queries:
+                allocate_cart(cart, items)
+            return len(queries)
+
+        self.assertEqual(allocate(2), allocate(6))
+
+
+class OrderCheckoutTests(CartStockTestCase):
+    def setUp(self):
+        super().setUp()
+        self.address = make_address(self.user)
+
+    def add_lines(self, cart, count):
+        for index in range(count):
+            variant = ProductVariant.objects.create(
+                product=self.product, size=f'S{index}', color='Red', stock=5, variant_price=Decimal('80.00')
+            )
+            hold_cart_item(CartItem.objects.create(cart=cart, product=self.product, variant=variant, quantity=1), 1)
+            item = CartItem.objects.create(cart=cart, product=make_product(quantity=5), quantity=2)
+            hold_cart_item(item, 2)
+
+    def checkout(self):
+        return OrderService.create_order_from_cart(self.cart, self.address, payment_method='mpesa', notes='')
+
+    def checkout_queries(self, cart):
+        with CaptureQueriesContext(connection) as queries:
+            OrderService.create_order_from_cart(cart, self.address, payment_method='mpesa', notes='')
+        # Leave out the shared cache table and the nested atomic blocks
+        return [query['sql'] for query in queries.captured_queries
+                if '"ecommerce_cache"' not in query['sql'] and 'SAVEPOINT' not in query['sql']]
+
+    def test_query_count_does_not_grow_with_cart(self):
+        self.add_lines(self.cart, 2)
+        larger = Cart.objects.create(user=make_user('bulk@example.com'))
+        self.add_lines(larger, 8)
+        queries = self.checkout_queries(self.cart)
+        # Cart lines, holds, variant and product stock, hold cleanup, order, items
+        self.assertEqual(len(queries), 7)
+        self.assertEqual(len(self.checkout_queries(larger)), len(queries))
+
+    def test_items_snapshot_price_and_title(self):
+        self.product.discount = Decimal('10.00')
+        self.product.save()
+        variant = ProductVariant.objects.create(
+            product=self.product, size='M', color='Red', stock=5, variant_price=Decimal('80.00')
+        )
+        self.line(2)
+        self.line(1, variant=variant)
+
+        order = self.checkout()
+        Product.objects.filter(pk=self.product.pk).update(title='Renamed', price=Decimal('999.00'))
+        variant.variant_price = Decimal('999.00')
+        variant.save()
+
+        plain, sized = OrderItem.objects.filter(order=order).order_by('variant')
+        self.assertEqual((plain.product_name, plain.unit_price, plain.subtotal),
+                         ('Test product', Decimal('90.00'), Decimal('180.00')))
+        self.assertIsNone(plain.variant_info)
+        self.assertEqual((sized.product_name, sized.unit_price), ('Test product', Decimal('72.00')))
+        self.assertEqual(sized.variant_info, {'size': 'M', 'color': 'Red', 'variant_price': '80.00'})
+        self.assertEqual(order.subtotal, Decimal('252.00'))
+        self.assertEqual(order.total, order.subtotal + order.tax)
+
+    def test_insufficient_stock_creates_nothing(self):
+        held = self.line(3)
+        hold_cart_item(held, 3)
+        scarce = self.line(4, product=make_product(quantity=2))
+
+        with self.assertRaisesMessage(ValidationError, 'only 2 left'):
+            self.checkout()
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), 7)
+        self.assertEqual(self.stock(scarce.product), 2)
+        self.assertEqual(StockReservation.objects.get().cart_item, held)
+
+    def test_failure_after_allocation_rolls_back_stock(self):
+        hold_cart_item(self.line(3), 3)
+        self.line(2, product=make_product(quantity=2))
+
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.checkout()
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), 7)
+        self.assertEqual(StockReservation.objects.count(), 1)
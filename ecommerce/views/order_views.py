@@ -1,3 +1,4 @@
+import uuid
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse
 from django.contrib.auth.decorators import login_required
@@ -5,8 +6,8 @@ from django.contrib import messages
 from ecommerce.forms import CheckoutForm
 from ..models import Order, Cart
 from django.db import transaction
-from .services import OrderService, CommonService
-from accounts.models import Address
+from .services import OrderService, CommonService, AddressService
+from ..idempotency import claim_request, complete_request, abandon_request, IdempotencyConflict
 from django.urls import reverse
 from payments.services import PaymentService
 from payments.utils import format_phone_number
@@ -25,6 +26,7 @@ def checkout(request):
         return redirect('cart:cart_detail')
     form = CheckoutForm()
     context = {
+        'idempotency_key': uuid.uuid4().hex,
         'cart_items': cart_items,  
         'total_price': total_price,
         'cart': cart,
@@ -38,6 +40,28 @@ def create_order(request):
     if request.method != 'POST':
         return redirect('cart:cart_detail')
     
+    # Retries and double submissions replay the first request's outcome
+    try:
+        record, replayed = claim_request(request, 'checkout')
+    except IdempotencyConflict:
+        messages.error(request, 'This checkout was already submitted. Please review your order.')
+        return redirect('checkout')
+    
+    if replayed:
+        if not record.completed:
+            messages.info(request, 'Your order is still being processed.')
+            return redirect('orders')
+        if record.order_id:
+            messages.info(request, f'Order {record.order.order_number} was already placed.')
+        return redirect(record.response_url)
+    
+    try:
+        return _place_order(request, record)
+    finally:
+        # Anything that did not place an order may be retried
+        abandon_request(record)
+
+def _place_order(request, record):
     cart = Cart.objects.filter(user=request.user).first()
     if not cart or not cart.cart_items.exists():
         messages.error(request, 'Your cart is empty.')
@@ -52,9 +76,9 @@ def create_order(request):
     
     if form.is_valid():
         with transaction.atomic():
-            # Create billing address
-            billing_address = Address.objects.create(
-                user=request.user,
+            # Reuse the user's matching addresses instead of adding a row per order
+            billing_address = AddressService.get_or_create_address(
+                request.user,
                 first_name=form.cleaned_data['billing_first_name'].capitalize(),
                 last_name=form.cleaned_data['billing_last_name'].capitalize(),
                 email=form.cleaned_data['billing_email'],
@@ -70,8 +94,8 @@ def create_order(request):
             if not form.cleaned_data['different_shipping_loc']:
                 shipping_address = billing_address
             else:
-                shipping_address = Address.objects.create(
-                    user=request.user,
+                shipping_address = AddressService.get_or_create_address(
+                    request.user,
                     first_name=form.cleaned_data['shipping_first_name'].capitalize(),
                     last_name=form.cleaned_data['shipping_last_name'].capitalize(),
                     email=form.cleaned_data['shipping_email'],
@@ -107,6 +131,7 @@ def create_order(request):
             if payment_method == "cash-on-delivery":
                 order.status = "Cash-On-Delivery"
                 order.save()
+                complete_request(record, '/', order=order)
                 messages.success(
                     request,
                     f'Order {order.order_number} created successfully.'
@@ -125,6 +150,13 @@ def create_order(request):
                 cancel_url = cancel_url,
                 call_back_url = call_back_url
             )
+            if payment_method == 'mpesa':
+                response_url = reverse('waiting_page', args=[tr.id])
+            elif payment_method == 'paypal' and tr.payment_url:
+                response_url = tr.payment_url
+            else:
+                response_url = reverse('orders')
+            complete_request(record, response_url, order=order)
             messages.success(
                 request,
                 f'Order {order.order_number} created successfully.'
@@ -1,22 +1,40 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from .services import CommonService, ProductService, Category, ParentCategory
 from django.db.models import Prefetch
+from ecommerce.facets import normalize_price
 from ecommerce.models import Product
 
 
 def product_list(request):
     """
-    Render paginated product list.
+    Render paginated product list, narrowed by any category, brand,
+    color, size and price filters in the query string.
     """
     page_number = request.GET.get('page', 1)
     
-    page_obj, paginator = ProductService.get_product_list(
-        page_number=page_number
-    )
+    try:
+        page_obj, paginator, filter_context = ProductService.filter_products(
+            category_slug=request.GET.get('category'),
+            parent_category_slug=request.GET.get('parent_category'),
+            min_price=normalize_price(request.GET.get('min_price')),
+            max_price=normalize_price(request.GET.get('max_price')),
+            brands=request.GET.getlist('brand'),
+            colors=request.GET.getlist('color'),
+            sizes=request.GET.getlist('size'),
+            page_number=page_number,
+            cursor=request.GET.get('cursor'),
+            ordering=request.GET.get('ordering')
+        )
+    except (ValueError, ArithmeticError):
+        return render(request, 'shop-v5-product-not-found.html', {'message': 'Invalid filter value'})
+    
+    if page_obj is None:
+        return render(request, 'shop-v5-product-not-found.html', {'message': filter_context['error']})
     
     context = {
         'page_obj': page_obj,
         'paginator': paginator,
+        **filter_context,
         **CommonService.get_common_context(request)
     }
     
@@ -62,7 +80,9 @@ def products_by_parent_c(request, slug):
     products, paginator, parent_category, categories = ProductService.get_products_by_parent_category(
         slug, 
         page_number=page_number, 
-        per_page=int(per_page)
+        per_page=int(per_page),
+        cursor=request.GET.get('cursor'),
+        ordering=request.GET.get('ordering')
     )
     
     # Check if page is out of range
@@ -85,7 +105,9 @@ def products_by_category(request, slug):
     products, paginator, parent_category = ProductService.get_products_by_category(
         slug, 
         page_number=page_number, 
-        per_page=int(per_page)
+        per_page=int(per_page),
+        cursor=request.GET.get('cursor'),
+        ordering=request.GET.get('ordering')
     )
     
     # Check if page is out of range
@@ -123,7 +145,9 @@ def search_products(request):
         query,
         category=category,
         page_number=int(page_number),
-        per_page=int(per_page)
+        per_page=int(per_page),
+        cursor=request.GET.get('cursor'),
+        ordering=request.GET.get('ordering')
     )
     parent_categories = ParentCategory.objects.prefetch_related(
         Prefetch(
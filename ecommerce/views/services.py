@@ -1,29 +1,55 @@
 from decimal import Decimal
-from django.db.models import Avg, Count, Q, FloatField, F, Min, Max
-from django.db.models.functions import Cast
+from django.db.models import Count, Q, Min, Case, When, Value, IntegerField
 from django.core.paginator import Paginator, EmptyPage, InvalidPage
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.shortcuts import get_list_or_404
+from django.conf import settings
+from ..cache import VersionedCache, SITE_CHROME_NAMESPACE, PRODUCT_DETAIL_NAMESPACE
+from ..pagination import KeysetPaginator, InvalidCursor
+from ..search import get_search_backend
+from ..facets import get_facet_counts
+from ..inventory import hold_cart_item, release_cart_item, allocate_cart, InsufficientStock
+from accounts.models import Address
 from ..models import (
     Product, Category, AppContent, Slider, Wishlist, Cart,CartItem,
     ParentCategory, Review, WishlistItem, ProductVariant, Order, OrderItem
 )
 
 class CommonService:
-    @staticmethod
-    def get_common_context(request):
+    @classmethod
+    def get_site_chrome(cls):
+        """
+        Retrieve site-wide content (app data, sliders, navigation categories).
+
+        Cached under a versioned key that is bumped whenever AppContent,
+        Slider, Category or ParentCategory rows change.
+        """
+        def build():
+            app_data = AppContent.objects.first()
+            return {
+                'app_data': app_data,
+                'sliders': list(Slider.objects.filter(app=app_data)),
+                'categories': list(
+                    Category.objects.select_related('parent_category')
+                ),
+            }
+
+        return VersionedCache.get_or_set(
+            SITE_CHROME_NAMESPACE,
+            ['context'],
+            build,
+            timeout=settings.SITE_CHROME_CACHE_TIMEOUT
+        )
+
+    @classmethod
+    def get_common_context(cls, request):
         """
         Retrieve common context data for the application.
         """
-        # Fetch app-wide content
-        app_data = AppContent.objects.first()
-        
-        # Initialize default context
+        # Initialize default context from cached app-wide content
         context = {
-            'app_data': app_data,
-            'sliders': Slider.objects.filter(app=app_data),
-            'categories': Category.objects.all(),
+            **cls.get_site_chrome(),
             'cart_items': [],
             'total_items': 0,
             'total_price': 0
@@ -31,16 +57,15 @@ class CommonService:
         
         if request.user.is_authenticated:
             try:
-                cart = Cart.objects.prefetch_related(
-                    'cart_items__product'
+                # Header totals come from the denormalized summary on the cart row
+                cart = Cart.objects.only(
+                    'id', 'total_items', 'total_amount', 'updated_at'
                 ).get(user=request.user)
                 
-                cart_items = cart.cart_items.all()
-                
                 context.update({
-                    'cart_items': cart_items,
-                    'total_items': cart_items.count(),
-                    'total_price': cart.total_price() if cart_items.exists() else 0
+                    'cart_items': cart.cart_items.select_related('product') if cart.total_items else [],
+                    'total_items': cart.total_items,
+                    'total_price': cart.total_amount
                 })
             
             except Cart.DoesNotExist:
@@ -50,25 +75,45 @@ class CommonService:
 
 class ProductService:
     @classmethod
-    def get_product_list(cls, page_number=1, per_page=12):
+    def _paginate(cls, products, page_number=1, per_page=12, cursor=None, ordering=None):
+        """
+        Paginate a product queryset.
+        
+        Uses keyset (cursor) pagination when a cursor is supplied (an empty
+        string requests the first page), otherwise classic page numbers.
+        
+        Returns:
+            tuple: Page object and paginator
+        """
+        if cursor is not None:
+            paginator = KeysetPaginator(products, per_page, ordering=ordering)
+            try:
+                return paginator.get_page(cursor), paginator
+            except InvalidCursor:
+                return paginator.get_page(), paginator
+        
+        paginator = Paginator(products, per_page)
+        return paginator.get_page(page_number), paginator
+
+    @classmethod
+    def get_product_list(cls, page_number=1, per_page=12, cursor=None, ordering=None):
         """
         Retrieve paginated product list with optional filtering.
         
         Args:
             page_number (int): Current page number
             per_page (int): Number of products per page
+            cursor (str, optional): Keyset cursor, enables cursor pagination
+            ordering (str, optional): Keyset ordering name (newest, price_asc, ...)
         
         Returns:
             tuple: Paginated products and paginator object
         """
         products = Product.objects.select_related('category__parent_category', 'brand')
-        paginator = Paginator(products, per_page)
-        page_obj = paginator.get_page(page_number)
-        
-        return page_obj, paginator
+        return cls._paginate(products, page_number, per_page, cursor, ordering)
 
     @classmethod
-    def get_products_by_category(cls, category_slug, page_number=1, per_page=12):
+    def get_products_by_category(cls, category_slug, page_number=1, per_page=12, cursor=None, ordering=None):
         """
         Retrieve products for a specific category.
         
@@ -76,6 +121,8 @@ class ProductService:
             category_slug (str): Slug of the category
             page_number (int): Current page number
             per_page (int): Number of products per page
+            cursor (str, optional): Keyset cursor, enables cursor pagination
+            ordering (str, optional): Keyset ordering name
         
         Returns:
             tuple: Paginated products and paginator object
@@ -90,8 +137,7 @@ class ProductService:
             products = Product.objects.filter(category=category)
             
             # Apply pagination
-            paginator = Paginator(products, per_page)
-            page_obj = paginator.get_page(page_number)
+            page_obj, paginator = cls._paginate(products, page_number, per_page, cursor, ordering)
             
             return page_obj, paginator, category
         
@@ -99,7 +145,7 @@ class ProductService:
             return None, None, None
 
     @classmethod
-    def get_products_by_parent_category(cls, parent_category_slug, page_number=1, per_page=12):
+    def get_products_by_parent_category(cls, parent_category_slug, page_number=1, per_page=12, cursor=None, ordering=None):
         """
         Retrieve products for a specific parent category.
         Returns:
@@ -120,8 +166,7 @@ class ProductService:
                 product_count=Count('product', filter=Q(product__isnull=False))
             )
             
-            paginator = Paginator(products, per_page)
-            page_obj = paginator.get_page(page_number)
+            page_obj, paginator = cls._paginate(products, page_number, per_page, cursor, ordering)
             
             return page_obj, paginator, parent_category, categories
         
@@ -135,8 +180,13 @@ class ProductService:
                         min_price=None, 
                         max_price=None, 
                         brands=None, 
+                        colors=None,
+                        sizes=None,
                         page_number=1, 
-                        per_page=12):
+                        per_page=12,
+                        cursor=None,
+                        ordering=None,
+                        with_count=False):
         """
         Advanced product filtering method.
         
@@ -146,8 +196,13 @@ class ProductService:
             min_price (float, optional): Minimum price filter
             max_price (float, optional): Maximum price filter
             brands (list, optional): List of brand IDs to filter
+            colors (list, optional): Variant colors to filter
+            sizes (list, optional): Variant sizes to filter
             page_number (int): Current page number
             per_page (int): Number of products per page
+            cursor (str, optional): Keyset cursor, enables cursor pagination
+            ordering (str, optional): Keyset ordering name
+            with_count (bool): Include an (approximate) total in cursor mode
         
         Returns:
             tuple: Paginated products, paginator, and additional context
@@ -174,84 +229,98 @@ class ProductService:
             except ParentCategory.DoesNotExist:
                 return None, None, {'error': 'Parent category not found'}
         
-        # Price filtering
+        # Price filtering on the stored selling price bounds (index range scans).
+        # A product matches when any of its variants falls inside the range.
         if min_price is not None:
-            products = products.annotate(
-                selling_price=Cast('price', FloatField()) * (1 - F('discount') / 100)
-            ).filter(selling_price__gte=min_price)
+            products = products.filter(max_selling_price__gte=min_price)
         
         if max_price is not None:
-            products = products.annotate(
-                selling_price=Cast('price', FloatField()) * (1 - F('discount') / 100)
-            ).filter(selling_price__lte=max_price)
+            products = products.filter(min_selling_price__lte=max_price)
         
         # Brand filtering
         if brands:
             products = products.filter(brand__id__in=brands)
         
+        # Variant filtering; a product matches when any variant has the value
+        variants = ProductVariant.objects.all()
+        if colors:
+            color_filter = Q()
+            for color in colors:
+                color_filter |= Q(color__iexact=color)
+            variants = variants.filter(color_filter)
+        if sizes:
+            size_filter = Q()
+            for size in sizes:
+                size_filter |= Q(size__iexact=size)
+            variants = variants.filter(size_filter)
+        if colors or sizes:
+            products = products.filter(id__in=variants.values('product_id'))
+        
         # Pagination
-        paginator = Paginator(products, per_page)
-        page_obj = paginator.get_page(page_number)
+        page_obj, paginator = cls._paginate(products, page_number, per_page, cursor, ordering)
+        
+        # Keyset pages skip the COUNT(*) unless a total was asked for
+        total_products = None
+        if cursor is None or with_count:
+            total_products = paginator.count
         
         # Prepare context
         context = {
-            'total_products': products.count(),
+            'total_products': total_products,
             'applied_filters': {
                 'category': category_slug,
                 'parent_category': parent_category_slug,
                 'min_price': min_price,
                 'max_price': max_price,
-                'brands': brands
-            }
+                'brands': brands,
+                'colors': colors,
+                'sizes': sizes
+            },
+            'facets': get_facet_counts(
+                category=category_slug,
+                parent_category=parent_category_slug,
+                brands=brands,
+                colors=colors,
+                sizes=sizes,
+                min_price=min_price,
+                max_price=max_price
+            )['facets']
         }
         
         return page_obj, paginator, context
 
     @classmethod
-    def get_available_filters(cls, parent_category_slug=None, category_slug=None):
+    def get_available_filters(cls, parent_category_slug=None, category_slug=None, **filters):
         """
         Retrieve available filters for product listing.
         
+        All facet counts come from the cached bitmap facet index, so the
+        sidebar costs no queries per facet.
+        
         Args:
             parent_category_slug (str, optional): Parent category slug
             category_slug (str, optional): Category slug
+            **filters: Currently applied brands, colors, sizes, min_price, max_price
         
         Returns:
-            dict: Available filters including price range, brands, etc.
+            dict: Price range, brands and per-value counts for every facet
         """
-        # Base queryset
-        products = Product.objects.all()
-        
-        # Filter by category or parent category if provided
-        if category_slug:
-            try:
-                category = Category.objects.get(
-                    Q(category_name__iexact=category_slug) | 
-                    Q(slug=category_slug)
-                )
-                products = products.filter(category=category)
-            except Category.DoesNotExist:
-                return {}
-        
-        if parent_category_slug:
-            try:
-                parent_category = ParentCategory.objects.get(slug=parent_category_slug)
-                products = products.filter(category__parent_category=parent_category)
-            except ParentCategory.DoesNotExist:
-                return {}
-        
-        # Calculate price range
-        price_range = products.aggregate(
-            min_price=Min('price'),
-            max_price=Max('price')
+        result = get_facet_counts(
+            category=category_slug,
+            parent_category=parent_category_slug,
+            **filters
         )
-        
-        # Get available brands
-        available_brands = products.values('brand__id', 'brand__name').distinct()
+        if not result['total'] and (category_slug or parent_category_slug):
+            return {}
         
         return {
-            'price_range': price_range,
-            'brands': list(available_brands)
+            'price_range': result['price_range'],
+            'brands': [
+                {'brand__id': entry['value'], 'brand__brand_title': entry['label'], 'count': entry['count']}
+                for entry in result['facets']['brand']
+            ],
+            'facets': result['facets'],
+            'total_products': result['total']
         }
 
     @classmethod
@@ -259,30 +328,41 @@ class ProductService:
         """
         Retrieve detailed product information.
         
+        Everything except the review list is cached per product; the cache
+        entry is invalidated when the product, its variants, images or
+        reviews change, or when any brand or category changes.
+        
         Args:
             pk (int): Primary key of the product
         
         Returns:
             dict: Comprehensive product details
         """
-        # Fetch product with related data
+        details = VersionedCache.get_or_set(
+            PRODUCT_DETAIL_NAMESPACE,
+            [pk, VersionedCache.get_version(f'{PRODUCT_DETAIL_NAMESPACE}:{pk}')],
+            lambda: cls._build_product_detail(pk),
+            timeout=settings.PRODUCT_DETAIL_CACHE_TIMEOUT
+        )
+        
+        return {
+            **details,
+            'reviews': Review.objects.filter(product_id=pk).order_by('-created_at', '-id'),
+        }
+    
+    @classmethod
+    def _build_product_detail(cls, pk):
+        """
+        Assemble the cacheable part of the product page.
+        """
         product = Product.objects.select_related(
-            'category'
+            'category__parent_category', 'brand'
         ).prefetch_related(
             'images',
             'variants'
         ).get(pk=pk)
         
-        # Fetch reviews with annotations
-        reviews = Review.objects.filter(product=product)
-        
-        # Calculate average rating
-        average_rating = reviews.aggregate(
-            avg_rating=Avg('rating')
-        )['avg_rating'] or 0.0
-        
-        # Prepare variant information
-        variants = product.variants.all()
+        variants = list(product.variants.all())
         
         # Group variants by size if applicable
         variant_groups = {}
@@ -291,22 +371,34 @@ class ProductService:
                 if variant.size:
                     variant_groups.setdefault(variant.size, []).append(variant)
         
-        # Get similar products
-        similar_products = Product.objects.filter(
-            category=product.category
-        ).exclude(pk=product.pk)[:4]
-        
-        # Get unique variants
-        variants = product.variants.all()
-        unique_colors = list(set(
+        # Distinct colors in variant order
+        unique_colors = list(dict.fromkeys(
             variant.color for variant in variants if variant.color
         ))
         
+        similar_products = []
+        if product.category_id:
+            similar_products = list(Product.objects.filter(
+                category_id=product.category_id
+            ).exclude(pk=product.pk).select_related('category__parent_category')[:4])
+        
+        # Star meter rows; 75px is the width of a full five-star bar
+        rating_breakdown = [
+            {
+                'stars': stars,
+                'count': product.rating_histogram.get(str(stars), 0),
+                'width': round(75 * product.rating_histogram.get(str(stars), 0) / product.review_count)
+                         if product.review_count else 0,
+            }
+            for stars in range(5, 0, -1)
+        ]
+        
         return {
             'product': product,
-            'reviews': reviews,
-            'average_rating': round(average_rating, 1),
-            'images': product.images.all(),
+            'average_rating': round(product.average_rating, 1),
+            'review_count': product.review_count,
+            'rating_breakdown': rating_breakdown,
+            'images': list(product.images.all()),
             'similar_products': similar_products,
             'variants': variants,
             'variant_groups': variant_groups,
@@ -345,7 +437,7 @@ class ProductService:
         return prds if prds else []
     
     @classmethod
-    def search_products(cls, query, category=None, per_page=10, page_number=1):
+    def search_products(cls, query, category=None, per_page=10, page_number=1, cursor=None, ordering=None):
         """
         search products with category filtering
         """
@@ -360,28 +452,15 @@ class ProductService:
             'category__parent_category'
         )
         
-        # Construct search conditions
-        search_conditions = (
-            Q(title__icontains=query) |
-            Q(keywords__icontains=query) |
-            Q(brand__brand_title__icontains=query) |
-            Q(category__category_name__icontains=query) |
-            Q(category__parent_category__parent_name__icontains=query)
-        )
-        
         # Apply category filter if provided
         if category:
-            products = base_query.filter(category=category).filter(search_conditions)
-        else:
-            products = base_query.filter(search_conditions)
+            base_query = base_query.filter(category=category)
         
-        # Remove duplicates and ensure unique results
-        products = products.distinct()
+        # Ranked full-text match through the configured search backend
+        products = get_search_backend().search(query, base_query)
         
         try:
-            paginator = Paginator(products, per_page)
-            page_obj = paginator.get_page(page_number)
-            return page_obj, paginator
+            return cls._paginate(products, page_number, per_page, cursor, ordering or 'relevance')
         except (EmptyPage, InvalidPage):
             return None, None
     
@@ -409,13 +488,21 @@ class CartService:
         return variant
 
     @classmethod
-    def _get_item_price(cls, product, variant):
+    def _lock_cart(cls, cart_id):
         """
-        Helper method to determine the correct price based on variant
+        Lock the cart row so concurrent changes to the same cart summarize
+        one after the other
         """
-        if variant and variant.variant_price:
-            return variant.selling_price
-        return product.current_selling_price
+        return Cart.objects.select_for_update().get(pk=cart_id)
+
+    @classmethod
+    def _refresh_summary(cls, cart):
+        """
+        Recompute the denormalized cart summary from the cart lines at
+        current prices, so price changes since the items were added never
+        leave the stored total drifting
+        """
+        cart.recalculate_summary()
 
     @classmethod
     @transaction.atomic
@@ -423,8 +510,8 @@ class CartService:
         if quantity < 1:
             raise ValidationError("Quantity must be at least 1")
 
-        # Get or create user's cart
-        cart, _ = Cart.objects.get_or_create(user=user)
+        # Get or create user's cart, locked until the summary is refreshed
+        cart, _ = Cart.objects.select_for_update().get_or_create(user=user)
 
         # Find variant if product has variants
         variant = None
@@ -436,20 +523,6 @@ class CartService:
             
             if not variant:
                 raise ValidationError("Selected variant combination is not available")
-                
-            if variant.stock < quantity:
-                raise ValidationError(f"Only {variant.stock} items available in this variant")
-            
-            variant.stock -= quantity
-            variant.save()
-        else:
-            if product.quantity < quantity:
-                raise ValidationError(f"Only {product.quantity} items available")
-            
-            product.quantity -= quantity
-            product.save()
-
-        item_price = cls._get_item_price(product, variant)
 
         # Try to find existing cart item with matching variant
         try:
@@ -467,63 +540,53 @@ class CartService:
                 quantity=quantity
             )
         
-        # Validate and save
-        cart_item.full_clean()
+        # The stock hold is the stock check, so the model's clean() is skipped
         cart_item.save()
         
+        # Atomic conditional decrement with a TTL; raises (rolling back) if stock ran out
+        hold_cart_item(cart_item, cart_item.quantity)
+        
+        cls._refresh_summary(cart)
+        
         return cart_item
     
     @classmethod
     @transaction.atomic
     def update_cart_item(cls, cart_item:CartItem, new_quantity):
         
-        product = cart_item.product
-        
         # Validate quantity
         if new_quantity < 1:
             raise ValidationError("Quantity must be at least 1.")
         
-        # Check if enough product is available
-        available_quantity = product.quantity + cart_item.quantity
-        if new_quantity > available_quantity:
-            raise ValidationError(f"Only {available_quantity} items available.")
+        cart = cls._lock_cart(cart_item.cart_id)
         
-        # Calculate quantity difference
-        qty_diff = new_quantity - cart_item.quantity
+        # Reserves or releases only the difference and renews the hold
+        try:
+            hold_cart_item(cart_item, new_quantity)
+        except InsufficientStock as e:
+            raise ValidationError(f"Only {e.available} items available.")
         
-        # Update product and cart item quantities
-        product.quantity -= qty_diff
         cart_item.quantity = new_quantity
-        
-        # Save changes
-        product.save()
         cart_item.save()
         
+        cls._refresh_summary(cart)
+        
         return cart_item
 
     @classmethod
     @transaction.atomic
     def remove_cart_item(cls, cart_item:CartItem):
         product = cart_item.product
-        if product.has_variants:
-            # Find matching variant
-            variant = ProductVariant.objects.filter(
-                Q(product=product) |
-                Q(size=cart_item.variant.size) |
-                Q(color=cart_item.variant.color)
-            ).first()
-
-            if variant:
-                variant.stock += cart_item.quantity
-                variant.save()
+        cart = cls._lock_cart(cart_item.cart_id)
         
-        # Return product quantity back to inventory
-        product.quantity += cart_item.quantity
-        product.save()
+        # Return the held units to the variant (or product) they came from
+        release_cart_item(cart_item)
         
         # Delete the cart item
         cart_item.delete()
         
+        cls._refresh_summary(cart)
+        
         return product
     
 class WishListService:
@@ -540,16 +603,132 @@ class WishListService:
             )
         return wishlist_item
     
+class AddressService:
+    @classmethod
+    def get_or_create_address(cls, user, **fields):
+        """
+        Reuse the user's address matching ``fields`` (ignoring case, spacing
+        and phone punctuation) or create it. The first address a user saves
+        becomes their default.
+        """
+        fingerprint = Address.compute_fingerprint(**fields)
+        address = (
+            Address.objects.filter(user=user, fingerprint=fingerprint)
+            .order_by('id')
+            .first()
+        )
+        if address:
+            return address
+        return Address.objects.create(
+            user=user,
+            is_default=not Address.objects.filter(user=user).exists(),
+            **fields
+        )
+
+    @classmethod
+    def collapse_duplicates(cls, batch_size=500):
+        """
+        Merge each user's addresses that share a fingerprint into the oldest.
+
+        Orders are repointed at the kept address with one UPDATE per address
+        column per batch of duplicate groups, then the duplicates are deleted.
+
+        Returns:
+            tuple: Number of duplicate groups and of addresses removed
+        """
+        groups = removed = 0
+        while True:
+            duplicate_groups = list(
+                Address.objects.values('user_id', 'fingerprint')
+                .annotate(copies=Count('id'), keep_id=Min('id'))
+                .filter(copies__gt=1)
+                .order_by('user_id', 'fingerprint')[:batch_size]
+            )
+            if not duplicate_groups:
+                return groups, removed
+
+            with transaction.atomic():
+                keep_ids = {
+                    (group['user_id'], group['fingerprint']): group['keep_id']
+                    for group in duplicate_groups
+                }
+                # One query for every copy in the batch, matched to its group here
+                candidates = Address.objects.filter(
+                    user_id__in={user_id for user_id, _ in keep_ids},
+                    fingerprint__in={fingerprint for _, fingerprint in keep_ids},
+                ).values_list('id', 'user_id', 'fingerprint')
+                replacements = {}
+                for pk, user_id, fingerprint in candidates:
+                    keep_id = keep_ids.get((user_id, fingerprint))
+                    if keep_id is not None and pk != keep_id:
+                        replacements[pk] = keep_id
+
+                for field in ('shipping_address', 'billing_address'):
+                    Order.objects.filter(**{f'{field}_id__in': replacements}).update(**{
+                        f'{field}_id': Case(
+                            *[When(**{f'{field}_id': old}, then=Value(new))
+                              for old, new in replacements.items()],
+                            output_field=IntegerField()
+                        )
+                    })
+
+                # Keep the default flag if any merged copy carried it
+                default_ids = Address.objects.filter(
+                    pk__in=replacements, is_default=True
+                ).values_list('id', flat=True)
+                Address.objects.filter(
+                    pk__in={replacements[pk] for pk in default_ids}
+                ).update(is_default=True)
+                Address.objects.filter(pk__in=replacements).delete()
+
+            groups += len(duplicate_groups)
+            removed += len(replacements)
+
+
 # order service
 class OrderService:
+    @staticmethod
+    def _order_line(cart_item: CartItem):
+        """
+        Build an unsaved OrderItem with the price and product details
+        captured at checkout, using only the already loaded relations.
+        """
+        product, variant = cart_item.product, cart_item.variant
+        price = (product.calculate_selling_price(variant_price=variant.variant_price)
+                if variant and variant.variant_price
+                else product.current_selling_price)
+        
+        return OrderItem(
+            product=product,
+            variant=variant,
+            quantity=cart_item.quantity,
+            unit_price=price,
+            subtotal=price * cart_item.quantity,
+            product_name=product.title,
+            variant_info={
+                'size': variant.size,
+                'color': variant.color,
+                'variant_price': str(variant.variant_price)
+            } if variant else None
+        )
+    
     @classmethod
     @transaction.atomic
     def create_order_from_cart(cls, cart : Cart, shipping_address, billing_address=None, payment_method=None, notes=None):
         """
         Create an order from a cart
         """
+        # Load every line with its product and variant in one query
+        cart_items = list(cart.cart_items.select_related('product', 'variant'))
+        
+        # Convert the cart's stock holds into allocations for this order
+        allocate_cart(cart, cart_items)
+        
+        # Price every line once; the same figures feed the totals and the items
+        lines = [cls._order_line(cart_item) for cart_item in cart_items]
+        
         # Calculate totals
-        subtotal = cart.total_price()
+        subtotal = sum((line.subtotal for line in lines), Decimal('0.00'))
         shipping_cost = Decimal('0.00')  # Calculate based on your shipping rules
         tax = subtotal * Decimal('0.16')  # 16% VAT for example
         total = subtotal + shipping_cost + tax
@@ -567,20 +746,10 @@ class OrderService:
             notes=notes
         )
 
-        # Create order items from cart items
-        for cart_item in cart.cart_items.all():
-            price = (cart_item.variant.variant_price 
-                    if cart_item.variant 
-                    else cart_item.product.current_selling_price)
-            
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                variant=cart_item.variant,
-                quantity=cart_item.quantity,
-                unit_price=price,
-                subtotal=price * cart_item.quantity
-            )
+        # bulk_create skips OrderItem.save, so lines carry their own snapshots
+        for line in lines:
+            line.order = order
+        OrderItem.objects.bulk_create(lines)
 
         # Clear the cart
         # cart.cart_items.all().delete()
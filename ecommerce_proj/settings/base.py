@@ -110,6 +110,57 @@ TEMPLATES = [
     },
 ]
 
+# Cache settings
+# The cache holds version counters and locks that every worker process must
+# share, so the default is the database table created by `createcachetable`.
+# Point CACHE_BACKEND/CACHE_LOCATION at Redis for heavier traffic; a
+# per-process backend (LocMemCache) fails the ecommerce.E001 check unless DEBUG is on.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'ecommerce_cache'),
+    }
+}
+
+SITE_CHROME_CACHE_TIMEOUT = int(os.environ.get('SITE_CHROME_CACHE_TIMEOUT', 60 * 60))
+# Seconds between checks for autocomplete index changes made by other processes
+AUTOCOMPLETE_REFRESH_INTERVAL = int(os.environ.get('AUTOCOMPLETE_REFRESH_INTERVAL', 30))
+FACET_CACHE_TIMEOUT = int(os.environ.get('FACET_CACHE_TIMEOUT', 60 * 15))
+# Home page tabs: products kept per tab
+HOME_TAB_PRODUCTS = int(os.environ.get('HOME_TAB_PRODUCTS', 8))
+# Seconds a running home tab refresh holds its lock before another may start
+HOME_TABS_REFRESH_TIMEOUT = int(os.environ.get('HOME_TABS_REFRESH_TIMEOUT', 300))
+# Half-life of the time-decayed best-seller score; run rebuild_sales_ranks after changing it
+SALES_RANK_HALF_LIFE_DAYS = int(os.environ.get('SALES_RANK_HALF_LIFE_DAYS', 14))
+PRODUCT_DETAIL_CACHE_TIMEOUT = int(os.environ.get('PRODUCT_DETAIL_CACHE_TIMEOUT', 60 * 15))
+# How long cart lines hold stock before the sweeper returns it (seconds)
+CART_RESERVATION_TTL = int(os.environ.get('CART_RESERVATION_TTL', 60 * 30))
+# How long checkout and payment request keys are remembered (seconds)
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+# How long requests sent without a key are matched by their contents (seconds)
+IDEMPOTENCY_FINGERPRINT_TTL = int(os.environ.get('IDEMPOTENCY_FINGERPRINT_TTL', 60 * 5))
+# Seconds each admin dashboard section is cached before one request recomputes it
+DASHBOARD_SECTION_TIMEOUTS = {
+    'revenue': 60 * 5,
+    'orders': 60 * 5,
+    'customers': 60 * 15,
+    'products': 60 * 10,
+    'realtime': 30,
+    'charts': 60 * 10,
+    'geographic': 60 * 60,
+    'payments': 60 * 5,
+}
+# Threads computing dashboard sections concurrently (0 computes them in the request thread)
+DASHBOARD_WORKERS = int(os.environ.get('DASHBOARD_WORKERS', 4))
+# Seconds a dashboard section may run, once started, before the response is sent without it
+DASHBOARD_SECTION_DEADLINE = int(os.environ.get('DASHBOARD_SECTION_DEADLINE', 10))
+# Per-section overrides of DASHBOARD_SECTION_DEADLINE
+DASHBOARD_SECTION_DEADLINES = {
+    'realtime': 5,
+    'charts': 15,
+    'geographic': 15,
+}
+
 # Rest Framework settings
 REST_FRAMEWORK = {
     
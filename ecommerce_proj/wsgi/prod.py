@@ -4,4 +4,8 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ecommerce_proj.settings.prod")
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Build in-memory indexes before the first request is served
+from ecommerce.autocomplete import autocomplete_index  # noqa: E402
+autocomplete_index.warm()
@@ -11,6 +11,7 @@ from typing import Dict, Any, List
 from accounts.models import CustomUser
 from .models import Transaction
 from ecommerce.models import Order
+from ecommerce.idempotency import release_order_requests
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 
@@ -145,6 +146,8 @@ class MpesaService:
             
         order.payment_status = "Failed"
         order.save()
+        # Let the customer start a new payment for the order
+        release_order_requests('payment', order)
         return False
 
         
@@ -1,3 +1,46 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import Address
+from ecommerce.models import IdempotencyKey, Order
+from payments.models import Transaction
+from payments.services import MpesaService
+
+
+class MpesaCallbackTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(email='payer@example.com', password='pass12345')
+        address = Address.objects.create(
+            user=user, email=user.email, first_name='Jane', last_name='Doe', phone='0712345678',
+            street_address='1 Moi Avenue', city='Nairobi', county='Nairobi', postal_code='00100'
+        )
+        self.order = Order.objects.create(
+            user=user, shipping_address=address, billing_address=address,
+            subtotal=Decimal('100.00'), total=Decimal('100.00')
+        )
+        self.transaction = Transaction.objects.create(
+            user=user, order=self.order, amount=Decimal('100.00'),
+            status='Pending', transaction_id='ws_CO_1'
+        )
+        self.key = IdempotencyKey.objects.create(
+            scope='payment', key='k', fingerprint='f', user=user, order=self.order,
+            response_url=f'/payment/waiting/{self.transaction.id}/',
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+
+    def callback(self, result_code):
+        return {'Body': {'stkCallback': {
+            'ResultCode': result_code,
+            'CheckoutRequestID': 'ws_CO_1',
+            'ResultDesc': 'Request cancelled by user',
+        }}}
 
-# Create your tests here.
+    def test_cancelled_payment_releases_request_key(self):
+        self.assertFalse(MpesaService().process_callback(self.callback(1032)))
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'Cancelled')
+        self.assertFalse(IdempotencyKey.objects.filter(pk=self.key.pk).exists())
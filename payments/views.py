@@ -8,6 +8,7 @@ from .services import MpesaService, PaymentService
 from .utils import format_phone_number
 from .models import Transaction
 from ecommerce.models import Order
+from ecommerce.idempotency import claim_request, complete_request, abandon_request, IdempotencyConflict
 import json
 
 def index(request):
@@ -17,6 +18,17 @@ def index(request):
 @require_http_methods(["POST"])
 def initiate_payment(request, order_id):
     
+    try:
+        record, replayed = claim_request(request, 'payment')
+    except IdempotencyConflict as e:
+        return JsonResponse({"error": e.messages[0]}, status=409)
+    
+    if replayed:
+        # Retries reuse the original transaction instead of pushing another STK prompt
+        if not record.completed:
+            return JsonResponse({"error": "Payment is already being initiated"}, status=409)
+        return redirect(record.response_url)
+    
     try:
         order = Order.objects.get(id=order_id)
         try:
@@ -24,11 +36,19 @@ def initiate_payment(request, order_id):
         except ValueError as e:
             raise ValueError(f"Invalid phone number: {str(e)}")
         
-        transaction = PaymentService.create_payment_for_order(order,"mpesa", phone_number=phone)
+        call_back_url = f'https://{request.get_host()}{reverse("callback")}'
+        transaction = PaymentService().create_payment_for_order(
+            order, order.user, "mpesa",
+            phone_number=phone,
+            call_back_url=call_back_url
+        )
+        complete_request(record, reverse('waiting_page', args=[transaction.id]), order=order)
         
         return redirect('waiting_page', transaction_id=transaction.id)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=400)
+    finally:
+        abandon_request(record)
 
 @csrf_exempt
 def callback(request):